@@ -0,0 +1,392 @@
+# Render Configs Action Plugin
+# Renders the Jinja2 config template of many hosts at once on the controller
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+DOCUMENTATION = """
+    action: render_configs
+    short_description: Renders config templates of many hosts in a process pool and skips unchanged hosts
+    description:
+      - Runs once and renders the template of every host in hosts with the Templar of the task, so filters, tests
+        and lookups work like in the template module
+      - Each host is rendered with the vars Ansible would give the template module on that host, play vars and
+        vars_files included
+      - Only the variables the template uses are collected. A host is skipped if the hash of the template and the
+        resolved values of these variables did not change since the last run and the destination file still exists.
+        Templates that use hostvars or lookups are always rendered, only changed files are written
+      - Braces in template and dest are templated by Ansible with the vars of the host the task runs on. Use
+        template_expr and dest_expr for values that differ per host. Braces that reach the plugin, e.g. in a
+        !unsafe string, are templated with the vars of each host
+    options:
+      template:
+        description: template file name in the templates directory, e.g. switch_base_conf.j2
+      template_expr:
+        description: Jinja2 expression without braces that is evaluated with the vars of each host and gives the
+                     template file name, e.g. config_template. Used instead of template
+      dest:
+        description: destination file, e.g. ./config/all.conf
+      dest_expr:
+        description: Jinja2 expression without braces that is evaluated with the vars of each host and gives the
+                     destination file, e.g. "'./config/' ~ hostname ~ '.conf'". Used instead of dest
+      hosts:
+        description: inventory hostnames to render, default are the hosts of the play
+      mode:
+        description: file mode of the written files, e.g. '0644'. Existing files keep their mode, new files get 0644
+      workers:
+        description: number of worker processes, default is the number of CPUs
+      force:
+        description: render all hosts even if nothing changed
+        default: False
+      state_file:
+        description: file with the hashes of the last run
+        default: ~/.ansible/cache/render_configs.json
+"""
+
+# Python imports
+import hashlib
+import json
+import multiprocessing
+import os
+import stat
+import tempfile
+
+# Ansible imports
+from ansible import constants as C
+from ansible.errors import AnsibleActionFail, AnsibleError
+from ansible.module_utils._text import to_native, to_text
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible.plugins.action import ActionBase
+
+try:
+    from ansible.template import trust_as_template
+except ImportError:
+    # Before ansible-core 2.19 every string is templated
+    def trust_as_template(value):
+        return value
+
+try:
+    import jinja2
+    from jinja2 import meta, nodes
+    HAS_JINJA2 = True
+except ImportError:
+    HAS_JINJA2 = False
+
+STATE_FILE = os.path.join(os.path.expanduser('~'), '.ansible', 'cache', 'render_configs.json')
+
+# Mode of new files, like the template module
+DEFAULT_MODE = 0o644
+
+# Action of the running task, set before the worker processes are forked so they inherit its Templar and vars
+ACTION = None
+
+# Template sources of this process by template path
+SOURCES = {}
+
+# Names whose value can not be hashed per host, templates that use them are always rendered
+UNHASHABLE = ('hostvars', 'vars', 'lookup', 'query', 'q', 'now')
+
+
+def template_text(templar, data):
+    """
+    Renders template text with the options of the Ansible template module
+    :param templar: Templar object with the vars of the host
+    :param data: template source
+    :return: rendered text
+    """
+    overrides = {'trim_blocks': True}
+    if hasattr(templar, 'evaluate_expression'):
+        return templar.template(trust_as_template(data), escape_backslashes=False, overrides=overrides)
+    return templar.template(data, preserve_trailing_newlines=True, escape_backslashes=False, convert_data=False,
+                            overrides=overrides)
+
+
+def evaluate(templar, expression):
+    """
+    Evaluates a Jinja2 expression
+    :param templar: Templar object with the vars of the host
+    :param expression: expression without braces
+    :return: result of the expression
+    """
+    if hasattr(templar, 'evaluate_expression'):
+        return templar.evaluate_expression(trust_as_template(expression))
+    return templar.template('{{ %s }}' % expression, convert_data=False)
+
+
+def resolve(templar, value):
+    """
+    Templates a variable value, nested templates are resolved
+    :param templar: Templar object with the vars of the host
+    :param value: raw variable value
+    :return: resolved value
+    """
+    if hasattr(templar, 'evaluate_expression'):
+        return templar.template(value)
+    return templar.template(value, convert_data=False)
+
+
+def write_if_changed(path, content, mode):
+    """
+    Writes the file atomically if its content differs
+    :param path: path of the file
+    :param content: new content
+    :param mode: file mode as int or None to keep the mode of an existing file
+    :return: True if the file was written
+    """
+    try:
+        with open(path, 'rb') as infile:
+            if infile.read() == content:
+                return False
+    except (IOError, OSError):
+        pass
+
+    directory = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    handle, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(handle, 'wb') as outfile:
+            outfile.write(content)
+        if mode is None:
+            # mkstemp creates the file with 0600
+            try:
+                mode = stat.S_IMODE(os.stat(path).st_mode)
+            except OSError:
+                mode = DEFAULT_MODE
+        os.chmod(tmp_path, mode)
+        os.rename(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return True
+
+
+def render_job(job):
+    """
+    Renders and writes the config of one host, runs in the worker processes
+    :param job: tuple of host, template path, destination and mode
+    :return: tuple of destination, written flag and error message
+    """
+    host, template_path, dest, mode = job
+    try:
+        content = ACTION.render_template(host, template_path)
+        return dest, write_if_changed(dest, to_text(content).encode('utf-8'), mode), None
+    except Exception as error:
+        return dest, False, "{0}: {1}".format(type(error).__name__, to_native(error))
+
+
+class ActionModule(ActionBase):
+
+    TRANSFERS_FILES = False
+
+    def run(self, tmp=None, task_vars=None):
+        result = super(ActionModule, self).run(tmp, task_vars)
+        task_vars = task_vars or {}
+
+        if not HAS_JINJA2:
+            raise AnsibleActionFail('jinja2 is required for render_configs')
+
+        args = self._task.args
+        if bool(args.get('template')) == bool(args.get('template_expr')):
+            raise AnsibleActionFail('one of template and template_expr is required')
+        if bool(args.get('dest')) == bool(args.get('dest_expr')):
+            raise AnsibleActionFail('one of dest and dest_expr is required')
+        hosts = args.get('hosts') or task_vars.get('ansible_play_hosts', [])
+        mode = args.get('mode')
+        if mode is not None:
+            mode = int(str(mode), 8)
+        force = boolean(args.get('force', False), strict=False)
+        state_file = os.path.expanduser(args.get('state_file') or STATE_FILE)
+        workers = int(args.get('workers') or multiprocessing.cpu_count())
+
+        self.task_vars = task_vars
+        self.host_vars = {}
+        self.search_path = self.template_search_path(task_vars)
+        state = self.load_state(state_file)
+        templates = {}
+        jobs = []
+        skipped = []
+        for host in hosts:
+            host_vars = self.get_host_vars(host)
+            templar = self.host_templar(host)
+            try:
+                template_name = self.host_value(templar, args.get('template'), args.get('template_expr'))
+                dest = os.path.abspath(self.host_value(templar, args.get('dest'), args.get('dest_expr')))
+
+                if template_name not in templates:
+                    templates[template_name] = self.inspect_template(template_name)
+                template_path, template_digest, names = templates[template_name]
+
+                # Only the variables used by the template are resolved and hashed. Undefined names are loop, set
+                # and macro variables of the template itself
+                variables = {}
+                for name in names.difference(UNHASHABLE):
+                    if name in host_vars:
+                        variables[name] = resolve(templar, host_vars[name])
+                variables = json.dumps(variables, sort_keys=True, default=to_text)
+            except AnsibleError as error:
+                raise AnsibleActionFail('render_configs failed for %s: %s' % (host, to_native(error)))
+
+            digest = hashlib.sha256((template_digest + dest + str(mode) + variables).encode('utf-8')).hexdigest()
+            cacheable = not names.intersection(UNHASHABLE)
+            if not force and cacheable and state.get(dest) == digest and os.path.exists(dest):
+                skipped.append(dest)
+                continue
+            state[dest] = digest
+            jobs.append((host, template_path, dest, mode))
+
+        results = self.render(jobs, workers)
+
+        failed = [(dest, error) for dest, written, error in results if error]
+        for dest, error in failed:
+            # Render again in the next run
+            state.pop(dest, None)
+        self.save_state(state_file, state)
+
+        result['rendered'] = [dest for dest, written, error in results if written]
+        result['unchanged'] = len(results) - len(result['rendered']) - len(failed)
+        result['skipped'] = len(skipped)
+        result['changed'] = bool(result['rendered'])
+        if failed:
+            result['failed'] = True
+            result['msg'] = 'Rendering failed for %s' % ', '.join('%s (%s)' % item for item in failed)
+        else:
+            result['msg'] = '%s configs written, %s unchanged, %s skipped' % (
+                len(result['rendered']), result['unchanged'], result['skipped'])
+        return result
+
+    def host_value(self, templar, value, expression):
+        """
+        :param templar: Templar object with the vars of the host
+        :param value: plain string, templated if it still has braces
+        :param expression: expression used instead of value if given
+        :return: value for the host
+        """
+        if expression:
+            return to_text(evaluate(templar, expression))
+        if '{{' in value or '{%' in value:
+            return to_text(template_text(templar, value))
+        return to_text(value)
+
+    def inspect_template(self, template_name):
+        """
+        Finds the template and collects the variables it and the templates it includes use
+        :param template_name: template file name
+        :return: tuple of template path, digest of all sources and set of variable names
+        """
+        template_path = self._find_needle('templates', template_name)
+        # Only parses the sources, compiling would need the filters and tests of the Templar. The includes are looked up
+        # like the Templar does.
+        loader = jinja2.FileSystemLoader(self.search_path + [os.path.dirname(template_path)])
+        extensions = ['jinja2.ext.do', 'jinja2.ext.loopcontrols'] + list(C.DEFAULT_JINJA2_EXTENSIONS or [])
+        environment = jinja2.Environment(loader=loader, extensions=extensions)
+        digest = hashlib.sha256()
+        names = set()
+        pending = [os.path.basename(template_path)]
+        seen = set()
+        while pending:
+            name = pending.pop()
+            if name in seen:
+                continue
+            seen.add(name)
+            source = environment.loader.get_source(environment, name)[0]
+            digest.update(source.encode('utf-8'))
+            parsed = environment.parse(source)
+            # All names that are read, loop and set variables too, a host var that is not used only adds to the hash
+            names.update(node.name for node in parsed.find_all(nodes.Name) if node.ctx == 'load')
+            pending.extend(reference for reference in meta.find_referenced_templates(parsed) if reference)
+        return template_path, digest.hexdigest(), names
+
+    def template_search_path(self, task_vars):
+        """
+        Search path of the template includes, like the template module
+        :param task_vars: vars of the task
+        :return: list of directories
+        """
+        search_path = []
+        for path in list(task_vars.get('ansible_search_path', [])) + [self._loader.get_basedir()]:
+            search_path.append(os.path.join(path, 'templates'))
+            search_path.append(path)
+        return search_path
+
+    def get_host_vars(self, host):
+        """
+        Vars of a host like the template module gets them when the task runs on the host
+        :param host: inventory hostname
+        :return: dict of raw variables
+        """
+        if host not in self.host_vars:
+            hostvars = self.task_vars['hostvars']
+            manager = getattr(hostvars, '_variable_manager', None)
+            inventory = getattr(hostvars, '_inventory', None)
+            if manager is not None and inventory is not None and inventory.get_host(host) is not None:
+                # Play vars and vars_files are not part of hostvars
+                variables = manager.get_vars(play=self._task.get_play(), host=inventory.get_host(host), task=self._task,
+                                             include_hostvars=False)
+            else:
+                variables = dict(hostvars[host])
+            variables['hostvars'] = hostvars
+            self.host_vars[host] = variables
+        return self.host_vars[host]
+
+    def host_templar(self, host):
+        """
+        :param host: inventory hostname
+        :return: Templar object with the vars of the host
+        """
+        return self._templar.copy_with_new_env(available_variables=self.get_host_vars(host))
+
+    def render_template(self, host, template_path):
+        """
+        Renders the template with the vars of a host
+        :param host: inventory hostname
+        :param template_path: path of the template
+        :return: rendered text
+        """
+        if template_path not in SOURCES:
+            with open(template_path, 'rb') as infile:
+                SOURCES[template_path] = to_text(infile.read())
+        templar = self.host_templar(host)
+        templar = templar.copy_with_new_env(searchpath=self.search_path + [os.path.dirname(template_path)])
+        return template_text(templar, SOURCES[template_path])
+
+    def render(self, jobs, workers):
+        """
+        Renders the jobs in a process pool, serial if there is only one job or processes can not be started
+        :param jobs: list of render jobs
+        :param workers: number of worker processes
+        :return: list of results
+        """
+        global ACTION
+        ACTION = self
+        # The workers need the Templar of the task, they can only get it by fork. Daemonic processes can not have
+        # children.
+        if multiprocessing.current_process().daemon:
+            self._display.vvv('render_configs renders serially in a daemonic process')
+        elif 'fork' not in multiprocessing.get_all_start_methods():
+            self._display.vvv('render_configs renders serially, processes can not be forked')
+        elif workers > 1 and len(jobs) > 1:
+            try:
+                pool = multiprocessing.get_context('fork').Pool(min(workers, len(jobs)))
+            except OSError as error:
+                self._display.vvv('render_configs renders serially: %s' % to_native(error))
+            else:
+                try:
+                    return pool.map(render_job, jobs, chunksize=max(1, len(jobs) // (workers * 4)))
+                finally:
+                    pool.close()
+                    pool.join()
+        return [render_job(job) for job in jobs]
+
+    def load_state(self, state_file):
+        try:
+            with open(state_file) as infile:
+                return json.load(infile)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def save_state(self, state_file, state):
+        write_if_changed(state_file, json.dumps(state).encode('utf-8'), None)
@@ -0,0 +1,221 @@
+# REST Benchmark - Measures the ztp_vars lookup and the ZTP filters against the REST switch simulator
+#
+# Usage:
+#   python bench_rest.py                                      # default neighbor counts and swagger sizes
+#   python bench_rest.py --neighbors 100 1000 5000 --spec-paths 250 1000 4000 --latency 0.005 --error-rate 0.02
+#   python bench_rest.py --json > bench.json                  # machine readable results for comparisons
+#
+# Needs ansible, requests and cryptography. The lookup and the filters run unchanged, their session cookies, schema
+# cache and ztp_logs are kept in a temporary directory so the results do not depend on earlier runs.
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+from rest_switch_simulator import RestSwitchSimulator, interfaces, neighbor_mac
+
+# The plugins are loaded from their directories like Ansible does
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'lookup_plugins'))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'filter_plugins'))
+import ztp_vars
+import ztp_filter
+from ansible.errors import AnsibleParserError
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(share * (len(values) - 1))))]
+
+
+def summary(values):
+    """
+    :return: dict with count, min, median, p95 and max in milliseconds
+    """
+    if not values:
+        return {}
+    return {'count': len(values), 'min_ms': round(min(values) * 1000, 2),
+            'median_ms': round(percentile(values, 0.5) * 1000, 2), 'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+            'max_ms': round(max(values) * 1000, 2)}
+
+
+def static_ip(index):
+    number = index + 1
+    return "172.16.{}.{}".format((number >> 8) & 255, number & 255)
+
+
+def simulators(count, args, neighbors=0, spec_paths=2):
+    return [RestSwitchSimulator(neighbors=neighbors, spec_paths=spec_paths, latency=args.latency,
+                                error_rate=args.error_rate, error_status=args.error_status, compress=args.compress,
+                                seed=number).start() for number in range(count)]
+
+
+def request_stats(servers):
+    total = sum(sum(value for key, value in server.stats.items() if key != 'injected_errors') for server in servers)
+    return total, sum(server.stats['injected_errors'] for server in servers)
+
+
+def bench_lookup(count, args):
+    """
+    Runs the lookup for one site with VSX peers that see count neighbors, every neighbor is in the switch list
+    :return: dict of results
+    """
+    servers = simulators(args.peers, args, neighbors=count)
+    switch_list = [[neighbor_mac(index), static_ip(index), "ztp-switch-{}".format(index + 1)] for index in range(count)]
+    peers = [server.address for server in servers]
+    options = {'timeout': 30, 'retries': args.retries, 'backoff': args.backoff}
+    lookup = ztp_vars.LookupModule()
+    timings = {'cold': [], 'session_cache': []}
+    try:
+        # Login, LLDP neighbors, ports and logout on every call
+        for iteration in range(args.iterations):
+            start = time.time()
+            data = lookup.run([switch_list, peers, 'admin', 'admin', 'bench'], **options)
+            timings['cold'].append(time.time() - start)
+        if len(data) != count:
+            raise RuntimeError("Lookup returned {} of {} neighbors".format(len(data), count))
+
+        # Sessions stay logged in, the first call logs in
+        lookup.run([switch_list, peers, 'admin', 'admin', 'bench'], session_cache=True, **options)
+        for iteration in range(args.iterations):
+            start = time.time()
+            lookup.run([switch_list, peers, 'admin', 'admin', 'bench'], session_cache=True, **options)
+            timings['session_cache'].append(time.time() - start)
+        lookup.run([switch_list, peers, 'admin', 'admin', 'bench', 'logout'], **options)
+    finally:
+        for server in servers:
+            server.stop()
+
+    result = dict((name, summary(values)) for name, values in timings.items())
+    result['neighbors'] = count
+    result['lldp_kb'] = round(len(servers[0].lldp_json) / 1024.0, 1)
+    result['requests'], result['injected_errors'] = request_stats(servers)
+    return result
+
+
+def bench_filters(spec_paths, args):
+    """
+    Looks up the interface attributes with an empty, a disk and a memory schema cache and builds interface bodies
+    :return: dict of results
+    """
+    server = simulators(1, args, spec_paths=spec_paths)[0]
+    current = interfaces(args.interfaces)
+    timings = {'download': [], 'disk_cache': [], 'memory_cache': [], 'interface_bodies': []}
+    cache_dir = tempfile.mkdtemp()
+    failures = 0
+    try:
+        # The download is not retried, injected errors fail the filter
+        while len(timings['download']) < args.iterations:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            ztp_filter.SCHEMA_CACHE = ztp_filter.SchemaCache(cache_dir)
+            start = time.time()
+            try:
+                ztp_filter.fetch_allowed_list("/system/interfaces/{id}", server.address)
+            except AnsibleParserError:
+                failures += 1
+                continue
+            timings['download'].append(time.time() - start)
+
+        for iteration in range(args.iterations):
+            # A new process only has the index on disk
+            ztp_filter.SCHEMA_CACHE = ztp_filter.SchemaCache(cache_dir)
+            start = time.time()
+            ztp_filter.fetch_allowed_list("/system/interfaces/{id}", server.address)
+            timings['disk_cache'].append(time.time() - start)
+
+        for iteration in range(args.iterations):
+            start = time.time()
+            ztp_filter.fetch_allowed_list("/system/interfaces/{id}", server.address)
+            timings['memory_cache'].append(time.time() - start)
+
+        for iteration in range(args.iterations):
+            start = time.time()
+            bodies = ztp_filter.build_interface_bodies(current, server.address, {'*': [['description', 'ztp']]})
+            timings['interface_bodies'].append(time.time() - start)
+        if len(bodies) != args.interfaces:
+            raise RuntimeError("Built {} of {} interface bodies".format(len(bodies), args.interfaces))
+    finally:
+        server.stop()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    result = dict((name, summary(values)) for name, values in timings.items())
+    result['spec_paths'] = spec_paths
+    result['spec_kb'] = round(len(server.spec_json) / 1024.0, 1)
+    result['requests'], result['injected_errors'] = request_stats([server])
+    result['failed_downloads'] = failures
+    return result
+
+
+def print_table(title, key, results, phases):
+    print(title)
+    print("{:>10} {:>10} {:<16} {:>6} {:>10} {:>10} {:>10} {:>10}".format(
+        key, 'kb', 'phase', 'count', 'min ms', 'median ms', 'p95 ms', 'max ms'))
+    for result in results:
+        size = result['lldp_kb'] if 'lldp_kb' in result else result['spec_kb']
+        for phase in phases:
+            values = result[phase]
+            print("{:>10} {:>10} {:<16} {:>6} {:>10} {:>10} {:>10} {:>10}".format(
+                result[key], size, phase, values['count'], values['min_ms'], values['median_ms'], values['p95_ms'],
+                values['max_ms']))
+        failed = ", {} failed downloads".format(result['failed_downloads']) if 'failed_downloads' in result else ""
+        print("{:>10} {:>10} {:<16} {} ({} injected errors{})".format(
+            result[key], size, 'requests', result['requests'], result['injected_errors'], failed))
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the ZTP lookup and filters against a REST simulator')
+    parser.add_argument('--only', choices=['lookup', 'filters'], default=None)
+    parser.add_argument('--neighbors', type=int, nargs='+', default=[100, 1000, 5000],
+                        help='LLDP neighbor counts of the lookup runs')
+    parser.add_argument('--peers', type=int, default=2, help='VSX peers per site, each is a simulator')
+    parser.add_argument('--spec-paths', type=int, nargs='+', default=[250, 1000, 4000],
+                        help='swagger document sizes of the filter runs')
+    parser.add_argument('--interfaces', type=int, default=1000, help='interfaces of the interface bodies filter')
+    parser.add_argument('--iterations', type=int, default=5, help='timed calls per phase')
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated seconds per request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests that fail')
+    parser.add_argument('--error-status', type=int, default=503, help='status code of the failed requests')
+    parser.add_argument('--retries', type=int, default=3, help='retries of the lookup requests')
+    parser.add_argument('--backoff', type=float, default=0.01, help='seconds before the first retry of the lookup')
+    parser.add_argument('--compress', action='store_true', help='send the swagger document gzip compressed')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    # Cookies, schema cache and ztp_logs of the plugins go to a temporary directory
+    work_dir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    ztp_vars.SESSION_DIR = os.path.join(work_dir, 'sessions')
+    os.chdir(work_dir)
+    try:
+        results = {}
+        if args.only != 'filters':
+            results['lookup'] = [bench_lookup(count, args) for count in args.neighbors]
+        if args.only != 'lookup':
+            results['filters'] = [bench_filters(size, args) for size in args.spec_paths]
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+        return
+    if 'lookup' in results:
+        print_table("ztp_vars lookup, {} peers".format(args.peers), 'neighbors', results['lookup'],
+                    ('cold', 'session_cache'))
+    if 'filters' in results:
+        print_table("ztp_filter, {} interface bodies".format(args.interfaces), 'spec_paths', results['filters'],
+                    ('download', 'disk_cache', 'memory_cache', 'interface_bodies'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+# SSH CLI Benchmark - Measures login, command and logout latency of SwitchSSHCLI and CliUser against the simulator
+#
+# Usage:
+#   python bench_ssh_cli.py                                   # both platforms, default settings
+#   python bench_ssh_cli.py --platform cx --iterations 50 --latency 0.01 --output-lines 20000
+#   python bench_ssh_cli.py --json > bench.json               # machine readable results for comparisons
+#
+# Needs ansible and paramiko. The sessions run exactly the code of module_utils, the simulator runs in this process.
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import argparse
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+from ssh_switch_simulator import SwitchSimulator
+
+# The project module_utils are imported as ansible.module_utils.<name> like in the modules
+import ansible.module_utils
+ansible.module_utils.__path__.append(os.path.join(BENCH_DIR, '..', 'module_utils'))
+from ansible.module_utils.aruba_ssh import SessionModule
+from ansible.module_utils.aruba_switch_ssh import SwitchSSHCLI
+from ansible.module_utils.aruba_cx_ssh import CliUser
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(share * (len(values) - 1))))]
+
+
+def summary(values):
+    """
+    :return: dict with count, min, median, p95 and max in milliseconds
+    """
+    if not values:
+        return {}
+    return {'count': len(values), 'min_ms': round(min(values) * 1000, 2),
+            'median_ms': round(percentile(values, 0.5) * 1000, 2), 'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+            'max_ms': round(max(values) * 1000, 2)}
+
+
+def session_params(simulator):
+    return {'ip': simulator.host, 'port': simulator.port, 'user': simulator.user, 'password': simulator.password,
+            'look_for_keys': False, 'allow_agent': False, 'key_filename': None, 'timeout': 30}
+
+
+def run_platform(platform, args):
+    """
+    Runs the benchmark against a simulator of the platform
+    :return: dict of results
+    """
+    simulator = SwitchSimulator(platform, latency=args.latency, output_lines=args.output_lines).start()
+    session_class = SwitchSSHCLI if platform == 'switch' else CliUser
+    timings = {'login': [], 'short_command': [], 'bulk_command': [], 'logout': []}
+    bulk_bytes = 0
+    bulk_seconds = 0.0
+    try:
+        for iteration in range(args.sessions):
+            start = time.time()
+            session = session_class(SessionModule(session_params(simulator)))
+            timings['login'].append(time.time() - start)
+
+            execute = session.execute_show_command if platform == 'switch' else session.execute_command
+            for command in range(args.iterations):
+                start = time.time()
+                execute(["show version"])
+                timings['short_command'].append(time.time() - start)
+
+            for command in range(args.bulk_iterations):
+                start = time.time()
+                output = execute(["show tech"])[0]
+                seconds = time.time() - start
+                timings['bulk_command'].append(seconds)
+                bulk_bytes += len(output)
+                bulk_seconds += seconds
+
+            start = time.time()
+            session.logout()
+            timings['logout'].append(time.time() - start)
+    finally:
+        simulator.stop()
+
+    result = dict((name, summary(values)) for name, values in timings.items())
+    result['throughput_mb_per_s'] = round(bulk_bytes / bulk_seconds / 1e6, 2) if bulk_seconds else None
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the SSH CLI sessions of the modules against a simulator')
+    parser.add_argument('--platform', choices=['switch', 'cx', 'both'], default='both')
+    parser.add_argument('--sessions', type=int, default=5, help='logins per platform')
+    parser.add_argument('--iterations', type=int, default=20, help='short commands per session')
+    parser.add_argument('--bulk-iterations', type=int, default=3, help='bulk show commands per session')
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated seconds per command')
+    parser.add_argument('--output-lines', type=int, default=10000, help='lines of the bulk show command')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    platforms = ['switch', 'cx'] if args.platform == 'both' else [args.platform]
+    results = dict((platform, run_platform(platform, args)) for platform in platforms)
+
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+        return
+    print("{:<8} {:<14} {:>6} {:>10} {:>10} {:>10} {:>10}".format(
+        'platform', 'phase', 'count', 'min ms', 'median ms', 'p95 ms', 'max ms'))
+    for platform in platforms:
+        for phase in ('login', 'short_command', 'bulk_command', 'logout'):
+            values = results[platform][phase]
+            if values:
+                print("{:<8} {:<14} {:>6} {:>10} {:>10} {:>10} {:>10}".format(
+                    platform, phase, values['count'], values['min_ms'], values['median_ms'], values['p95_ms'],
+                    values['max_ms']))
+        print("{:<8} {:<14} {:>6} {} MB/s".format(platform, 'throughput', '', results[platform]['throughput_mb_per_s']))
+
+
+if __name__ == '__main__':
+    main()
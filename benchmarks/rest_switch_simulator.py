@@ -0,0 +1,539 @@
+# REST Switch Simulator - Local HTTPS server that answers the REST requests of the ZTP lookup, the ZTP filters and
+# the cli_batch module like an ArubaOS-CX or ArubaOS-Switch device
+#
+# Usage:
+#   python rest_switch_simulator.py --port 8443
+#   python rest_switch_simulator.py --port 8443 --neighbors 5000 --spec-paths 4000 --latency 0.02 --error-rate 0.05
+#
+# Both APIs are served at once, use 127.0.0.1:<port> as the switch ip:
+#   ArubaOS-CX:     POST /rest/v1/login and /rest/v1/logout, GET /rest/v1/system/interfaces/*/lldp_neighbors,
+#                   GET /rest/v1/system/ports/*, GET /rest/v1/system/interfaces and GET/HEAD /api/hpe-restapi.json
+#   ArubaOS-Switch: POST and DELETE /rest/<version>/login-sessions, POST /rest/<version>/cli_batch and
+#                   GET /rest/<version>/cli_batch/status
+# Login with admin/admin (--user/--password), the certificate is self signed. Every request is answered after
+# --latency seconds, a share of --error-rate of the requests gets the --error-status instead. cli_batch commands
+# take --command-time seconds each, commands starting with "invalid" fail.
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import argparse
+import base64
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import random
+import shutil
+import socket
+import ssl
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+INTERFACE_URI = "/rest/v1/system/interfaces/"
+# Ports per line card, interface names are 1/<slot>/<port>
+SLOT_PORTS = 48
+FIRMWARE_VERSION = "10.04.0001"
+
+# PUT-able attributes of the resources the ZTP filters build bodies for
+INTERFACE_PROPERTIES = [
+    ('admin', 'string'), ('description', 'string'), ('options', 'object'), ('other_config', 'object'),
+    ('user_config', 'object'), ('selftest_disable', 'boolean'), ('udld_arubaos_compatibility_mode', 'string'),
+    ('udld_compatibility', 'string'), ('udld_enable', 'boolean'), ('udld_interval', 'integer'),
+    ('udld_retries', 'integer'), ('vsx_virtual_gw_mac_v4', 'string')]
+PORT_PROPERTIES = [
+    ('admin', 'string'), ('description', 'string'), ('interfaces', 'array'), ('ip4_address', 'string'),
+    ('ip6_addresses', 'object'), ('lacp', 'string'), ('loop_protect_enable', 'boolean'), ('other_config', 'object'),
+    ('routing', 'boolean'), ('vlan_mode', 'string'), ('vlan_tag', 'string'), ('vlan_trunks', 'array'),
+    ('vrf', 'string'), ('vsx_active_forwarding_enable', 'boolean')]
+
+
+def self_signed_context(host):
+    """
+    :return: server SSL context with a new self signed certificate for the host
+    """
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, host)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(x509.random_serial_number()).not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + datetime.timedelta(days=30)).sign(key, hashes.SHA256()))
+    # The ssl module only loads certificates from files
+    directory = tempfile.mkdtemp()
+    try:
+        cert_file = os.path.join(directory, 'cert.pem')
+        key_file = os.path.join(directory, 'key.pem')
+        with open(cert_file, 'wb') as outfile:
+            outfile.write(cert.public_bytes(serialization.Encoding.PEM))
+        with open(key_file, 'wb') as outfile:
+            outfile.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL,
+                                            serialization.NoEncryption()))
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert_file, key_file)
+    finally:
+        shutil.rmtree(directory)
+    return context
+
+
+def interface_name(index):
+    return "1/{}/{}".format(index // SLOT_PORTS + 1, index % SLOT_PORTS + 1)
+
+
+def interface_uri(name):
+    return INTERFACE_URI + quote(name, safe='')
+
+
+def neighbor_mac(index):
+    return "00:0b:86:{:02x}:{:02x}:{:02x}".format((index >> 16) & 255, (index >> 8) & 255, index & 255)
+
+
+def neighbor_ip(index):
+    """
+    :return: temporary (DHCP) ip of a neighbor
+    """
+    number = index + 1
+    return "10.{}.{}.{}".format((number >> 16) & 255, (number >> 8) & 255, number & 255)
+
+
+def lldp_neighbors(count):
+    """
+    LLDP neighbors of GET /rest/v1/system/interfaces/*/lldp_neighbors?depth=1, one neighbor per interface
+    :param count: number of neighbors
+    :return: list of neighbor objects
+    """
+    neighbors = []
+    for index in range(count):
+        mac = neighbor_mac(index)
+        neighbors.append({
+            'chassis_id': mac, 'mac_addr': mac, 'port_id': "1/1/{}".format(index % 2 + 49),
+            'interface': [interface_uri(interface_name(index))],
+            'neighbor_info': {
+                'chassis_name': "ztp-switch-{}".format(index + 1), 'chassis_id_subtype': 'link_local_addr',
+                'chassis_description': "Aruba JL658A 6300M 24SFP+ 4SFP56 Swch FL.10.04.0001",
+                'chassis_capability_available': 'Bridge, Router', 'chassis_capability_enabled': 'Bridge, Router',
+                'mgmt_ip_list': neighbor_ip(index), 'mgmt_iface_list': '', 'port_description': '',
+                'port_id_subtype': 'if_name', 'port_vlan_id': '1', 'system_ttl': '120'},
+            'neighbor_info_ttl': 120})
+    return neighbors
+
+
+def lag_ports(count):
+    """
+    Ports of GET /rest/v1/system/ports/*?attributes=interfaces,name, two neighbor interfaces per LAG
+    :param count: number of neighbors
+    :return: list of port objects
+    """
+    ports = []
+    for number in range((count + 1) // 2):
+        members = range(2 * number, min(count, 2 * number + 2))
+        ports.append({'name': "lag{}".format(number + 1),
+                      'interfaces': [interface_uri(interface_name(index)) for index in members]})
+    ports.append({'name': 'vlan1', 'interfaces': [interface_uri('vlan1')]})
+    return ports
+
+
+def interfaces(count):
+    """
+    Interfaces of GET /rest/v1/system/interfaces?depth=1
+    :param count: number of interfaces
+    :return: dict of interface name to interface object
+    """
+    result = {}
+    for index in range(count):
+        name = interface_name(index)
+        entry = {'name': name, 'admin': 'up', 'description': '', 'options': {}, 'other_config': {},
+                 'user_config': {'admin': 'up', 'autoneg': 'on'}, 'selftest_disable': False,
+                 'udld_arubaos_compatibility_mode': 'forward_then_verify', 'udld_compatibility': 'aruba_os',
+                 'udld_enable': False, 'udld_interval': 7000, 'udld_retries': 4, 'vsx_virtual_gw_mac_v4': None}
+        # Status attributes are not PUT-able
+        entry.update({'error': None, 'hw_intf_info': {'connector': 'SFP+', 'speeds': '1000,10000'},
+                      'link_state': 'up', 'link_speed': 10000000000, 'mtu': 1500, 'type': 'system',
+                      'statistics': dict(("{}_{}".format(direction, counter), index * 1000)
+                                         for direction in ('rx', 'tx')
+                                         for counter in ('bytes', 'packets', 'errors', 'dropped'))})
+        result[name] = entry
+    return result
+
+
+def resource_schema(name, properties):
+    """
+    :param properties: list of attribute name and type tuples
+    :return: schema object of the data parameter and the definition of a resource
+    """
+    schema = {}
+    for attribute, kind in properties:
+        schema[attribute] = {'type': kind, 'description': "{} of the {}. Changing it takes effect immediately and is "
+                                                          "kept in the running configuration.".format(attribute, name)}
+    return {'type': 'object', 'properties': schema}
+
+
+def item_path(name, properties):
+    """
+    :return: path object of /system/<resources>/{id} with get, put and delete
+    """
+    query = [{'name': 'attributes', 'in': 'query', 'type': 'array', 'items': {'type': 'string'},
+              'collectionFormat': 'csv', 'description': 'Attributes to be included in the response'},
+             {'name': 'depth', 'in': 'query', 'type': 'integer', 'minimum': 0, 'maximum': 4,
+              'description': 'Maximum depth of the object references'},
+             {'name': 'selector', 'in': 'query', 'type': 'string', 'enum': ['configuration', 'status', 'statistics'],
+              'description': 'Attribute category to be included in the response'}]
+    identifier = {'name': 'id', 'in': 'path', 'type': 'string', 'required': True,
+                  'description': 'Identifier of the {}'.format(name)}
+    responses = {'200': {'description': 'OK', 'schema': {'$ref': '#/definitions/{}'.format(name)}},
+                 '400': {'description': 'Bad Request'}, '401': {'description': 'Unauthorized'},
+                 '404': {'description': 'Not Found'}}
+    return {
+        'get': {'tags': [name], 'summary': 'Get {}'.format(name), 'parameters': [identifier] + query,
+                'responses': responses},
+        'put': {'tags': [name], 'summary': 'Update {}'.format(name),
+                'parameters': [identifier, {'name': 'data', 'in': 'body', 'required': True,
+                                            'schema': resource_schema(name, properties)}],
+                'responses': {'200': {'description': 'OK'}, '400': {'description': 'Bad Request'},
+                              '404': {'description': 'Not Found'}}},
+        'delete': {'tags': [name], 'summary': 'Delete {}'.format(name), 'parameters': [identifier],
+                   'responses': {'204': {'description': 'Deleted'}, '404': {'description': 'Not Found'}}}}
+
+
+def collection_path(name, properties):
+    """
+    :return: path object of /system/<resources> with get and post
+    """
+    return {
+        'get': {'tags': [name], 'summary': 'Get all {}s'.format(name),
+                'parameters': [{'name': 'depth', 'in': 'query', 'type': 'integer', 'minimum': 0, 'maximum': 4}],
+                'responses': {'200': {'description': 'OK', 'schema': {'type': 'array', 'items': {'type': 'string'}}}}},
+        'post': {'tags': [name], 'summary': 'Create {}'.format(name),
+                 'parameters': [{'name': 'data', 'in': 'body', 'required': True,
+                                 'schema': resource_schema(name, properties)}],
+                 'responses': {'201': {'description': 'Created'}, '400': {'description': 'Bad Request'}}}}
+
+
+def hpe_restapi(path_count, property_count=40):
+    """
+    Swagger document of GET /api/hpe-restapi.json, paths come before the definitions like on the switch
+    :param path_count: number of paths, the interface and port paths are always included
+    :param property_count: attributes of each generated resource
+    :return: swagger object
+    """
+    resources = [('Interface', 'interfaces', INTERFACE_PROPERTIES), ('Port', 'ports', PORT_PROPERTIES)]
+    generated = [("attribute_{}".format(number), 'string' if number % 3 else 'integer')
+                 for number in range(property_count)]
+    number = 0
+    while len(resources) * 2 < path_count:
+        number += 1
+        resources.append(('Resource{}'.format(number), 'resources{}'.format(number), generated))
+
+    paths = {}
+    definitions = {}
+    for name, collection, properties in resources:
+        paths["/system/{}".format(collection)] = collection_path(name, properties)
+        paths["/system/{}/{{id}}".format(collection)] = item_path(name, properties)
+        definitions[name] = resource_schema(name, properties)
+    return {'swagger': '2.0', 'info': {'title': 'AOS-CX REST API', 'version': FIRMWARE_VERSION},
+            'basePath': '/rest/v1', 'schemes': ['https'], 'consumes': ['application/json'],
+            'produces': ['application/json'], 'paths': paths, 'definitions': definitions}
+
+
+def to_json(data):
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+class RestHandler(BaseHTTPRequestHandler):
+
+    # Keep-alive like the switch, the clients reuse their connections
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.simulator.handle(self, 'GET')
+
+    def do_HEAD(self):
+        self.server.simulator.handle(self, 'HEAD')
+
+    def do_POST(self):
+        self.server.simulator.handle(self, 'POST')
+
+    def do_PUT(self):
+        self.server.simulator.handle(self, 'PUT')
+
+    def do_DELETE(self):
+        self.server.simulator.handle(self, 'DELETE')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HttpsServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+    request_queue_size = 100
+
+    def __init__(self, address, context, simulator):
+        HTTPServer.__init__(self, address, RestHandler)
+        self.context = context
+        self.simulator = simulator
+
+    def finish_request(self, request, client_address):
+        # The TLS handshake runs in the thread of the connection, not in the accepting thread
+        request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            connection = self.context.wrap_socket(request, server_side=True)
+        except (ssl.SSLError, socket.error, OSError):
+            return
+        try:
+            RestHandler(connection, client_address, self)
+        except (ssl.SSLError, socket.error, OSError):
+            pass
+        finally:
+            connection.close()
+
+
+class RestSwitchSimulator(object):
+
+    def __init__(self, host='127.0.0.1', port=0, user='admin', password='admin', neighbors=100, spec_paths=1000,
+                 latency=0.0, error_rate=0.0, error_status=503, command_time=0.001, compress=False, seed=None):
+        """
+        HTTPS server in a background thread, the fixtures are built once at start
+        :param port: TCP port, 0 picks a free port
+        :param neighbors: number of LLDP neighbors, LAGs and interfaces
+        :param spec_paths: number of paths in the swagger document
+        :param latency: seconds before each request is answered
+        :param error_rate: share of requests that get the error status instead of their answer
+        :param error_status: status code of the injected errors, 401 expires the session
+        :param command_time: seconds each cli_batch command takes
+        :param compress: send the swagger document gzip compressed to clients that accept it
+        :param seed: seed of the error injection
+        """
+        self.user = user
+        self.password = password
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.command_time = command_time
+        self.compress = compress
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.sessions = set()
+        self.batches = {}
+        self.stats = Counter()
+
+        self.lldp_json = to_json(lldp_neighbors(neighbors))
+        self.ports_json = to_json(lag_ports(neighbors))
+        self.interfaces_json = to_json(interfaces(neighbors))
+        self.spec_json = to_json(hpe_restapi(spec_paths))
+        self.spec_gzip = gzip.compress(self.spec_json) if compress else None
+        self.spec_etag = '"{}"'.format(hashlib.sha1(self.spec_json).hexdigest()[:16])
+
+        self.server = HttpsServer((host, port), self_signed_context(host), self)
+        self.host = host
+        self.port = self.server.server_address[1]
+        self.address = "{}:{}".format(host, self.port)
+
+    def start(self):
+        """
+        Serves requests in a daemon thread
+        :return: self
+        """
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def inject_error(self, resource):
+        """
+        :return: True if the request gets the error status
+        """
+        if not self.error_rate:
+            return False
+        # A login can not be answered with an expired session
+        if self.error_status == 401 and resource in ('login', 'logout', 'login-sessions'):
+            return False
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    def session(self, handler):
+        """
+        :return: session token of the request cookie or None if it is not logged in
+        """
+        cookies = handler.headers.get('Cookie') or ''
+        for cookie in cookies.split(';'):
+            name, _, value = cookie.strip().partition('=')
+            if name in ('id', 'sessionId') and value in self.sessions:
+                return value
+        return None
+
+    def handle(self, handler, method):
+        url = urlparse(handler.path)
+        length = int(handler.headers.get('Content-Length') or 0)
+        body = handler.rfile.read(length) if length else b''
+        if self.latency:
+            time.sleep(self.latency)
+
+        path = unquote(url.path)
+        resource = path.split('/', 3)[3] if path.startswith('/rest/') and path.count('/') >= 3 else path
+        with self.lock:
+            self.stats[method + ' ' + resource] += 1
+        if self.inject_error(resource):
+            with self.lock:
+                self.stats['injected_errors'] += 1
+            if self.error_status == 401:
+                # The switch forgot the session, the client has to log in again
+                with self.lock:
+                    self.sessions.discard(self.session(handler))
+            self.send(handler, self.error_status, {'message': 'Injected error'})
+            return
+
+        if path == '/api/hpe-restapi.json' and method == 'HEAD':
+            self.send(handler, 200, None, {'ETag': self.spec_etag}, length=len(self.spec_json))
+        elif path == '/api/hpe-restapi.json' and method == 'GET':
+            if self.spec_gzip is not None and 'gzip' in (handler.headers.get('Accept-Encoding') or ''):
+                self.send(handler, 200, self.spec_gzip, {'Content-Encoding': 'gzip'})
+            else:
+                self.send(handler, 200, self.spec_json)
+        elif not path.startswith('/rest/'):
+            self.send(handler, 404, {'message': 'Not Found'})
+        elif resource == 'login' and method == 'POST':
+            self.login(handler, parse_qs(url.query))
+        elif resource == 'login-sessions' and method == 'POST':
+            self.switch_login(handler, body)
+        elif self.session(handler) is None:
+            self.send(handler, 401, {'message': 'Unauthorized'})
+        elif resource in ('logout', 'login-sessions'):
+            with self.lock:
+                self.sessions.discard(self.session(handler))
+            self.send(handler, 200 if resource == 'logout' else 204, None)
+        elif resource == 'system/interfaces/*/lldp_neighbors' and method == 'GET':
+            self.send(handler, 200, self.lldp_json)
+        elif resource == 'system/ports/*' and method == 'GET':
+            self.send(handler, 200, self.ports_json)
+        elif resource == 'system/interfaces' and method == 'GET':
+            self.send(handler, 200, self.interfaces_json)
+        elif resource == 'cli_batch' and method == 'POST':
+            self.start_batch(handler, body)
+        elif resource == 'cli_batch/status' and method == 'GET':
+            self.send(handler, 200, self.batch_status(self.session(handler)))
+        else:
+            self.send(handler, 404, {'message': 'Not Found'})
+
+    def login(self, handler, query):
+        """
+        ArubaOS-CX login, the session cookie is named id
+        """
+        if (query.get('username', [None])[0], query.get('password', [None])[0]) != (self.user, self.password):
+            self.send(handler, 401, {'message': 'Login failed'})
+            return
+        token = uuid.uuid4().hex
+        with self.lock:
+            self.sessions.add(token)
+        self.send(handler, 200, None, {'Set-Cookie': 'id={}; Path=/; HttpOnly'.format(token)})
+
+    def switch_login(self, handler, body):
+        """
+        ArubaOS-Switch login, the cookie is returned in the body
+        """
+        try:
+            credentials = json.loads(body.decode('utf-8'))
+        except ValueError:
+            credentials = {}
+        if (credentials.get('userName'), credentials.get('password')) != (self.user, self.password):
+            self.send(handler, 401, {'message': 'Login failed'})
+            return
+        token = uuid.uuid4().hex
+        with self.lock:
+            self.sessions.add(token)
+        self.send(handler, 201, {'uri': '/login-sessions', 'cookie': 'sessionId={}'.format(token)})
+
+    def start_batch(self, handler, body):
+        try:
+            encoded = json.loads(body.decode('utf-8'))['cli_batch_base64_encoded']
+            commands = [line for line in base64.b64decode(encoded).decode('utf-8').splitlines() if line.strip()]
+        except (ValueError, KeyError, TypeError):
+            self.send(handler, 400, {'message': 'Invalid cli_batch body'})
+            return
+        with self.lock:
+            self.batches[self.session(handler)] = (commands, time.time())
+        self.send(handler, 202, {'message': 'Batch started'})
+
+    def batch_status(self, token):
+        """
+        :return: cli_batch status of the last batch of the session, commands finish one after the other
+        """
+        if token not in self.batches:
+            return {'status': 'CBS_COMPLETED', 'cmd_exec_logs': []}
+        commands, started = self.batches[token]
+        finished = int((time.time() - started) / self.command_time) if self.command_time else len(commands)
+        logs = []
+        for index, command in enumerate(commands):
+            if index >= finished:
+                logs.append({'cmd': command, 'status': 'CCS_IN_PROGRESS', 'result': ''})
+                return {'status': 'CBS_IN_PROGRESS', 'cmd_exec_logs': logs}
+            if command.split()[0] == 'invalid':
+                logs.append({'cmd': command, 'status': 'CCS_FAILURE', 'result': 'Invalid input: invalid'})
+                return {'status': 'CBS_COMPLETED', 'cmd_exec_logs': logs}
+            logs.append({'cmd': command, 'status': 'CCS_SUCCESS', 'result': ''})
+        return {'status': 'CBS_COMPLETED', 'cmd_exec_logs': logs}
+
+    def send(self, handler, status, data, headers=None, length=None):
+        """
+        :param data: bytes, object that is sent as JSON or None for an empty body
+        :param length: Content-Length of a HEAD answer, the body is not sent
+        """
+        if data is None:
+            data = b''
+        elif not isinstance(data, bytes):
+            data = to_json(data)
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(data) if length is None else length))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulates the REST API of an ArubaOS-CX and ArubaOS-Switch device')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8443)
+    parser.add_argument('--user', default='admin')
+    parser.add_argument('--password', default='admin')
+    parser.add_argument('--neighbors', type=int, default=100, help='LLDP neighbors, LAGs and interfaces')
+    parser.add_argument('--spec-paths', type=int, default=1000, help='paths of the swagger document')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before each request is answered')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests that fail')
+    parser.add_argument('--error-status', type=int, default=503, help='status code of the failed requests')
+    parser.add_argument('--command-time', type=float, default=0.001, help='seconds per cli_batch command')
+    parser.add_argument('--compress', action='store_true', help='send the swagger document gzip compressed')
+    args = parser.parse_args()
+
+    simulator = RestSwitchSimulator(args.host, args.port, args.user, args.password, args.neighbors, args.spec_paths,
+                                    args.latency, args.error_rate, args.error_status, args.command_time,
+                                    args.compress).start()
+    print("Serving {} neighbors and {} swagger paths ({} bytes) on https://{}, stop with Ctrl+C".format(
+        args.neighbors, args.spec_paths, len(simulator.spec_json), simulator.address))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        simulator.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,305 @@
+# SSH Switch Simulator - Local paramiko server that behaves like the CLI of an ArubaOS-Switch or ArubaOS-CX device
+#
+# Usage:
+#   python ssh_switch_simulator.py --platform switch --port 2222
+#   python ssh_switch_simulator.py --platform cx --port 2223 --latency 0.05 --output-lines 5000
+#
+# Login with admin/admin (--user/--password). ArubaOS-Switch sessions start with the "Press any key to continue"
+# banner, use ANSI decorated prompts and ask the logout and save questions. ArubaOS-CX sessions use plain
+# "hostname# " prompts. Every command is answered after --latency seconds, show commands that are not simulated
+# return --output-lines lines.
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import argparse
+import logging
+import socket
+import threading
+import time
+
+import paramiko
+
+# Clients that close the connection without a proper disconnect are expected, e.g. the CX logout
+logging.getLogger('paramiko.transport').setLevel(logging.CRITICAL)
+
+SWITCH_BANNER = ("\r\nHP J9729A 2920-48G-PoE+ Switch\r\nSoftware revision WC.16.06.0006\r\n\r\n"
+                 "(C) Copyright 2018 Hewlett Packard Enterprise Development LP\r\n\r\n"
+                 "Press any key to continue\r\n")
+# Clear screen, scroll region and cursor positioning like the ArubaOS-Switch CLI sends them around each prompt
+SWITCH_PROMPT = "\x1b[24;1H\x1b[2K{}\x1b[24;{}H\x1b[?25h"
+
+SWITCH_FLASH = """Image           Size (bytes) Date     Version
+--------------- ------------ -------- --------------
+Primary Image   :   26571864 03/27/19 WC.16.06.0006
+Secondary Image :   26335528 11/19/18 WC.16.05.0007
+
+Boot ROM Version
+----------------
+Primary Boot ROM Version   : WC.17.02.0006
+Secondary Boot ROM Version : WC.17.02.0006
+
+Default Boot Image   : Primary"""
+
+SWITCH_VERSION = """Image stamp:    /ws/swbuildm/rel_richmond_qaoff/code/build/lvm(swbuildm_rel_richmond_qaoff_rel_richmond)
+                Mar 27 2019 13:17:32
+                WC.16.06.0006
+                2038
+Boot Image:     Primary"""
+
+CX_VERSION = """-----------------------------------------------------------------------------
+ArubaOS-CX
+(c) Copyright 2017-2020 Hewlett Packard Enterprise Development LP
+-----------------------------------------------------------------------------
+Version      : GL.10.04.0001
+Build Date   : 2019-11-01 17:50:09 UTC
+Active Image : primary"""
+
+
+def switch_running_config(hostname, lines):
+    config = ["Running configuration:", "", "; J9729A Configuration Editor; Created on release #WC.16.06.0006",
+              "", 'hostname "{}"'.format(hostname)]
+    for vlan in range(1, max(2, lines // 4)):
+        config.extend(["vlan {}".format(vlan), '   name "VLAN{}"'.format(vlan), "   untagged {}".format(vlan), "   exit"])
+    return "\r\n".join(config)
+
+
+def bulk_output(command, lines):
+    """
+    :return: output with the given number of 80 character lines
+    """
+    return "\r\n".join("{:<6} {:<73}".format(number, command) for number in range(1, lines + 1))
+
+
+class SimulatorInterface(paramiko.ServerInterface):
+
+    def __init__(self, user, password):
+        self.user = user
+        self.password = password
+        self.shell = threading.Event()
+
+    def check_auth_password(self, username, password):
+        if (username, password) == (self.user, self.password):
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        self.shell.set()
+        return True
+
+
+class CliSession(object):
+
+    def __init__(self, channel, platform, hostname, latency, output_lines):
+        """
+        CLI of one SSH session
+        :param channel: paramiko channel of the shell
+        :param platform: 'switch' or 'cx'
+        :param hostname: hostname in the prompt
+        :param latency: seconds before each command is answered
+        :param output_lines: lines of the output of show commands that are not simulated
+        """
+        self.channel = channel
+        self.platform = platform
+        self.hostname = hostname
+        self.latency = latency
+        self.output_lines = output_lines
+        self.config_mode = False
+        self.buffer = b''
+
+    def prompt(self):
+        prompt = "{}{}# ".format(self.hostname, "(config)" if self.config_mode else "")
+        if self.platform == 'switch':
+            return SWITCH_PROMPT.format(prompt, len(prompt) + 1)
+        return prompt
+
+    def send(self, text):
+        self.channel.sendall(text.encode('utf-8'))
+
+    def read_line(self):
+        """
+        :return: next line without line end, None if the client closed the channel
+        """
+        while b'\n' not in self.buffer and b'\r' not in self.buffer:
+            data = self.channel.recv(4096)
+            if not data:
+                return None
+            self.buffer += data
+        for separator in (b'\r\n', b'\n', b'\r'):
+            if separator in self.buffer:
+                line, self.buffer = self.buffer.split(separator, 1)
+                return line.decode('utf-8', 'ignore')
+
+    def ask(self, question):
+        """
+        Sends a question and waits for the answer
+        :return: answer or None if the client closed the channel
+        """
+        self.send(question)
+        return self.read_line()
+
+    def output(self, command):
+        """
+        :return: output of a command or None if the session ends
+        """
+        words = command.split()
+        if not words:
+            return ""
+        if words[0] in ('conf', 'configure'):
+            self.config_mode = True
+            return ""
+        if words[0] == 'end':
+            self.config_mode = False
+            return ""
+        if words[0] == 'exit':
+            if self.config_mode:
+                self.config_mode = False
+                return ""
+            return None
+        if words[0] == 'logout' and self.platform == 'switch':
+            if (self.ask("\r\nDo you want to log out [y/n]? ") or '').strip().lower() != 'y':
+                return ""
+            self.ask("\r\nDo you want to save current configuration [y/n/^C]? ")
+            return None
+        if words[0] in ('no', 'page') or self.config_mode:
+            return ""
+        if words[0] in ('sh', 'show'):
+            topic = " ".join(words[1:])
+            if topic.startswith('fl') and self.platform == 'switch':
+                return SWITCH_FLASH.replace("\n", "\r\n")
+            if topic.startswith('ver'):
+                return (SWITCH_VERSION if self.platform == 'switch' else CX_VERSION).replace("\n", "\r\n")
+            if topic.startswith('run') and self.platform == 'switch':
+                return switch_running_config(self.hostname, self.output_lines)
+            return bulk_output(command, self.output_lines)
+        return "Invalid input: {}".format(words[0])
+
+    def run(self):
+        if self.platform == 'switch':
+            self.send(SWITCH_BANNER)
+            # Any key continues
+            if not self.channel.recv(1):
+                return
+            self.buffer = b''
+            self.send("\x1b[2J\x1b[?7l\x1b[3;23r\x1b[?6l" + self.prompt())
+        else:
+            self.send("\r\n" + self.prompt())
+
+        while True:
+            command = self.read_line()
+            if command is None:
+                return
+            # The CLI echoes the command
+            self.send(command + "\r\n")
+            if self.latency:
+                time.sleep(self.latency)
+            text = self.output(command.strip())
+            if text is None:
+                return
+            self.send((text + "\r\n" if text else "") + self.prompt())
+
+
+class SwitchSimulator(object):
+
+    def __init__(self, platform='switch', host='127.0.0.1', port=0, user='admin', password='admin',
+                 hostname=None, latency=0.0, output_lines=100):
+        """
+        SSH server in a background thread, every connection gets its own CLI session
+        :param platform: 'switch' for ArubaOS-Switch or 'cx' for ArubaOS-CX behavior
+        :param port: TCP port, 0 picks a free port
+        """
+        self.platform = platform
+        self.user = user
+        self.password = password
+        self.hostname = hostname or ("HP-2920-48G-PoEP" if platform == 'switch' else "switch")
+        self.latency = latency
+        self.output_lines = output_lines
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(100)
+        self.host = host
+        self.port = self.sock.getsockname()[1]
+        self.running = False
+
+    def start(self):
+        """
+        Accepts connections in a daemon thread
+        :return: self
+        """
+        self.running = True
+        thread = threading.Thread(target=self.serve)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        self.sock.close()
+
+    def serve(self):
+        while self.running:
+            try:
+                client, address = self.sock.accept()
+            except (socket.error, OSError):
+                return
+            thread = threading.Thread(target=self.handle, args=(client,))
+            thread.daemon = True
+            thread.start()
+
+    def handle(self, client):
+        # Answers go out at once like on a switch, Nagle would add delayed ACK waits to every command
+        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        transport = paramiko.Transport(client)
+        transport.add_server_key(self.host_key)
+        interface = SimulatorInterface(self.user, self.password)
+        try:
+            transport.start_server(server=interface)
+            channel = transport.accept(30)
+            if channel is None or not interface.shell.wait(30):
+                return
+            CliSession(channel, self.platform, self.hostname, self.latency, self.output_lines).run()
+            channel.close()
+        except (paramiko.SSHException, socket.error, EOFError):
+            pass
+        finally:
+            transport.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulates the SSH CLI of an ArubaOS-Switch or ArubaOS-CX device')
+    parser.add_argument('--platform', choices=['switch', 'cx'], default='switch')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2222)
+    parser.add_argument('--user', default='admin')
+    parser.add_argument('--password', default='admin')
+    parser.add_argument('--hostname', default=None, help='hostname in the prompt')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before each command is answered')
+    parser.add_argument('--output-lines', type=int, default=100, help='lines of bulk show command outputs')
+    args = parser.parse_args()
+
+    simulator = SwitchSimulator(args.platform, args.host, args.port, args.user, args.password, args.hostname,
+                                args.latency, args.output_lines).start()
+    print("Simulating {} on {}:{}, stop with Ctrl+C".format(args.platform, simulator.host, simulator.port))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        simulator.stop()
+
+
+if __name__ == '__main__':
+    main()
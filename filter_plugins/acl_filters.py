@@ -0,0 +1,57 @@
+# ACL Filter - Compile ACL entries and build the changes against the ACL on an ArubaOS-CX Switch
+
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+# Python imports
+import os
+
+# Ansible import
+from ansible.errors import AnsibleParserError
+from ansible.module_utils._text import to_native
+
+# Code shared with the modules is imported from the module_utils directory of this repository, under the same
+# ansible.module_utils names as in the modules
+import ansible.module_utils
+MODULE_UTILS = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'module_utils'))
+if MODULE_UTILS not in ansible.module_utils.__path__:
+    ansible.module_utils.__path__.append(MODULE_UTILS)
+from ansible.module_utils.aruba_acl import AclError, compile_acl, diff_acl
+
+
+def compile_acl_entries(entries, prune=False):
+    """
+    Normalizes the ACL entries and finds entries that can never match
+    :param entries: dict of sequence number to entry, e.g. v4_acl_entries
+    :param prune: leave out duplicate, redundant and shadowed entries, by default they are kept and only reported
+    :return: dict with entries, duplicates, redundant and shadowed
+    """
+    try:
+        return compile_acl(entries, prune)
+    except AclError as error:
+        raise AnsibleParserError(to_native(error))
+
+
+def acl_changes(current, wanted):
+    """
+    Builds the entries to add, update and remove
+    :param current: json of GET /system/acls/<name>,<type>?depth=2 or its cfg_aces
+    :param wanted: dict of sequence number to entry, e.g. the entries of compile_acl
+    :return: dict with add, update (entries in the format of the REST API), remove and unchanged
+    """
+    try:
+        return diff_acl(current, wanted)
+    except AclError as error:
+        raise AnsibleParserError(to_native(error))
+
+
+class FilterModule(object):
+
+    def filters(self):
+        return {
+            'compile_acl': compile_acl_entries,
+            'acl_changes': acl_changes
+        }
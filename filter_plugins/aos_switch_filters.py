@@ -7,7 +7,15 @@ from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
 # Python imports
-import re
+import os
+
+# Code shared with the modules is imported from the module_utils directory of this repository, under the same
+# ansible.module_utils names as in the modules
+import ansible.module_utils
+MODULE_UTILS = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'module_utils'))
+if MODULE_UTILS not in ansible.module_utils.__path__:
+    ansible.module_utils.__path__.append(MODULE_UTILS)
+from ansible.module_utils.aruba_firmware import parse_flash, compare_versions
 
 # Ansible import
 from ansible.module_utils._text import to_bytes, to_native, to_text
@@ -56,6 +64,21 @@ def keep_string(boolean):
         return "no"
 
 
+# Parsed show flash outputs of this run, keyed by the raw output
+FLASH_CACHE = {}
+
+
+def cached_flash(serach_string):
+    """
+    Parses show flash output only once per distinct output
+    :param serach_string: show flash output
+    :return: FlashInventory object
+    """
+    if serach_string not in FLASH_CACHE:
+        FLASH_CACHE[serach_string] = parse_flash(serach_string)
+    return FLASH_CACHE[serach_string]
+
+
 def find_version(serach_string, version):
     """
     Return the current SWI Version of the selected Image
@@ -63,20 +86,35 @@ def find_version(serach_string, version):
     :param version: string for one of the following (primary,secondary,primary_boot,secondary_boot)
     :return: SWI Version as string
     """
-    regex = u"(?:WC|YA|YC|KB|WB|K|KB)\.[0-9]{2}\.[0-9]{2}\.[0-9]{4}"
-    matches = re.findall(regex, serach_string)
-    if version == "primary":
-        return matches[0]
-    elif version == "secondary":
-        return matches[1]
-    elif version == "primary_boot":
-        return matches[2]
-    elif version == "secondary_boot":
-        return matches[3]
-    else:
-        raise AnsibleParserError(
-            'No correct version selector entered. Choose one of the following:'
-            ' primary,secondary,primary_boot,secondary_boot. You entered: %s .' % to_text(version))
+    try:
+        current_version = cached_flash(serach_string).image(version)
+    except ValueError as error:
+        raise AnsibleParserError(to_native(error))
+    if current_version is None:
+        return ""
+    return str(current_version)
+
+
+def flash_info(serach_string):
+    """
+    Parses show flash output into a dict
+    :param serach_string: show flash output
+    :return: dict with primary, secondary, primary_boot, secondary_boot and default_boot
+    """
+    return cached_flash(serach_string).to_dict()
+
+
+def compare_swi_version(current_version, to_be_version):
+    """
+    Compares SWI versions by release numbers instead of string order
+    :param current_version: version like WC.16.05.0007 or WC_16_05_0007
+    :param to_be_version: version like WC.16.05.0007 or WC_16_05_0007
+    :return: -1 if current version is lower, 0 if equal, 1 if higher
+    """
+    try:
+        return compare_versions(current_version, to_be_version)
+    except ValueError as error:
+        raise AnsibleParserError(to_native(error))
 
 
 class FilterModule(object):
@@ -86,5 +124,7 @@ class FilterModule(object):
             # Put Body creation
             'make_snmp_host_body': build_snmp_host_body,
             'keep_string': keep_string,
-            'find_version': find_version
+            'find_version': find_version,
+            'flash_info': flash_info,
+            'compare_swi_version': compare_swi_version
         }
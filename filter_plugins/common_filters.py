@@ -7,11 +7,20 @@ from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
 # Python imports
+import os
 
 # Ansible import
 from ansible.errors import AnsibleParserError
 from ansible.module_utils._text import to_bytes, to_native, to_text
 
+# Code shared with the modules is imported from the module_utils directory of this repository, under the same
+# ansible.module_utils names as in the modules
+import ansible.module_utils
+MODULE_UTILS = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'module_utils'))
+if MODULE_UTILS not in ansible.module_utils.__path__:
+    ansible.module_utils.__path__.append(MODULE_UTILS)
+from ansible.module_utils.aruba_show_parsers import ParseError, parse_output
+
 
 def json_type_converter(current_dict, typelist):
     """
@@ -35,10 +44,26 @@ def json_type_converter(current_dict, typelist):
     return current_dict
 
 
+def parse_cli(output, command, platform='switch'):
+    """
+    Parses the output of a show command into typed data, e.g. "{{ result.cli_output[0] | parse_cli('show vlans') }}"
+    :param output: output of the command
+    :param command: show command that created the output, can be abbreviated
+    :param platform: 'switch' for ArubaOS-Switch or 'cx' for ArubaOS-CX
+    :return: dict or list of dicts
+    """
+    try:
+        return parse_output(command, output, platform)
+    except ParseError as error:
+        raise AnsibleParserError(to_native(error))
+
+
 class FilterModule(object):
 
     def filters(self):
         return {
             # Put Body creation
-            'json_type_converter': json_type_converter
+            'json_type_converter': json_type_converter,
+            # Show command parsing
+            'parse_cli': parse_cli
         }
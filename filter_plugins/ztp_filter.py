@@ -6,7 +6,7 @@ from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
 # Python Imports
-from requests import get
+import os
 import urllib3
 import base64
 
@@ -16,69 +16,127 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 from ansible.module_utils._text import to_bytes, to_native, to_text
 from ansible.errors import AnsibleParserError
 
+# Code shared with the modules is imported from the module_utils directory of this repository, under the same
+# ansible.module_utils names as in the modules
+import ansible.module_utils
+MODULE_UTILS = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'module_utils'))
+if MODULE_UTILS not in ansible.module_utils.__path__:
+    ansible.module_utils.__path__.append(MODULE_UTILS)
+from ansible.module_utils.aruba_rest_schema import SchemaCache, SchemaError
+from ansible.module_utils.aruba_cli_batch import MAX_BYTES, MAX_LINES, encode_batch, split_batches
 
-def fetch_allowed_list(path, ip):
+# Swagger documents are cached in memory and on disk per firmware version
+SCHEMA_CACHE = SchemaCache()
+
+
+def fetch_allowed_list(path, ip, firmware_version=None):
     """
     Fetches all allowed attributes for a certain api path
+    Reads the path from the schema index, the swagger document is only downloaded if it is not cached
+    for the firmware version of the switch
     :param path: Swagger URI to resource
     :param ip: IP of the AOS-CX Switch
+    :param firmware_version: firmware version of the switch, cx_firmware_version of login_cx.yml, key of the cache
     :return: list of strings that represent attributes of the resource
     """
-    # Get API Object
-    response = get("https://{}/api/hpe-restapi.json".format(ip), verify=False)
-    if response.status_code != 200:
-        raise AnsibleParserError(
-            'Get API Object Request Failed with Status Code %s .' % to_text(str(response.status_code)))
-
-    # Var Dec
-    tmp_object = response.json()['paths']
-    allowed_list = []
+    # Get API index, the swagger document is only downloaded if the firmware version is not cached
+    try:
+        entry = SCHEMA_CACHE.get_index(ip, firmware_version).entry(path)
+    except SchemaError as error:
+        raise AnsibleParserError(to_native(error))
 
     # Get all properties of the path
-    if path in tmp_object:
-        if "put" in tmp_object[path]:
-            for parameter in tmp_object[path]['put']['parameters']:
-                if parameter['name'] != "data":
-                    continue
-                else:
-                    allowed_list = list(parameter['schema']['properties'].keys())
-        else:
-            raise AnsibleParserError('No Put Method exists for the path %s .' % to_text(str(path)))
-    else:
+    if entry is None:
         raise AnsibleParserError('No API Object exists for the path %s .' % to_text(str(path)))
+    if not entry['put']:
+        raise AnsibleParserError('No Put Method exists for the path %s .' % to_text(str(path)))
+
+    allowed_list = list(entry['properties'].keys())
 
     return allowed_list
 
 
-def build_interface_body(current_dict, ip, change_list):
+def copy_allowed(current_dict, allowed_list):
     """
-    Build put body for interface and changes the description to hostname
+    Copies each allowed attribute that exists in the get response
     :param current_dict: get response json object
-    :param ip: ip of AOS-CX Switch
-    :param change_list: list of params, value pairs you want to change
+    :param allowed_list: list of PUT-able attributes
     :return: json object (dict)
     """
     data = {}
-    allowed_list = fetch_allowed_list("/system/interfaces/{id}", ip)
-
-    # Build data object for each allowed attribute that exists in the get response
     for attribute in allowed_list:
         if attribute in current_dict:
             data[attribute] = current_dict[attribute]
-    # change description to hostname
+    return data
+
+
+def apply_changes(data, change_list):
+    """
+    Applies a list of params, value pairs to a put body
+    A value of ['sub_dict', key, value] only changes one key of a dict attribute
+    :param data: put body
+    :param change_list: list of params, value pairs you want to change
+    :return: changed put body
+    """
     for para, value in change_list:
-        if isinstance(value, list):
-            if value[0] == "sub_dict":
-                if para not in data:
-                    data[para] = {}
-                data[para][value[1]] = value[2]
-            else:
-                data[para] = value
+        if isinstance(value, list) and value[0] == "sub_dict":
+            # Copy so the get response is not changed
+            data[para] = dict(data.get(para) or {})
+            data[para][value[1]] = value[2]
         else:
             data[para] = value
     return data
 
 
+def response_items(response):
+    """
+    Returns the objects of a collection get response with depth=1
+    :param response: list of objects with a name attribute or dict of name to object
+    :return: list of name, object pairs
+    """
+    if isinstance(response, dict):
+        return list(response.items())
+    return [(item['name'], item) for item in response]
+
+
+def build_interface_body(current_dict, ip, change_list, firmware_version=None):
+    """
+    Build put body for interface and changes the description to hostname
+    :param current_dict: get response json object
+    :param ip: ip of AOS-CX Switch
+    :param change_list: list of params, value pairs you want to change
+    :param firmware_version: firmware version of the switch, cx_firmware_version of login_cx.yml, key of the cache
+    :return: json object (dict)
+    """
+    allowed_list = fetch_allowed_list("/system/interfaces/{id}", ip, firmware_version)
+
+    # Build data object for each allowed attribute that exists in the get response
+    data = copy_allowed(current_dict, allowed_list)
+    # change description to hostname
+    return apply_changes(data, change_list)
+
+
+def build_interface_bodies(interfaces, ip, change_map, firmware_version=None):
+    """
+    Builds the put bodies of many interfaces with one schema lookup
+    :param interfaces: get response of /system/interfaces?depth=1
+    :param ip: ip of AOS-CX Switch
+    :param change_map: dict of interface name to change list, the change list of "*" is applied to all interfaces
+    :param firmware_version: firmware version of the switch, cx_firmware_version of login_cx.yml, key of the cache
+    :return: dict of interface name to put body, only for interfaces with changes
+    """
+    allowed_list = fetch_allowed_list("/system/interfaces/{id}", ip, firmware_version)
+    common = change_map.get("*", [])
+
+    bodies = {}
+    for name, current_dict in response_items(interfaces):
+        if not common and name not in change_map:
+            continue
+        data = apply_changes(copy_allowed(current_dict, allowed_list), common)
+        bodies[name] = apply_changes(data, change_map.get(name, []))
+    return bodies
+
+
 def build_vrf_body(vrf_dict, interface_uri):
     """
     Builds vrf body and removes port uri with interface id of the interface uri from the vrf port table
@@ -93,27 +151,47 @@ def build_vrf_body(vrf_dict, interface_uri):
     return vrf_dict
 
 
-def build_lag_body(current_dict, ip, interface):
+def build_lag_body(current_dict, ip, interface, firmware_version=None):
     """
     Builds lag body for put request and changes interface for the lag
     :param current_dict: all current lag configurations
     :param interface: interface uri
     :param ip: ip of AOS-CX Switch
+    :param firmware_version: firmware version of the switch, cx_firmware_version of login_cx.yml, key of the cache
     :return: json object (dict)
     """
-    allowed_list = fetch_allowed_list("/system/ports/{id}", ip)
-    data = {}
+    allowed_list = fetch_allowed_list("/system/ports/{id}", ip, firmware_version)
 
     # Build Put Body
-    for attribute in allowed_list:
-        if attribute in current_dict:
-            data[attribute] = current_dict[attribute]
+    data = copy_allowed(current_dict, allowed_list)
     # Set Interface for Lag
     data["interfaces"] = [interface]
 
     return data
 
 
+def build_lag_bodies(ports, ip, interface_map, firmware_version=None):
+    """
+    Builds the put bodies of many lags with one schema lookup
+    :param ports: get response of /system/ports?depth=1
+    :param ip: ip of AOS-CX Switch
+    :param interface_map: dict of lag name to interface uri or list of interface uris
+    :param firmware_version: firmware version of the switch, cx_firmware_version of login_cx.yml, key of the cache
+    :return: dict of lag name to put body, only for lags in interface_map
+    """
+    allowed_list = fetch_allowed_list("/system/ports/{id}", ip, firmware_version)
+
+    bodies = {}
+    for name, current_dict in response_items(ports):
+        if name not in interface_map:
+            continue
+        interfaces = interface_map[name]
+        data = copy_allowed(current_dict, allowed_list)
+        data["interfaces"] = interfaces if isinstance(interfaces, list) else [interfaces]
+        bodies[name] = data
+    return bodies
+
+
 def build_bridge_body(bridge_dict, interface_uri):
     """
     Removes interface from bridge table
@@ -153,16 +231,30 @@ def build_cli_batch_body(command_string):
     return command_dict
 
 
+def build_cli_batch_bodies(command_string, max_lines=MAX_LINES, max_bytes=MAX_BYTES):
+    """
+    Build the encoded Bodies for the cli batch AOS-Switch API, split at context boundaries
+    :param command_string: string of commands split by "\n" or list of commands
+    :param max_lines: maximal number of lines per body
+    :param max_bytes: maximal size of the commands of a body before encoding
+    :return: list of encoded bodies for post requests
+    """
+    return [encode_batch(batch) for batch in split_batches(command_string, int(max_lines), int(max_bytes))]
+
+
 class FilterModule(object):
 
     def filters(self):
         return {
             # Put Body creation
             'make_interface_body': build_interface_body,
+            'make_interface_bodies': build_interface_bodies,
             'make_vrf_body': build_vrf_body,
             'make_lag_body': build_lag_body,
+            'make_lag_bodies': build_lag_bodies,
             'make_bridge_body': build_bridge_body,
             'make_vlan_body': build_vlan_body,
-            'make_cli_batch_body': build_cli_batch_body
+            'make_cli_batch_body': build_cli_batch_body,
+            'make_cli_batch_bodies': build_cli_batch_bodies
 
         }
@@ -1,50 +1,169 @@
 # Fills hosts.yml and host_vars
+#
+# Usage:
+#   python create_host_vars.py 1                          # reads mac_ip1.csv, fills [branch1_switches]
+#   python create_host_vars.py --csv all_branches.csv     # rows with a fourth branch column
+#
+# CSV rows are MAC,IP,Hostname[,Branch]. Branch is a number (1) or a name (branch1), rows without it belong to
+# the branch given as argument. Empty rows and rows starting with # are ignored.
+# The CSV is read row by row, only files whose content changes are written and every write is atomic.
 
 # Make coding more python3-ish
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
-import os
+import argparse
 import io
-import csv
-import sys
-
-# Main Script
-branch_nr = str(sys.argv[1])
-branch = "branch" + branch_nr
-path_to_csv = "mac_ip" + branch_nr + ".csv"
-path_to_host_vars = "../host_vars/"
-path_to_inventory = "../inventory/"
-
-# Get CSV Data
-if os.path.exists(path_to_csv) and os.path.getsize(path_to_csv) > 0:
-    with io.open(path_to_csv, newline='') as file:
-        tmp_csv_data = list(csv.reader(file))
-else:
-    raise EnvironmentError('The file with the path "%s" does not exists or is empty! Please add a .csv file for MAC,IP and Hostname of Switches to configure.' % path_to_csv)
-
-# Build Host_vars .yml for each csv entry
-mac_list = []
-for csv_list in tmp_csv_data:
-    new_mac = "sw-" + str(csv_list[0]).replace(":", "-")
-    mac_list.append(new_mac + "\n")
-    # Overwrites existing files automatically
-    with io.open(path_to_host_vars+new_mac+".yml", 'w') as outfile:
-        outfile.write(u"ip"+": " + '"' + str(csv_list[1]) + '"\n')
-        outfile.write(u"hostname"+": " + '"' + str(csv_list[2]) + '"\n')
-        outfile.write(u"sw_mac"+": " + '"' + str(csv_list[0]) + '"\n')
-# Fill Hosts.yml with correct sw_mac strings
-if os.path.exists(path_to_inventory+'hosts.yml') and os.path.getsize(path_to_inventory+'hosts.yml') > 0:
-    with io.open(path_to_inventory+'hosts.yml') as file:
-        file_content = file.readlines()
-    firstHalf = file_content[:file_content.index('[' + branch + '_switches]\n') + 1]
-    secondHalf = file_content[file_content.index('[' + branch + '_cxs]\n'):]
-    new_file_content = firstHalf + mac_list + ["\n"] + secondHalf
-    with io.open(path_to_inventory+'hosts.yml', 'w') as outfile:
-        for line in new_file_content:
-            outfile.write(line.decode('unicode-escape'))
-else:
-    raise EnvironmentError('The file with the path "%s" does not exists or is empty! Please add a .csv file for MAC,IP and Hostname of Switches to configure.' % (path_to_inventory+'hosts.yml'))
+import os
+import re
+import stat
+import tempfile
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Code shared with the modules is imported from the module_utils directory of this repository, under the same
+# ansible.module_utils names as in the modules
+import ansible.module_utils
+MODULE_UTILS = os.path.abspath(os.path.join(SCRIPT_DIR, '..', 'module_utils'))
+if MODULE_UTILS not in ansible.module_utils.__path__:
+    ansible.module_utils.__path__.append(MODULE_UTILS)
+from ansible.module_utils.aruba_inventory_csv import branch_name, read_rows
+
+# Section header of the ini inventory, e.g. [branch1_switches] # comment
+SECTION = re.compile(r'^\[([^\]]+)\]')
+# Mode of new files, mkstemp would create them with 0600
+DEFAULT_MODE = 0o644
+
+
+def write_if_changed(path, content):
+    """
+    Writes the file atomically if its content differs, an existing file keeps its mode
+    :param path: path of the file
+    :param content: new content
+    :return: True if the file was written
+    """
+    try:
+        with io.open(path, encoding='utf-8') as infile:
+            if infile.read() == content:
+                return False
+    except (IOError, OSError):
+        pass
+
+    handle, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.tmp-')
+    try:
+        with io.open(handle, 'w', encoding='utf-8') as outfile:
+            outfile.write(content)
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except OSError:
+            mode = DEFAULT_MODE
+        os.chmod(tmp_path, mode)
+        os.rename(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return True
+
+
+def host_vars_content(mac, ip, hostname):
+    return u'ip: "%s"\nhostname: "%s"\nsw_mac: "%s"\n' % (ip, hostname, mac)
+
+
+def update_inventory(lines, branches):
+    """
+    Replaces the hosts of the [branchN_switches] sections. A new branch gets the same group structure as the
+    template hosts.yml: a [branchN:children] group of branchN_switches and branchN_cxs, the switches section and an
+    empty cxs section, each only if it is missing
+    :param lines: lines of hosts.yml
+    :param branches: dict of branch name to list of host names
+    :return: new lines
+    """
+    new_lines = []
+    sections = set()
+    replacing = False
+    for line in lines:
+        match = SECTION.match(line)
+        if match:
+            if replacing:
+                new_lines.append(u"\n")
+            new_lines.append(line)
+            sections.add(match.group(1))
+            branch = match.group(1)[:-len("_switches")]
+            replacing = match.group(1).endswith("_switches") and branch in branches
+            if replacing:
+                new_lines.extend(host + u"\n" for host in branches[branch])
+            continue
+        # Old hosts of a replaced section are dropped
+        if not replacing:
+            new_lines.append(line)
+
+    for branch in branches:
+        missing = []
+        if branch + ":children" not in sections:
+            missing.append([u"[%s:children]\n" % branch, u"%s_switches\n" % branch, u"%s_cxs\n" % branch])
+        if branch + "_switches" not in sections:
+            missing.append([u"[%s_switches]\n" % branch] + [host + u"\n" for host in branches[branch]])
+        if branch + "_cxs" not in sections:
+            missing.append([u"[%s_cxs]\n" % branch])
+        for section in missing:
+            if new_lines and not new_lines[-1].endswith(u"\n"):
+                new_lines[-1] += u"\n"
+            if new_lines and new_lines[-1].strip():
+                new_lines.append(u"\n")
+            new_lines.extend(section)
+    return new_lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Creates host_vars files and fills the branch sections of hosts.yml')
+    parser.add_argument('branch', nargs='?', default=None,
+                        help='branch number, used for rows without branch column and for the default CSV mac_ip<N>.csv')
+    parser.add_argument('--csv', action='append', default=None, help='CSV file, can be given multiple times')
+    parser.add_argument('--host-vars', default=os.path.join(SCRIPT_DIR, '..', 'host_vars'),
+                        help='host_vars directory')
+    parser.add_argument('--inventory', default=os.path.join(SCRIPT_DIR, '..', 'inventory', 'hosts.yml'),
+                        help='ini inventory file')
+    args = parser.parse_args()
+
+    default_branch = branch_name(args.branch) if args.branch else None
+    csv_files = args.csv
+    if not csv_files:
+        if not args.branch:
+            parser.error('Give a branch number or at least one --csv file')
+        csv_files = [os.path.join(SCRIPT_DIR, "mac_ip" + args.branch + ".csv")]
+
+    # Get CSV Data
+    for path_to_csv in csv_files:
+        if not (os.path.exists(path_to_csv) and os.path.getsize(path_to_csv) > 0):
+            raise EnvironmentError('The file with the path "%s" does not exists or is empty! Please add a .csv file for MAC,IP and Hostname of Switches to configure.' % path_to_csv)
+    if not (os.path.exists(args.inventory) and os.path.getsize(args.inventory) > 0):
+        raise EnvironmentError('The file with the path "%s" does not exists or is empty!' % args.inventory)
+
+    # Build Host_vars .yml for each csv entry, only changed files are written
+    branches = {}
+    seen = set()
+    written = 0
+    rows = 0
+    for path_to_csv in csv_files:
+        for mac, ip, hostname, branch in read_rows(path_to_csv, default_branch):
+            rows += 1
+            host = "sw-" + mac.replace(":", "-")
+            if write_if_changed(os.path.join(args.host_vars, host + ".yml"), host_vars_content(mac, ip, hostname)):
+                written += 1
+            if (branch, host) not in seen:
+                seen.add((branch, host))
+                branches.setdefault(branch, []).append(host)
+
+    # Fill Hosts.yml with correct sw_mac strings
+    with io.open(args.inventory, encoding='utf-8') as infile:
+        lines = infile.readlines()
+    inventory_changed = write_if_changed(args.inventory, u"".join(update_inventory(lines, branches)))
 
+    print("%s rows, %s host_vars files written, %s unchanged" % (rows, written, rows - written))
+    for branch in sorted(branches):
+        print("%s_switches: %s hosts" % (branch, len(branches[branch])))
+    print("%s %s" % (args.inventory, "updated" if inventory_changed else "unchanged"))
 
 
+if __name__ == '__main__':
+    main()
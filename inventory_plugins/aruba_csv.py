@@ -0,0 +1,149 @@
+# Aruba CSV Inventory Plugin
+# Serves the switches of the MAC,IP,Hostname[,Branch] CSV files from a SQLite index instead of host_vars files
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+DOCUMENTATION = """
+    name: aruba_csv
+    plugin_type: inventory
+    short_description: Inventory of ArubaOS-Switches and ArubaOS-CX Switches from MAC,IP,Hostname CSV files
+    description:
+      - Reads the same CSV files as inventory_creation_scripts/create_host_vars.py, rows are MAC,IP,Hostname[,Branch]
+      - Creates the groups branchN with the children branchN_switches and branchN_cxs, hosts are named sw-<mac>
+        and cx-<mac> and get the vars ip, hostname and sw_mac or cx_mac
+      - The CSV files are parsed into a SQLite index, later runs only read the index until a CSV file changes
+      - The configuration file name has to end with aruba_csv.yml or aruba_csv.yaml
+    options:
+      plugin:
+        description: token that ensures this is a source file for the plugin
+        required: True
+        choices: ['aruba_csv']
+      csv_files:
+        description: CSV files of ArubaOS-Switches, relative paths start at the directory of the configuration file
+        type: list
+        default: []
+      cx_csv_files:
+        description: CSV files of ArubaOS-CX Switches
+        type: list
+        default: []
+      default_branch:
+        description: branch number or name of rows without branch column
+        type: str
+        default: null
+      index_path:
+        description: path of the SQLite index, default is a file per configuration in ~/.ansible/cache/aruba_csv
+        type: str
+        default: null
+"""
+
+# Python imports
+import hashlib
+import json
+import os
+import sqlite3
+
+# Ansible imports
+from ansible.errors import AnsibleParserError
+from ansible.module_utils._text import to_native
+from ansible.plugins.inventory import BaseInventoryPlugin
+
+# Code shared with the modules is imported from the module_utils directory of this repository, under the same
+# ansible.module_utils names as in the modules
+import ansible.module_utils
+MODULE_UTILS = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'module_utils'))
+if MODULE_UTILS not in ansible.module_utils.__path__:
+    ansible.module_utils.__path__.append(MODULE_UTILS)
+from ansible.module_utils.aruba_inventory_csv import branch_name, read_rows
+
+# Bump to rebuild existing indexes after a schema change
+INDEX_VERSION = 1
+
+
+class InventoryModule(BaseInventoryPlugin):
+
+    NAME = 'aruba_csv'
+
+    def verify_file(self, path):
+        return super(InventoryModule, self).verify_file(path) and path.endswith(('aruba_csv.yml', 'aruba_csv.yaml'))
+
+    def parse(self, inventory, loader, path, cache=True):
+        super(InventoryModule, self).parse(inventory, loader, path, cache)
+        self._read_config_data(path)
+
+        base_dir = os.path.dirname(os.path.abspath(path))
+        sources = [(os.path.join(base_dir, csv_file), 'switch') for csv_file in self.get_option('csv_files')]
+        sources += [(os.path.join(base_dir, csv_file), 'cx') for csv_file in self.get_option('cx_csv_files')]
+        default_branch = self.get_option('default_branch')
+        default_branch = branch_name(default_branch) if default_branch else None
+
+        index_path = self.get_option('index_path')
+        if not index_path:
+            name = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()
+            index_path = os.path.join(os.path.expanduser('~'), '.ansible', 'cache', 'aruba_csv', name + '.sqlite')
+
+        try:
+            rows = self.load_index(index_path, sources, default_branch)
+        except (IOError, OSError, ValueError, sqlite3.Error) as error:
+            raise AnsibleParserError('Unable to build the aruba_csv inventory from %s: %s' % (path, to_native(error)))
+
+        for name, role, branch, mac, ip, hostname in rows:
+            group = branch + ("_cxs" if role == 'cx' else "_switches")
+            if branch not in self.inventory.groups:
+                self.inventory.add_group(branch)
+            if group not in self.inventory.groups:
+                self.inventory.add_group(group)
+                self.inventory.add_child(branch, group)
+            self.inventory.add_host(name, group=group)
+            self.inventory.set_variable(name, 'ip', ip)
+            self.inventory.set_variable(name, 'hostname', hostname)
+            self.inventory.set_variable(name, 'cx_mac' if role == 'cx' else 'sw_mac', mac)
+
+    def load_index(self, index_path, sources, default_branch):
+        """
+        Returns the hosts from the index, the index is rebuilt if a CSV file or the configuration changed
+        :param index_path: path of the SQLite index
+        :param sources: list of CSV path and role pairs
+        :param default_branch: branch of rows without branch column
+        :return: list of name, role, branch, mac, ip, hostname tuples
+        """
+        # Fingerprint of the configuration and the size and modification time of every CSV file
+        fingerprint = json.dumps([INDEX_VERSION, default_branch] + [
+            [csv_path, role, os.path.getsize(csv_path), os.path.getmtime(csv_path)] for csv_path, role in sources])
+
+        if not os.path.isdir(os.path.dirname(index_path)):
+            os.makedirs(os.path.dirname(index_path))
+        connection = sqlite3.connect(index_path)
+        try:
+            connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            connection.execute("CREATE TABLE IF NOT EXISTS hosts (position INTEGER PRIMARY KEY, name TEXT, role TEXT,"
+                               " branch TEXT, mac TEXT, ip TEXT, hostname TEXT)")
+            stored = connection.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+
+            if stored is None or stored[0] != fingerprint:
+                with connection:
+                    connection.execute("DELETE FROM hosts")
+                    connection.executemany(
+                        "INSERT INTO hosts (name, role, branch, mac, ip, hostname) VALUES (?, ?, ?, ?, ?, ?)",
+                        self.read_sources(sources, default_branch))
+                    connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('fingerprint', ?)",
+                                       (fingerprint,))
+
+            return connection.execute(
+                "SELECT name, role, branch, mac, ip, hostname FROM hosts ORDER BY position").fetchall()
+        finally:
+            connection.close()
+
+    def read_sources(self, sources, default_branch):
+        """
+        Streams the rows of all CSV files
+        :param sources: list of CSV path and role pairs
+        :param default_branch: branch of rows without branch column
+        :return: generator of name, role, branch, mac, ip, hostname tuples
+        """
+        for csv_path, role in sources:
+            prefix = "cx-" if role == 'cx' else "sw-"
+            for mac, ip, hostname, branch in read_rows(csv_path, default_branch):
+                yield prefix + mac.replace(":", "-"), role, branch, mac, ip, hostname
@@ -0,0 +1,187 @@
+#!/usr/bin/python
+
+DOCUMENTATION = '''
+---
+module: aruba_multi_ssh_cli
+
+short_description: Executes CLI commands via SSH on many ArubaOS-Switch and ArubaOS-CX devices at once
+
+description:
+    - "Executes the same list of CLI commands on a list of devices from one process. The SSH sessions run in a
+       thread pool of max_concurrent workers. Uses the same prompt and ANSI handling as arubaos_switch_ssh_cli and
+       arubaos_cx_ssh_cli. The module reports changed if a device got a configure command."
+
+'''
+
+EXAMPLES = '''
+    - name: Audit firmware of all switches
+      aruba_multi_ssh_cli:
+        # List of devices, each entry needs an ip and can overwrite device_type, user, password and port
+        hosts:
+          - {ip: "10.1.1.10"}
+          - {ip: "10.1.1.1", device_type: "aos_cx"}
+        device_type: "aos_switch" # Default for all hosts, "aos_switch" or "aos_cx"
+        user: "username for authentication"
+        password: "password for authentication"
+        commands: ["show version", "show flash"]
+        max_concurrent: 200 # SSH sessions at the same time
+      delegate_to: localhost
+      run_once: True
+      register: audit
+
+'''
+
+RETURN = '''
+devices:
+    description: Result for each device with ip, device_type, changed, failed, msg, cli_output (list of strings, one per command) and timings in seconds (login, commands, logout, total)
+    type: list of dicts
+summary:
+    description: Number of devices, failed devices and total run time
+    type: dict
+'''
+
+import time
+from multiprocessing.pool import ThreadPool
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.aruba_ssh import SessionModule
+from ansible.module_utils.aruba_switch_ssh import SwitchSSHCLI
+from ansible.module_utils.aruba_cx_ssh import CliUser
+
+# Module params that are passed to the session of each device
+SESSION_KEYS = ['device_type', 'user', 'password', 'port', 'timeout', 'look_for_keys', 'allow_agent',
+                'key_filename']
+
+
+def is_config_command(command):
+    """
+    :param command: CLI command
+    :return: True if the command enters the config context, e.g. "conf t" or "configure terminal"
+    """
+    words = command.split()
+    return bool(words) and len(words[0]) >= 4 and "configure".startswith(words[0].lower())
+
+
+def run_device(params, commands):
+    """
+    Logs in, executes the commands one by one and logs out
+    :param params: session params of the device
+    :param commands: list of commands
+    :return: result dict of the device
+    """
+    report = {'ip': params['ip'], 'device_type': params['device_type'], 'changed': False, 'failed': False, 'msg': '',
+              'cli_output': [], 'timings': {'commands': []}}
+    start = time.time()
+    class_init = None
+    try:
+        phase = time.time()
+        if params['device_type'] == "aos_cx":
+            class_init = CliUser(SessionModule(params))
+            execute = class_init.execute_command
+        else:
+            class_init = SwitchSSHCLI(SessionModule(params))
+            execute = class_init.execute_show_command
+        report['timings']['login'] = round(time.time() - phase, 3)
+
+        for command in commands:
+            phase = time.time()
+            report['cli_output'].append(execute([command])[0])
+            # Everything after a configure command can change the config
+            report['changed'] = report['changed'] or is_config_command(command)
+            report['timings']['commands'].append(round(time.time() - phase, 3))
+    except Exception as error:
+        report['failed'] = True
+        report['msg'] = str(error)
+    finally:
+        if class_init is not None:
+            phase = time.time()
+            try:
+                class_init.logout()
+            except Exception:
+                pass
+            report['timings']['logout'] = round(time.time() - phase, 3)
+    report['timings']['total'] = round(time.time() - start, 3)
+    return report
+
+
+def run_devices(devices, commands, max_concurrent):
+    """
+    Runs all devices with at most max_concurrent sessions at the same time
+    :param devices: list of session params
+    :param commands: list of commands
+    :param max_concurrent: number of parallel sessions
+    :return: list of results in the order of devices
+    """
+    pool = ThreadPool(max(1, min(max_concurrent, len(devices))))
+    try:
+        results = [pool.apply_async(run_device, (params, commands)) for params in devices]
+        return [result.get() for result in results]
+    finally:
+        pool.close()
+        pool.join()
+
+
+def run_module():
+    module_args = dict(
+        hosts=dict(type='list', required=True),
+        commands=dict(type='list', required=True),
+        device_type=dict(type='str', required=False, default='aos_switch', choices=['aos_switch', 'aos_cx']),
+        user=dict(type='str', required=False, default=None),
+        password=dict(type='str', required=False, default=None, no_log=True),
+        port=dict(type='int', required=False, default=22),
+        timeout=dict(type='int', required=False, default=60),
+        look_for_keys=dict(type='bool', required=False, default=False),
+        allow_agent=dict(type='bool', required=False, default=False),
+        key_filename=dict(type='str', required=False, default=None),
+        max_concurrent=dict(type='int', required=False, default=100),
+    )
+
+    result = dict(
+        changed=False,
+        devices=[],
+        summary={},
+        message=''
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=False,
+    )
+
+    if module.check_mode:
+        result['message'] = "Check mode not supported for this module"
+        return result
+
+    # Build session params for each device
+    devices = []
+    for host in module.params['hosts']:
+        if not isinstance(host, dict):
+            host = {'ip': host}
+        if 'ip' not in host:
+            module.fail_json(msg='Each entry of hosts needs to be an ip or a dict with at least an ip.')
+        params = dict((key, module.params[key]) for key in SESSION_KEYS)
+        params.update(host)
+        if params['device_type'] not in ('aos_switch', 'aos_cx'):
+            module.fail_json(msg='device_type of {} has to be aos_switch or aos_cx.'.format(params['ip']))
+        if not params['user'] or not params['password']:
+            module.fail_json(msg='No user or password given for device {}.'.format(params['ip']))
+        devices.append(params)
+
+    start = time.time()
+    result['devices'] = run_devices(devices, module.params['commands'], max(1, module.params['max_concurrent']))
+
+    failed = len([device for device in result['devices'] if device['failed']])
+    result['summary'] = {'total': len(devices), 'failed': failed, 'seconds': round(time.time() - start, 3)}
+    result['changed'] = any(device['changed'] for device in result['devices'])
+    result['message'] = "{} of {} devices failed".format(failed, len(devices))
+
+    # Return/Exit
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
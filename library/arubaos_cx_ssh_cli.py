@@ -1,9 +1,5 @@
 #!/usr/bin/python
 
-import paramiko
-import time
-import re
-
 DOCUMENTATION = '''
 ---
 module: arubaos_cx_ssh_cli
@@ -23,172 +19,119 @@ EXAMPLES = '''
         # Commands as a list
         commands: ["conf t","int 1/1/16","lag 94"]
 
+    - name: Reuse one SSH session for consecutive tasks
+      arubaos_cx_ssh_cli:
+        ip: "ip of siwtch"
+        user: "username for authentication"
+        password: "password for authentication"
+        commands: ["show version"]
+        # Keeps the logged in session in a local background process, next task against the switch skips the login
+        persistent: True
+        persistent_idle_timeout: 30 # Seconds without a task after which the session gets logged out
+
+    - name: Push only the difference between the rendered config and the running config
+      arubaos_cx_ssh_cli:
+        ip: "ip of siwtch"
+        user: "username for authentication"
+        password: "password for authentication"
+        # Lines missing on the switch are added, lines missing in the file are removed with their no form
+        config_file: "./config/{{ inventory_hostname }}.conf"
+        # Regexes of further running lines that are never removed, module and oobm lines are always kept
+        config_keep: ["^snmp-server community "]
+      register: cli_result # cli_result.config_diff holds the applied commands
+
+    - name: Save large outputs to files instead of returning them
+      arubaos_cx_ssh_cli:
+        ip: "ip of siwtch"
+        user: "username for authentication"
+        password: "password for authentication"
+        commands: ["no page", "show running-config", "show tech"]
+        # Each output is written to <output_dir>/<ip>/<nr>_<command>.txt while it arrives
+        output_dir: "./cli_output"
+        compress_output: True # Write .txt.gz files
+      register: cli_result # cli_result.output_files holds path, size and sha256 of each file
+
+    - name: Return show outputs as typed data
+      arubaos_cx_ssh_cli:
+        ip: "ip of siwtch"
+        user: "username for authentication"
+        password: "password for authentication"
+        commands: ["show vlan", "show interface brief"]
+        parse: True # cli_result.parsed[0] is a list of vlan dicts, the same parsers are available as parse_cli filter
+      register: cli_result
+
 '''
 
 RETURN = '''
 cli_output:
     description: Output of CLI after each command
     type: list of strings
+parsed:
+    description: With parse, typed data of each output, None for commands without parser (see module_utils/aruba_show_parsers.py)
+    type: list
+output_files:
+    description: With output_dir, path, size, sha256 and command of each output file instead of cli_output
+    type: list of dicts
+config_diff:
+    description: Commands applied to turn the running config into config_file, empty if nothing changed
+    type: list of strings
 message:
     description: The output message that the module generates
 '''
 
-from ansible.module_utils.basic import AnsibleModule
-
+import os
 
-# Class for SSH CLI
-class CliUser:
-
-    def __init__(self, module):
-        """
-        Init all variables and starts login
-        :param module: module objects itself
-        """
-        # Init Vars
-        args = module.params
-
-        # List of strings of CLI Commands
-        paramiko_ssh_connection_args = {'hostname': args['ip'], 'port': args['port'], 'username': args['user'],
-                                        'password': args['password'], 'look_for_keys': args['look_for_keys'],
-                                        'allow_agent': args['allow_agent'], 'key_filename': args['key_filename'],
-                                        'timeout': args['timeout']}
-        self.module = module
-
-        # Login
-        self.ssh_client = paramiko.SSHClient()
-        # Default AutoAdd as Policy
-        self.ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        # Connect to Switch via SSH
-        self.ssh_client.connect(**paramiko_ssh_connection_args)
-        self.prompt = ''
-        # SSH Command execution not allowed, therefor using the following paramiko functionality
-        self.shell_chanel = self.ssh_client.invoke_shell()
-        self.shell_chanel.settimeout(8)
-        # AOS-CX specific
-        self.get_prompt()
-
-    def execute_command(self, command_list):
-        """
-        Execute command and returns output
-        :param command_list: list of commands
-        :return: output of show command
-        """
-        prompt = re.compile(r'\r\n' + re.escape(self.prompt.replace('#', '')) + '.*# ')
-        hostname = re.compile(r'^ho[^ ]*')
-
-        # RFC 1123 Compliant Regex (See https://stackoverflow.com/questions/106179/regular-expression-to-match-dns-hostname-or-ip-address)
-        validhostname = re.compile(r'^(([a-zA-Z0-9]|[a-zA-Z0-9][a-zA-Z0-9\-]*[a-zA-Z0-9])\.)*([A-Za-z0-9]|[A-Za-z0-9][A-Za-z0-9\-]*[A-Za-z0-9])$')
-
-        # Clear Buffer
-        self.out_channel()
-
-        cli_output = []
-        for command in command_list:
-            # Check if command wants to change hostname and if so it will also change the prompt regex
-            if hostname.search(command):
-                new_hostname = command.split(" ")[-1]
-                if validhostname.search(new_hostname):
-                    self.prompt = new_hostname+"#"
-                    prompt = re.compile(r'\r\n' + re.escape(new_hostname) + '.*# ')
-                else:
-                    self.module.fail_json(
-                        msg='To be compliant with RFC 1123, the hostname must contain only letters, '
-                            'numbers and hyphens, and must not start or end with a hyphen. Can not change Hostname!')
-
-            self.in_channel(command)
-            count = 0
-            text = ''
-            fail = True
-            while count < 45:
-                time.sleep(2)
-                curr_text = self.out_channel()
-                text += curr_text
-                if prompt.search(curr_text):
-                    fail = False
-                    break
-                count += 1
-            if fail:
-                self.module.fail_json(msg='Unable to read CLI Output in given Time')
-            # Reformat text
-            text = text.replace('\r', '').rstrip('\n')
-            # Delete command and end prompt from output
-            text_lines = text.split('\n')[1:-1]
-            cli_output.append('\n'.join(text_lines))
-
-        return cli_output
-
-    def get_prompt(self):
-        """
-        Additional needed Setup for Connection
-        """
-        # Set prompt
-        count = 0
-        fail = True
-        self.in_channel("")
-        while count < 45:
-            time.sleep(2)
-            curr_text = self.out_channel()
-            if '#' in curr_text:
-                fail = False
-                break
-            count += 1
-        if fail:
-            self.module.fail_json(msg='Unable to read CLI Output in given Time')
-
-        # Set prompt
-        count = 0
-        self.in_channel("")
-        # Regex for ANSI escape chars and prompt
-        text = ''
-        fail = True
-        while count < 45:
-            time.sleep(2)
-            curr_text = self.out_channel()
-            text += curr_text.replace('\r', '')
-            if '#' in curr_text:
-                fail = False
-                break
-            count += 1
-
-        if fail:
-            self.module.fail_json(msg='Unable to read CLI Output in given Time for prompt')
-
-        self.prompt = text.strip('\n').replace(' ', '')
-
-
-    def out_channel(self):
-        """
-        Clear Buffer/Read from Shell
-        :return: Read lines
-        """
-        recv = ""
-        # Loop while shell is able to recv data
-        while self.shell_chanel.recv_ready():
-            recv = self.shell_chanel.recv(65535)
-            if not recv:
-                self.module.fail_json(msg='Chanel gives no data. Chanel is closed by Switch.')
-            recv = recv.decode('utf-8', 'ignore')
-        return recv
-
-    def in_channel(self, cmd):
-        """
-        Sends cli command to Shell
-        :param cmd: the command itself
-        """
-        cmd = cmd.rstrip()
-        cmd += '\n'
-        cmd = cmd.encode('ascii', 'ignore')
-        self.shell_chanel.sendall(cmd)
-
-    def logout(self):
-        """
-        Logout from Switch
-        :return:
-        """
-        self.in_channel('end')
-        self.in_channel('exit')
-        self.shell_chanel.close()
-        self.ssh_client.close()
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.aruba_cx_ssh import CliUser
+from ansible.module_utils import aruba_ssh_broker
+from ansible.module_utils.aruba_config_diff import diff_config, find_error
+from ansible.module_utils.aruba_show_parsers import ParseError, parse_outputs
+
+
+def apply_config(class_init, config, keep=None):
+    """
+    Applies the difference between the running config and the given config
+    :param class_init: CliUser object
+    :param config: wanted configuration as text
+    :param keep: list of regexes of running lines that are never removed
+    :return: dict with changed, config_diff and, if a command was rejected, failed and msg
+    """
+    running = class_init.execute_command(["no page", "show running-config"])[1]
+    diff = diff_config(running, config, keep)
+    output = {'changed': bool(diff), 'config_diff': diff}
+    if diff:
+        commands = ["conf t"] + diff + ["end"]
+        error = find_error(commands, class_init.execute_command(commands))
+        if error:
+            output['failed'] = True
+            output['msg'] = 'Command "%s" was rejected: %s' % error
+    return output
+
+
+def run_commands(class_init, params):
+    """
+    Executes the commands on a logged in session
+    :param class_init: CliUser object
+    :param params: dict with commands, config, config_keep, output_dir, compress_output and parse
+    :return: dict with changed, cli_output and config_diff
+    """
+    output = {'changed': False, 'cli_output': [], 'config_diff': [], 'output_files': [], 'parsed': []}
+    if params.get('config') is not None:
+        output.update(apply_config(class_init, params['config'], params.get('config_keep')))
+        if output.get('failed'):
+            return output
+    if params['commands']:
+        cli_output = class_init.execute_command(params['commands'], params.get('output_dir'),
+                                                params.get('compress_output'))
+        output['output_files' if params.get('output_dir') else 'cli_output'] = cli_output
+        if params.get('parse') and not params.get('output_dir'):
+            try:
+                output['parsed'] = parse_outputs(params['commands'], cli_output, 'cx')
+            except ParseError as error:
+                output['failed'] = True
+                output['msg'] = 'Unable to parse CLI output: %s' % error
+        output['changed'] = True
+    return output
 
 
 def run_module():
@@ -196,35 +139,70 @@ def run_module():
         ip=dict(type='str', required=True),
         user=dict(type='str', required=True),
         password=dict(type='str', required=True, no_log=True),
-        commands=dict(type='list', required=True),
+        commands=dict(type='list', required=False),
+        config_file=dict(type='str', required=False, default=None),
+        config_keep=dict(type='list', required=False, default=[]),
+        output_dir=dict(type='str', required=False, default=None),
+        compress_output=dict(type='bool', required=False, default=False),
+        parse=dict(type='bool', required=False, default=False),
         port=dict(type='int', required=False, default=22),
         timeout=dict(type='int', required=False, default=60),
         look_for_keys=dict(type='bool', required=False, default=False),
         allow_agent=dict(type='bool', required=False, default=False),
         key_filename=dict(type='str', required=False, default=None),
+        persistent=dict(type='bool', required=False, default=False),
+        persistent_idle_timeout=dict(type='int', required=False, default=30),
     )
 
     result = dict(
         changed=False,
         cli_output=[],
+        config_diff=[],
+        output_files=[],
+        parsed=[],
         message=''
     )
 
     module = AnsibleModule(
         argument_spec=module_args,
         supports_check_mode=False,
+        required_one_of=[['commands', 'config_file']],
     )
 
     if module.check_mode:
         result['message'] = "Check mode not supported for this module"
         return result
 
-    class_init = CliUser(module)
-    try:
-        result['cli_output'] = class_init.execute_command(module.params['commands'])
-        result['changed'] = True
-    finally:
-        class_init.logout()
+    config = None
+    if module.params['config_file']:
+        try:
+            with open(module.params['config_file']) as config_file:
+                config = config_file.read()
+        except (IOError, OSError) as error:
+            module.fail_json(msg='Unable to read config_file: %s' % error)
+
+    # Absolute, the persistent session runs in a process with another working directory
+    output_dir = os.path.abspath(module.params['output_dir']) if module.params['output_dir'] else None
+    payload = {'commands': module.params['commands'], 'config': config, 'config_keep': module.params['config_keep'],
+               'output_dir': output_dir, 'compress_output': module.params['compress_output'],
+               'parse': module.params['parse']}
+    if module.params['persistent']:
+        output = aruba_ssh_broker.request(module.params, payload, CliUser, run_commands,
+                                          module.params['persistent_idle_timeout'])
+    else:
+        class_init = CliUser(module)
+        try:
+            output = run_commands(class_init, payload)
+        finally:
+            class_init.logout()
+    if output.get('failed'):
+        module.fail_json(msg=output['msg'], config_diff=output.get('config_diff', []))
+
+    result['cli_output'] = output['cli_output']
+    result['config_diff'] = output['config_diff']
+    result['output_files'] = output['output_files']
+    result['parsed'] = output['parsed']
+    result['changed'] = output['changed']
 
     # Return/Exit
     module.exit_json(**result)
@@ -0,0 +1,263 @@
+#!/usr/bin/python
+
+DOCUMENTATION = '''
+---
+module: arubaos_switch_cli_batch
+
+short_description: Pushes large configs to ArubaOS-Switches via the cli_batch REST API in chunks
+
+description:
+    - "Splits the commands at context boundaries into chunks that the switch accepts, posts the chunks back to back
+       to /rest/<api_version>/cli_batch and polls /rest/<api_version>/cli_batch/status until each chunk is done.
+       The next chunk is posted as soon as the switch finished the current one, the push stops at the first
+       failing line. With switches the pushes to all switches run concurrently from one process."
+
+'''
+
+EXAMPLES = '''
+    - name: Push the rendered config of a switch
+      arubaos_switch_cli_batch:
+        ip: "ip of siwtch"
+        user: "username for authentication"
+        password: "password for authentication"
+        config_file: "./config/{{ hostname }}.conf"
+        max_lines: 300 # Lines per chunk
+        max_bytes: 16384 # Bytes per chunk before base64 encoding
+      delegate_to: localhost
+      register: batch_result # batch_result.switches[0].failed_line holds line, command and result of a failed line
+
+    - name: Reuse the session of login_switch.yml
+      arubaos_switch_cli_batch:
+        ip: "{{ ip }}"
+        cookie: "{{ switch_session.json.cookie }}"
+        commands: "hostname test\\nrest-interface" # String split by newlines or list of commands
+      delegate_to: localhost
+
+    - name: Push the configs of many switches concurrently
+      arubaos_switch_cli_batch:
+        # Each entry needs an ip and can overwrite user, password, commands and config_file
+        switches:
+          - {ip: "10.1.1.10", config_file: "./config/sw1.conf"}
+          - {ip: "10.1.1.11", config_file: "./config/sw2.conf"}
+        user: "username for authentication"
+        password: "password for authentication"
+        max_concurrent: 20
+      delegate_to: localhost
+      run_once: True
+
+'''
+
+RETURN = '''
+switches:
+    description: Report for each switch with ip, state (done/failed), message, batches, lines, failed_line (line, command, result) and seconds
+    type: list of dicts
+message:
+    description: The output message that the module generates
+'''
+
+import json
+import time
+from multiprocessing.pool import ThreadPool
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.urls import open_url
+from ansible.module_utils.aruba_cli_batch import split_batches, encode_batch, batch_state, COMMAND_RUNNING
+
+# Module params that are passed to the push of each switch
+SWITCH_KEYS = ['user', 'password', 'cookie', 'commands', 'config_file', 'api_version', 'validate_certs', 'timeout',
+               'batch_timeout', 'poll_interval', 'max_lines', 'max_bytes']
+
+
+def rest_call(params, method, path, body=None, cookie=None):
+    """
+    Sends a request to the REST API of the switch
+    :param params: switch params
+    :param method: HTTP method
+    :param path: path after /rest/<api_version>/
+    :param body: dict that is sent as json
+    :param cookie: session cookie
+    :return: json of the response, empty dict if there is no body
+    """
+    headers = {'Accept': 'application/json', 'Content-Type': 'application/json'}
+    if cookie:
+        headers['Cookie'] = cookie
+    url = 'https://{}/rest/{}/{}'.format(params['ip'], params['api_version'], path)
+    response = open_url(url, method=method, data=json.dumps(body) if body is not None else None, headers=headers,
+                        validate_certs=params['validate_certs'], timeout=params['timeout'])
+    text = response.read()
+    return json.loads(text) if text else {}
+
+
+def wait_for_batch(params, cookie, batch, previous):
+    """
+    Polls the batch status until the switch finished the batch, the interval starts short and grows to poll_interval
+    :param params: switch params
+    :param cookie: session cookie
+    :param batch: list of line number and command tuples that were posted
+    :param previous: status before the batch was posted
+    :return: tuple of state and failing line like batch_state and the last polled status
+    """
+    posted = time.time()
+    deadline = posted + params['batch_timeout']
+    interval = 0.1
+    while True:
+        status = rest_call(params, 'GET', 'cli_batch/status', cookie=cookie)
+        state, failure = batch_state(status, batch)
+        # The status of an earlier push of the same commands looks the same, it is only trusted once the switch had
+        # a poll interval to start the batch
+        if state != 'running' and (status != previous or time.time() - posted >= params['poll_interval']):
+            return state, failure, status
+        if time.time() > deadline:
+            return 'failed', pending_line(batch, status, params['batch_timeout']), status
+        time.sleep(interval)
+        interval = min(interval * 2, params['poll_interval'])
+
+
+def pending_line(batch, status, batch_timeout):
+    """
+    :param batch: list of line number and command tuples that were posted
+    :param status: last polled status
+    :param batch_timeout: seconds waited for the batch
+    :return: line number, command and result of the first command without result for a timed out batch
+    """
+    done = 0
+    for log, (number, command) in zip(status.get('cmd_exec_logs') or [], batch):
+        if log.get('status') in COMMAND_RUNNING or (log.get('cmd') or command).split() != command.split():
+            break
+        done += 1
+    numbered = [line for line in batch[done:] + batch if line[0] is not None]
+    number, command = numbered[0] if numbered else batch[0]
+    result = 'Batch not finished after {}s, last status {} with {} of {} commands done'.format(
+        batch_timeout, status.get('status') or 'unknown', done, len(batch))
+    return number, command, result
+
+
+def push_switch(params):
+    """
+    Logs in, pushes all batches of one switch and logs out
+    :param params: switch params
+    :return: report dict
+    """
+    report = {'ip': params['ip'], 'state': 'failed', 'message': '', 'batches': 0, 'lines': 0, 'failed_line': None}
+    start = time.time()
+    cookie = params['cookie']
+    logged_in = False
+    try:
+        commands = params['commands']
+        if params['config_file']:
+            with open(params['config_file']) as config_file:
+                commands = config_file.read()
+        batches = split_batches(commands or [], params['max_lines'], params['max_bytes'])
+        # Bodies are encoded before the first post, so the next batch can be sent the moment the switch is ready
+        bodies = [encode_batch(batch) for batch in batches]
+
+        if not cookie:
+            cookie = rest_call(params, 'POST', 'login-sessions',
+                               {'userName': params['user'], 'password': params['password']})['cookie']
+            logged_in = True
+
+        try:
+            status = rest_call(params, 'GET', 'cli_batch/status', cookie=cookie)
+        except Exception:
+            # No batch ran on the switch yet
+            status = None
+        for batch, body in zip(batches, bodies):
+            rest_call(params, 'POST', 'cli_batch', body, cookie)
+            state, failure, status = wait_for_batch(params, cookie, batch, status)
+            report['batches'] += 1
+            if state == 'failed':
+                report['failed_line'] = {'line': failure[0], 'command': failure[1], 'result': failure[2]}
+                report['message'] = 'Line {} "{}" failed: {}'.format(*failure)
+                break
+            report['lines'] += len([number for number, command in batch if number is not None])
+        else:
+            report['state'] = 'done'
+            report['message'] = '{} lines in {} batches'.format(report['lines'], report['batches'])
+    except Exception as error:
+        report['message'] = str(error)
+    finally:
+        if logged_in:
+            try:
+                rest_call(params, 'DELETE', 'login-sessions', cookie=cookie)
+            except Exception:
+                pass
+    report['seconds'] = round(time.time() - start, 3)
+    return report
+
+
+def run_module():
+    module_args = dict(
+        ip=dict(type='str', required=False, default=None),
+        switches=dict(type='list', required=False, default=None),
+        user=dict(type='str', required=False, default=None),
+        password=dict(type='str', required=False, default=None, no_log=True),
+        cookie=dict(type='str', required=False, default=None, no_log=True),
+        commands=dict(type='raw', required=False, default=None),
+        config_file=dict(type='str', required=False, default=None),
+        api_version=dict(type='str', required=False, default='v4'),
+        validate_certs=dict(type='bool', required=False, default=False),
+        timeout=dict(type='int', required=False, default=30),
+        batch_timeout=dict(type='int', required=False, default=300),
+        poll_interval=dict(type='float', required=False, default=1.0),
+        max_lines=dict(type='int', required=False, default=300),
+        max_bytes=dict(type='int', required=False, default=16384),
+        max_concurrent=dict(type='int', required=False, default=20)
+    )
+
+    result = dict(
+        changed=False,
+        switches=[],
+        message=''
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=False,
+        required_one_of=[['ip', 'switches']],
+    )
+
+    if module.check_mode:
+        result['message'] = "Check mode currently not supported for this module"
+        return result
+
+    # Build params for each switch
+    switches = []
+    for switch in module.params['switches'] or [{'ip': module.params['ip']}]:
+        if not isinstance(switch, dict) or 'ip' not in switch:
+            module.fail_json(msg='Each entry of switches needs to be a dict with at least an ip.')
+        params = dict((key, module.params[key]) for key in SWITCH_KEYS)
+        params.update(switch)
+        if not params['cookie'] and (not params['user'] or not params['password']):
+            module.fail_json(msg='No cookie or user and password given for switch {}.'.format(params['ip']))
+        if not params['commands'] and not params['config_file']:
+            module.fail_json(msg='No commands or config_file given for switch {}.'.format(params['ip']))
+        switches.append(params)
+
+    # Each switch runs one batch at a time, the switches are pushed and polled concurrently
+    pool = ThreadPool(max(1, min(module.params['max_concurrent'], len(switches))))
+    try:
+        reports = pool.map(push_switch, switches)
+    finally:
+        pool.close()
+        pool.join()
+
+    failures = len([report for report in reports if report['state'] == 'failed'])
+    result['switches'] = reports
+    result['changed'] = any(report['lines'] or report['batches'] for report in reports)
+    result['message'] = "{} of {} switches failed".format(failures, len(reports))
+    if len(reports) == 1:
+        result['message'] = reports[0]['message']
+
+    if failures:
+        module.fail_json(msg=result['message'], **dict((key, value) for key, value in result.items() if key != 'message'))
+
+    # Return/Exit
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+#!/usr/bin/python
+
+DOCUMENTATION = '''
+---
+module: arubaos_switch_firmware_fleet
+
+short_description: Upgrades the firmware of many ArubaOS-Switches concurrently via SSH CLI and SFTP
+
+description:
+    - "Runs version check, SFTP upload, verification and an optional reboot for a list of ArubaOS-Switches
+       from one process. The number of parallel upgrades is limited overall and per site and the switches
+       are handled in rolling batches."
+
+'''
+
+EXAMPLES = '''
+    - name: Upgrade all branch switches
+      arubaos_switch_firmware_fleet:
+        # List of switches, each entry needs an ip and can overwrite user, password and port
+        switches:
+          - {ip: "10.1.1.10", site: "branch1"}
+          - {ip: "10.1.1.11", site: "branch1"}
+          - {ip: "10.2.1.10", site: "branch2", password: "other password"}
+        user: "username for authentication"
+        password: "password for authentication"
+        path_to_swi: "../WC_16_06_0006.swi"
+        boot_image: "alternate" # "primary", "secondary" or "alternate" to use the image the switch does not boot from
+        enable_sftp: True
+        reboot: True # Boot from the uploaded image after a successful upload
+        max_concurrent: 50 # Switches upgraded at the same time
+        max_per_site: 2 # Switches upgraded at the same time behind one site uplink
+        batch_size: 200 # Switches per wave, the next wave starts when the current one is finished. 0 for a single wave
+        max_failures: 5 # Stop starting new waves when more switches failed
+      delegate_to: localhost
+      run_once: True
+      register: fleet_result
+
+'''
+
+RETURN = '''
+switches:
+    description: Report for each switch with ip, site, boot_image, state (skipped/uploaded/rebooted/failed/not_started), message, firmware images, upload statistics and timings
+    type: list of dicts
+summary:
+    description: Number of switches per state overall and per site and the total run time
+    type: dict
+'''
+
+import time
+from multiprocessing.pool import ThreadPool
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.aruba_ssh import SessionModule
+from ansible.module_utils.aruba_switch_ssh import SwitchSSHCLI, upgrade_firmware
+from ansible.module_utils import aruba_sftp
+
+# Module params that are passed to the session of each switch
+SESSION_KEYS = ['user', 'password', 'port', 'timeout', 'look_for_keys', 'allow_agent', 'key_filename',
+                'path_to_swi', 'boot_image', 'enable_sftp', 'state', 'reboot', 'sftp_chunk_size',
+                'sftp_window_size', 'upload_retries', 'resume_upload']
+
+
+def order_by_site(switches):
+    """
+    Interleaves the switches of all sites, so every batch contains switches of all sites
+    :param switches: list of switch param dicts
+    :return: reordered list
+    """
+    sites = {}
+    site_order = []
+    for switch in switches:
+        if switch['site'] not in sites:
+            sites[switch['site']] = []
+            site_order.append(switch['site'])
+        sites[switch['site']].append(switch)
+
+    ordered = []
+    while len(ordered) < len(switches):
+        for site in site_order:
+            if sites[site]:
+                ordered.append(sites[site].pop(0))
+    return ordered
+
+
+def upgrade_switch(params):
+    """
+    Runs login, version check, upload, verification and reboot for one switch
+    :param params: session params of the switch
+    :return: report dict
+    """
+    report = {'ip': params['ip'], 'site': params['site'], 'boot_image': params['boot_image'], 'state': 'failed',
+              'message': '', 'timings': {}}
+    start = time.time()
+    class_init = None
+    rebooted = False
+    try:
+        phase = time.time()
+        class_init = SwitchSSHCLI(SessionModule(params))
+        report['timings']['login'] = round(time.time() - phase, 3)
+
+        # Upload to the image the switch currently does not boot from
+        running_image = class_init.show_flash().default_boot
+        if params['boot_image'] == "alternate":
+            params['boot_image'] = "secondary" if running_image == "primary" else "primary"
+            report['boot_image'] = params['boot_image']
+        # Upgrade and downgrade are decided against the firmware the switch runs, not against the target slot
+        params['compare_image'] = running_image
+
+        phase = time.time()
+        report['message'], changed, upload_not_completed, report['upload'] = upgrade_firmware(class_init.module,
+                                                                                              class_init)
+        report['timings']['upgrade'] = round(time.time() - phase, 3)
+        report['firmware'] = class_init.show_flash().to_dict()
+
+        if not changed:
+            report['state'] = "skipped"
+        elif not upload_not_completed:
+            report['state'] = "uploaded"
+            if params['reboot']:
+                phase = time.time()
+                class_init.boot_system(params['boot_image'])
+                rebooted = True
+                report['state'] = "rebooted"
+                report['timings']['reboot'] = round(time.time() - phase, 3)
+    except Exception as error:
+        report['state'] = "failed"
+        report['message'] = str(error)
+    finally:
+        if class_init is not None and not rebooted:
+            try:
+                class_init.logout()
+            except Exception:
+                pass
+    report['seconds'] = round(time.time() - start, 3)
+    return report
+
+
+def run_batch(pool, batch, max_concurrent, max_per_site):
+    """
+    Upgrades the switches of a batch. A switch is only handed to the pool when its site has a free slot,
+    so no worker waits for a busy site while switches of other sites are ready
+    :param pool: ThreadPool with max_concurrent workers
+    :param batch: list of switch param dicts
+    :param max_concurrent: switches upgraded at the same time
+    :param max_per_site: switches of one site upgraded at the same time
+    :return: list of reports in the order of the batch
+    """
+    waiting = list(range(len(batch)))
+    running = {}
+    reports = [None] * len(batch)
+    finished = queue.Queue()
+    while waiting or running:
+        for index in list(waiting):
+            if len(running) >= max_concurrent:
+                break
+            site = batch[index]['site']
+            if list(running.values()).count(site) >= max_per_site:
+                continue
+            waiting.remove(index)
+            running[index] = site
+            pool.apply_async(upgrade_switch, (batch[index],),
+                             callback=lambda report, index=index: finished.put((index, report)))
+        index, report = finished.get()
+        del running[index]
+        reports[index] = report
+    return reports
+
+
+def build_summary(reports, seconds):
+    """
+    Counts the switches per state overall and per site
+    :param reports: list of switch reports
+    :param seconds: run time of the module
+    :return: summary dict
+    """
+    summary = {'total': len(reports), 'seconds': round(seconds, 3), 'states': {}, 'sites': {}}
+    for report in reports:
+        summary['states'][report['state']] = summary['states'].get(report['state'], 0) + 1
+        site = summary['sites'].setdefault(report['site'], {})
+        site[report['state']] = site.get(report['state'], 0) + 1
+    return summary
+
+
+def run_module():
+    module_args = dict(
+        switches=dict(type='list', required=True),
+        user=dict(type='str', required=False, default=None),
+        password=dict(type='str', required=False, default=None, no_log=True),
+        port=dict(type='int', required=False, default=22),
+        timeout=dict(type='int', required=False, default=60),
+        look_for_keys=dict(type='bool', required=False, default=False),
+        allow_agent=dict(type='bool', required=False, default=False),
+        key_filename=dict(type='str', required=False, default=None),
+        path_to_swi=dict(type='str', required=True),
+        boot_image=dict(type='str', required=False, default='primary', choices=['primary', 'secondary', 'alternate']),
+        enable_sftp=dict(type='bool', required=False, default=False),
+        state=dict(type='str', required=False, default='upgrade', choices=['upgrade', 'downgrade']),
+        reboot=dict(type='bool', required=False, default=False),
+        max_concurrent=dict(type='int', required=False, default=20),
+        max_per_site=dict(type='int', required=False, default=2),
+        batch_size=dict(type='int', required=False, default=0),
+        max_failures=dict(type='int', required=False, default=0),
+        swi_sha256=dict(type='str', required=False, default=None),
+        sftp_chunk_size=dict(type='int', required=False, default=32768),
+        sftp_window_size=dict(type='int', required=False, default=None),
+        upload_retries=dict(type='int', required=False, default=0),
+        resume_upload=dict(type='bool', required=False, default=False)
+    )
+
+    result = dict(
+        changed=False,
+        switches=[],
+        summary={},
+        message=''
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=False,
+    )
+
+    if module.check_mode:
+        result['message'] = "Check mode currently not supported for this module"
+        return result
+
+    # Checksum of the image is checked once for all switches
+    if module.params['swi_sha256']:
+        sha256 = aruba_sftp.file_digest(module.params['path_to_swi'])
+        if sha256 != module.params['swi_sha256'].lower():
+            module.fail_json(msg='SHA256 of {} is {} but {} was expected. Upgrade aborted.'.format(
+                module.params['path_to_swi'], sha256, module.params['swi_sha256']))
+
+    # Build session params for each switch
+    switches = []
+    for switch in module.params['switches']:
+        if not isinstance(switch, dict) or 'ip' not in switch:
+            module.fail_json(msg='Each entry of switches needs to be a dict with at least an ip.')
+        params = dict((key, module.params[key]) for key in SESSION_KEYS)
+        params['swi_sha256'] = None
+        params['site'] = 'default'
+        params.update(switch)
+        if not params['user'] or not params['password']:
+            module.fail_json(msg='No user or password given for switch {}.'.format(params['ip']))
+        switches.append(params)
+
+    switches = order_by_site(switches)
+    batch_size = module.params['batch_size'] or len(switches)
+
+    # Rolling batches, every batch runs with the given concurrency
+    start = time.time()
+    reports = []
+    failures = 0
+    pool = ThreadPool(max(1, min(module.params['max_concurrent'], batch_size)))
+    try:
+        for index in range(0, len(switches), batch_size):
+            batch = switches[index:index + batch_size]
+            if failures > module.params['max_failures']:
+                for params in batch:
+                    reports.append({'ip': params['ip'], 'site': params['site'], 'state': 'not_started',
+                                    'message': 'Not started because too many switches failed before'})
+                continue
+            batch_reports = run_batch(pool, batch, max(1, module.params['max_concurrent']),
+                                      max(1, module.params['max_per_site']))
+            failures += len([report for report in batch_reports if report['state'] == "failed"])
+            reports.extend(batch_reports)
+    finally:
+        pool.close()
+        pool.join()
+
+    result['switches'] = reports
+    result['summary'] = build_summary(reports, time.time() - start)
+    result['changed'] = any(report['state'] in ("uploaded", "rebooted") for report in reports)
+    result['message'] = "{} of {} switches failed".format(failures, len(reports))
+
+    if failures > module.params['max_failures']:
+        module.fail_json(msg=result['message'], **dict((key, value) for key, value in result.items() if key != 'message'))
+
+    # Return/Exit
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,5 @@
 #!/usr/bin/python
 
-import paramiko
-import time
-import socket
-import re
-import os
-
 DOCUMENTATION = '''
 ---
 module: arubaos_switch_ssh_cli
@@ -47,6 +41,63 @@ EXAMPLES = '''
         state: "downgrade" # pass "downgrade" to downgrade switch or "current" to stay at same version, default is "upgrade"
       register: module_result
 
+    - name: Upgrade Firmware over a slow WAN link
+      arubaos_switch_ssh_cli:
+        ip: "ip of siwtch"
+        user: "username for authentication"
+        password: "password for authentication"
+        path_to_swi: "../WC_16_06_0006.swi"
+        boot_image: "primary"
+        swi_sha256: "sha256 of the swi file" # Optional, upload is refused if the local file does not match
+        sftp_chunk_size: 65536 # Bytes per SFTP write request
+        sftp_window_size: 8388608 # SSH window in bytes, bigger windows help on high latency links
+        upload_retries: 3 # Reconnect this many times if the link drops during the upload
+        # Continue at the byte offset the switch already received instead of starting over. The received bytes are read
+        # back and only reused if their sha256 matches the local file, the resumed image is compared as a whole
+        resume_upload: True
+      register: module_result
+
+    - name: Reuse one SSH session for consecutive tasks
+      arubaos_switch_ssh_cli:
+        ip: "ip of siwtch"
+        user: "username for authentication"
+        password: "password for authentication"
+        show_command: ["show version"]
+        # Keeps the logged in session in a local background process, next task against the switch skips the login
+        persistent: True
+        persistent_idle_timeout: 30 # Seconds without a task after which the session gets logged out
+
+    - name: Push only the difference between the rendered config and the running config
+      arubaos_switch_ssh_cli:
+        ip: "ip of siwtch"
+        user: "username for authentication"
+        password: "password for authentication"
+        # Lines missing on the switch are added, lines missing in the file are removed with their no form
+        config_file: "./config/{{ hostname }}.conf"
+        # Regexes of further running lines that are never removed, module and oobm lines are always kept
+        config_keep: ["^snmp-server community "]
+      register: cli_result # cli_result.config_diff holds the applied commands
+
+    - name: Save large outputs to files instead of returning them
+      arubaos_switch_ssh_cli:
+        ip: "ip of siwtch"
+        user: "username for authentication"
+        password: "password for authentication"
+        show_command: ["no page", "show tech all"]
+        # Each output is written to <output_dir>/<ip>/<nr>_<command>.txt while it arrives
+        output_dir: "./cli_output"
+        compress_output: True # Write .txt.gz files
+      register: cli_result # cli_result.output_files holds path, size and sha256 of each file
+
+    - name: Return show outputs as typed data
+      arubaos_switch_ssh_cli:
+        ip: "ip of siwtch"
+        user: "username for authentication"
+        password: "password for authentication"
+        show_command: ["show vlans", "show interfaces brief"]
+        parse: True # cli_result.parsed[0] is a list of vlan dicts, the same parsers are available as parse_cli filter
+      register: cli_result
+
     
 '''
 
@@ -54,312 +105,90 @@ RETURN = '''
 cli_output:
     description: Output of CLI after each command
     type: list of strings
+parsed:
+    description: With parse, typed data of each output, None for commands without parser (see module_utils/aruba_show_parsers.py)
+    type: list
+output_files:
+    description: With output_dir, path, size, sha256 and command of each output file instead of cli_output
+    type: list of dicts
+config_diff:
+    description: Commands applied to turn the running config into config_file, empty if nothing changed
+    type: list of strings
 message:
     description: The output message that the sample module generates
+firmware:
+    description: Firmware images after the upgrade (primary, secondary, primary_boot, secondary_boot, default_boot)
+    type: dict
+upload:
+    description: Statistics of the firmware upload (size, bytes_sent, seconds, bytes_per_second, sha256, remote_size)
+    type: dict
 '''
 
-from ansible.module_utils.basic import AnsibleModule
-
-
-# Class for SSH CLI
-class SwitchSSHCLI:
-
-    def __init__(self, module):
-        """
-        Init all variables and starts login
-        :param module: module objects itself
-        """
-        # Init Vars
-        args = module.params
-        # List of strings of CLI Commands
-        paramiko_ssh_connection_args = {'hostname': args['ip'], 'port': args['port'], 'username': args['user'],
-                                        'password': args['password'], 'look_for_keys': args['look_for_keys'],
-                                        'allow_agent': args['allow_agent'], 'key_filename': args['key_filename'],
-                                        'timeout': args['timeout']}
-        self.module = module
-
-        # Login
-        self.ssh_client = paramiko.SSHClient()
-        # Default AutoAdd as Policy
-        self.ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        # Connect to Switch via SSH
-        self.ssh_client.connect(**paramiko_ssh_connection_args)
-        self.prompt = ''
-        # SSH Command execution not allowed, therefor using the following paramiko functionality
-        self.shell_chanel = self.ssh_client.invoke_shell()
-        self.shell_chanel.settimeout(8)
-        # AOS-Switch specific
-        self.additional_connection_setup()
-
-    def execute_cli_command(self, command_list):
-        """
-        Executes the list of CLI commands
-        :param command_list: List of Strings with commands
-        """
-        for command in command_list:
-            self.in_channel(command)
-
-    def execute_show_command(self, command_list):
-        """
-        Execute show command and returns output
-        :param command_list: list of commands
-        :return: output of show command
-        """
-        # Regex for ANSI escape chars, prompt and hostname command
-        ansi_escape = re.compile(r'\x1B\[[0-?]*[ -/]*[@-~]')
-        prompt = re.compile(r'' + re.escape(self.prompt.replace('#', '')) + '.*#')
-        hostname = re.compile(r'^ho[^ ]*')
-
-        cli_output = []
-        for command in command_list:
-            if hostname.search(command):
-                self.module.fail_json(
-                    msg='You are not allowed to change the hostname while using show command function.')
-            self.in_channel(command)
-            count = 0
-            text = ""
-            fail = True
-            while count < 45:
-                time.sleep(2)
-                curr_text = self.out_channel()
-                text += ansi_escape.sub('', curr_text).replace('\r', '')
-                if prompt.search(curr_text):
-                    fail = False
-                    break
-                count += 1
-
-            if fail:
-                self.module.fail_json(msg='Unable to read CLI Output in given Time')
-
-            # Format Text
-            text_lines = text.split('\n')[:-1]
-            # Remove Command from Output
-            if text_lines:
-                text_lines[0] = text_lines[0].replace(command, '', 1)
-            cli_output.append('\n'.join(text_lines))
-        return cli_output
-
-    def additional_connection_setup(self):
-        """
-        Additional needed Setup for Connection
-        """
-        chanel_out = ''
-        # Max Timeout ca. 1.30 Min (45 * 2)
-        count = 0
-        no_fail = False
-        while count < 45:
-            chanel_out += self.out_channel()
-            if 'any key to continue' in chanel_out:
-                self.in_channel("")
-                no_fail = True
-                break
-            else:
-                time.sleep(2)
-            count += 1
-
-        if not no_fail:
-            self.module.fail_json(msg='Unable to connect correctly to Switch')
-
-        # Additional Sleep
-        time.sleep(1)
-        # Clear buffer
-        self.out_channel()
-
-        # Set prompt
-        count = 0
-        self.in_channel("")
-        # Regex for ANSI escape chars and prompt
-        ansi_escape = re.compile(r'\x1B\[[0-?]*[ -/]*[@-~]')
-        text = ''
-        while count < 45:
-            time.sleep(2)
-            curr_text = self.out_channel()
-            text += ansi_escape.sub('', curr_text).replace('\r', '')
-            if '#' in curr_text:
-                fail = False
-                break
-            count += 1
-
-        if fail:
-            self.module.fail_json(msg='Unable to read CLI Output in given Time for prompt')
-
-        text.strip('\n')
-        self.prompt = text.replace(' ', '')
-
-    def out_channel(self):
-        """
-        Clear Buffer/Read from Shell
-        :return: Read lines
-        """
-        recv = ""
-        # Loop while shell is able to recv data
-        while self.shell_chanel.recv_ready():
-            recv = self.shell_chanel.recv(65535)
-            if not recv:
-                self.module.fail_json(msg='Chanel gives no data. Chanel is closed by Switch.')
-            recv = recv.decode('utf-8', 'ignore')
-        return recv
-
-    def in_channel(self, cmd):
-        """
-        Sends cli command to Shell
-        :param cmd: the command itself
-        """
-        cmd = cmd.rstrip()
-        cmd += '\n'
-        cmd = cmd.encode('ascii', 'ignore')
-        self.shell_chanel.sendall(cmd)
-
-    def logout(self):
-        """
-        Logout from Switch
-        :return:
-        """
-        self.in_channel('logout')
-        count = 0
-        while count < 45:
-            time.sleep(2)
-            curr_text = self.out_channel()
-            if 'want to log out' in curr_text:
-                self.in_channel("y")
-            elif 'save the current' in curr_text:
-                self.in_channel("n")
-            try:
-                self.in_channel("")
-            except socket.error:
-                break
-            count += 1
-        self.shell_chanel.close()
-        self.ssh_client.close()
-
-def check_swi_version(result, module):
-    """
-    Find current SWi Version of Switch
-    :param version: version that you want to uplaod to (primary/secondary)
-    :return: string of current version without ".swi" ending
-    """
-    # Init Vars
-    regex = u"(?:WC|YA|YC|KB|WB|K|KB)\.[0-9]{2}\.[0-9]{2}\.[0-9]{4}"
-
-    # Find correct version
-    matches = re.findall(regex, result)
-    if module.params['boot_image'] == "primary":
-        current_version = matches[0].replace(".", "_")
-        return current_version
-    elif module.params['boot_image'] == "secondary":
-        current_version = matches[1].replace(".", "_")
-        return current_version
+import os
 
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.aruba_switch_ssh import SwitchSSHCLI, upgrade_firmware
+from ansible.module_utils import aruba_ssh_broker
+from ansible.module_utils.aruba_config_diff import diff_config, find_error
+from ansible.module_utils.aruba_show_parsers import ParseError, parse_outputs
 
 
-def pre_upgrade_firmware(module):
+def apply_config(class_init, config, keep=None):
     """
-    Checks current version vs to bet version and pre configures Switch for SFTP if argument for it is true
-    :param module: the module
-    :return: True if current version equal to to be version | False if SFTP configuration is fine and versions are different
+    Applies the difference between the running config and the given config
+    :param class_init: SwitchSSHCLI object
+    :param config: wanted configuration as text
+    :param keep: list of regexes of running lines that are never removed
+    :return: dict with changed, config_diff and, if a command was rejected, failed and msg
     """
-    # Init Vars
-    to_be_version = os.path.split(module.params['path_to_swi'])[1][:-4]
-
-    # Login and execute CLI Command
-    class_init = SwitchSSHCLI(module)
-    logout = False
-    try:
-        # Get Current Flash Output
-        result = class_init.execute_show_command(["show flash"])[0].replace(" ", "")
-
-        # Check Current vs to be version
-        current_version = check_swi_version(result, module)
-
-        # Version Handling
-        state = module.params['state']
-
-        if state == "upgrade" and current_version >= to_be_version:
-            class_init.logout()
-            logout = True
-            return [True, "Switch shall be upgraded but to be version is lower than or equal to current version. Unable to upgrade.", False, True]
-
-        if state == "downgrade" and current_version <= to_be_version:
-            class_init.logout()
-            logout = True
-            return [True, "Switch shall be downgraded but to be version is higher than or equal to current version. Unable to downgrade.", False, True]
-
-        # Enable SFTP for Switch or Check if it is enabled
-        if module.params['enable_sftp']:
-            class_init.execute_cli_command(['conf t', 'ip ssh filetransfer'])
-        else:
-            output = class_init.execute_show_command(['show run | include ip ssh'])
-            if "ip ssh filetransfer" != output[0]:
-                class_init.logout()
-                logout = True
-                module.fail_json(
-                    msg='Ip ssh filetransfer is not enabled, SFTP no possible. Please configure it on the Switch CLI via "ip ssh filetransfer"' )
-    finally:
-        if not logout:
-            class_init.logout()
-    return [False]
-
-
-def upgrade_firmware(module):
+    running = class_init.execute_show_command(["no page", "show running-config"])[1]
+    diff = diff_config(running, config, keep)
+    output = {'changed': bool(diff), 'config_diff': diff}
+    # execute_show_command refuses hostname changes, they are sent last and update the prompt
+    hostname = [command for command in diff if command.startswith("hostname ")]
+    commands = ["conf t"] + [command for command in diff if not command.startswith("hostname ")] + ["end"]
+    if len(commands) > 2:
+        error = find_error(commands, class_init.execute_show_command(commands))
+        if error:
+            output['failed'] = True
+            output['msg'] = 'Command "%s" was rejected: %s' % error
+            return output
+    for command in hostname:
+        error = find_error([command], [class_init.set_hostname(command)])
+        if error:
+            output['failed'] = True
+            output['msg'] = 'Command "%s" was rejected: %s' % error
+    return output
+
+
+def run_commands(class_init, params):
     """
-    Upgrades Firmware via CLI SFTP Put
+    Applies config and executes command_list and show_command on a logged in session
+    :param class_init: SwitchSSHCLI object
+    :param params: dict with config, config_keep, command_list, show_command, output_dir, compress_output and parse
+    :return: dict with changed, cli_output and config_diff
     """
-    # Inital Vars
-    to_be_version = os.path.split(module.params['path_to_swi'])[1][:-4]
-
-    tmp_list = pre_upgrade_firmware(module)
-    if tmp_list[0]:
-        return tmp_list[1], tmp_list[2],tmp_list[3]
-
-
-
-
-    # Check if File path name is correct
-    path_to_swi = os.path.abspath(module.params['path_to_swi'])
-    if not os.path.exists(path_to_swi):
-        module.fail_json(
-            msg='Path to SWI is pointing to non existing directory or file. Path was: {}. '.format(path_to_swi))
-
-    # Create swCfgPath for Switch
-    fwPathPrefix = "/os/"
-    swCfgPath = fwPathPrefix + module.params['boot_image']
-    try:
-        t = paramiko.Transport((module.params['ip'], 22))
-        t.connect(username=module.params['user'], password=module.params['password'])
-        sftp = paramiko.SFTPClient.from_transport(t)
-        sftp.put(path_to_swi, swCfgPath, confirm=False)
-        sftp.close()
-        t.close()
-    except Exception as error:
-        try:
-            sftp.close()
-        except NameError:
-            pass
-        try:
-            t.close()
-        except NameError:
-            pass
-        module.fail_json(msg='Ran into exception: {}. Paramiko..'.format(error))
-
-    # Check up to 10 times if current version was successfully uploaded
-    class_init = SwitchSSHCLI(module)
-    logout = False
-    try:
-        retries = 0
-        while retries != 10:
-            # Get current Version
-            result = class_init.execute_show_command(["show flash"])[0].replace(" ", "")
-            current_version = check_swi_version(result, module)
-            # Check if current version is new current version
-            if current_version == to_be_version:
-                class_init.logout()
-                logout = True
-                return "{} was successful".format(module.params['state']), True, False
-            time.sleep(3)
-    finally:
-        if not logout:
-            class_init.logout()
-    return "Unable to check if upload was successful", True, True
+    output = {'changed': False, 'cli_output': [], 'config_diff': [], 'output_files': [], 'parsed': []}
+    if params.get('config') is not None:
+        output.update(apply_config(class_init, params['config'], params.get('config_keep')))
+        if output.get('failed'):
+            return output
+
+    if params['command_list']:
+        class_init.execute_cli_command(params['command_list'])
+        output['changed'] = True
+
+    if params['show_command']:
+        cli_output = class_init.execute_show_command(params['show_command'], params.get('output_dir'),
+                                                     params.get('compress_output'))
+        output['output_files' if params.get('output_dir') else 'cli_output'] = cli_output
+        if params.get('parse') and not params.get('output_dir'):
+            try:
+                output['parsed'] = parse_outputs(params['show_command'], cli_output, 'switch')
+            except ParseError as error:
+                output['failed'] = True
+                output['msg'] = 'Unable to parse CLI output: %s' % error
+    return output
 
 
 def run_module():
@@ -369,6 +198,11 @@ def run_module():
         password=dict(type='str', required=True, no_log=True),
         command_list=dict(type='list', required=False),
         show_command=dict(type='list', required=False),
+        config_file=dict(type='str', required=False, default=None),
+        config_keep=dict(type='list', required=False, default=[]),
+        output_dir=dict(type='str', required=False, default=None),
+        compress_output=dict(type='bool', required=False, default=False),
+        parse=dict(type='bool', required=False, default=False),
         port=dict(type='int', required=False, default=22),
         timeout=dict(type='int', required=False, default=60),
         look_for_keys=dict(type='bool', required=False, default=False),
@@ -377,12 +211,22 @@ def run_module():
         path_to_swi=dict(type='str', required=False, default=None),
         boot_image=dict(type='str', required=False, default='primary', choices=['primary', 'secondary']),
         enable_sftp=dict(type='bool', required=False, default=False),
-        state=dict(type='str', required=False, default='upgrade', choices=['upgrade', 'downgrade', 'current'])
+        state=dict(type='str', required=False, default='upgrade', choices=['upgrade', 'downgrade', 'current']),
+        swi_sha256=dict(type='str', required=False, default=None),
+        sftp_chunk_size=dict(type='int', required=False, default=32768),
+        sftp_window_size=dict(type='int', required=False, default=None),
+        upload_retries=dict(type='int', required=False, default=0),
+        resume_upload=dict(type='bool', required=False, default=False),
+        persistent=dict(type='bool', required=False, default=False),
+        persistent_idle_timeout=dict(type='int', required=False, default=30)
     )
 
     result = dict(
         changed=False,
         cli_output=[],
+        config_diff=[],
+        output_files=[],
+        parsed=[],
         message=''
     )
 
@@ -395,26 +239,53 @@ def run_module():
         result['message'] = "Check mode currently not supported for this module"
         return result
 
+    config = None
+    if module.params['config_file']:
+        try:
+            with open(module.params['config_file']) as config_file:
+                config = config_file.read()
+        except (IOError, OSError) as error:
+            module.fail_json(msg='Unable to read config_file: %s' % error)
+
     # Main Logic
     result['changed'] = False
-    if module.params['path_to_swi']:
-        if module.params['state'] == "current":
-            result['message'] = "Switch version shall not be changed. Aborting Upgrade. State is 'current'"
-            result['changed'] = False
-            result['upload_not_completed'] = True
-        else:
-            result['message'], result['changed'], result['upload_not_completed'] = upgrade_firmware(module)
-
-    class_init = SwitchSSHCLI(module)
+    class_init = None
     try:
-        if module.params['command_list']:
-            class_init.execute_cli_command(module.params['command_list'])
-            result['changed'] = True
-
-        if module.params['show_command']:
-            result['cli_output'] = class_init.execute_show_command(module.params['show_command'])
+        if module.params['path_to_swi']:
+            if module.params['state'] == "current":
+                result['message'] = "Switch version shall not be changed. Aborting Upgrade. State is 'current'"
+                result['changed'] = False
+                result['upload_not_completed'] = True
+            else:
+                class_init = SwitchSSHCLI(module)
+                result['message'], result['changed'], result['upload_not_completed'], result['upload'] = \
+                    upgrade_firmware(module, class_init)
+                result['firmware'] = class_init.show_flash().to_dict()
+
+        # Absolute, the persistent session runs in a process with another working directory
+        output_dir = os.path.abspath(module.params['output_dir']) if module.params['output_dir'] else None
+        payload = {'command_list': module.params['command_list'], 'show_command': module.params['show_command'],
+                   'config': config, 'config_keep': module.params['config_keep'], 'output_dir': output_dir,
+                   'compress_output': module.params['compress_output'], 'parse': module.params['parse']}
+        if module.params['persistent']:
+            output = aruba_ssh_broker.request(module.params, payload, SwitchSSHCLI, run_commands,
+                                              module.params['persistent_idle_timeout'])
+        else:
+            # Reuse the session of the firmware upgrade
+            if class_init is None:
+                class_init = SwitchSSHCLI(module)
+            output = run_commands(class_init, payload)
     finally:
-        class_init.logout()
+        if class_init is not None:
+            class_init.logout()
+    if output.get('failed'):
+        module.fail_json(msg=output['msg'], config_diff=output.get('config_diff', []))
+
+    result['cli_output'] = output['cli_output']
+    result['config_diff'] = output['config_diff']
+    result['output_files'] = output['output_files']
+    result['parsed'] = output['parsed']
+    result['changed'] = result['changed'] or output['changed']
 
     # Return/Exit
     module.exit_json(**result)
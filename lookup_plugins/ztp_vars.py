@@ -7,17 +7,61 @@ from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
 # Python imports
+import hashlib
 import io
+import json
 import requests
+import time
 import urllib3
 import os
+import threading
+import uuid
 from datetime import datetime
+from multiprocessing.pool import ThreadPool
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 DOCUMENTATION = """
     lookup: ztp_vars
     short_description: collects vars needed for ztp process
+    description:
+      - Queries the LLDP neighbors and ports of all VSX peers of one or more sites concurrently
+      - LLDP neighbors of the peers are merged by chassis_id, the first peer in the list wins
+      - Positional terms are switch_list, peer ip or list of peer ips, username, password, site and returntype
+      - Several sites can be given as the sites keyword, a list of dicts with the keys switch_list, peers, username,
+        password and site. Entries of the returned list then have an additional site key
+    options:
+      timeout:
+        description: timeout in seconds of each REST request
+        default: 10
+      retries:
+        description: retries of requests that failed with a connection error, timeout or 5xx status code
+        default: 3
+      backoff:
+        description: seconds to wait before the first retry, doubled for each further retry
+        default: 1
+      incremental:
+        description:
+          - Only return neighbors that appeared or changed since the last run, the snapshot is stored in
+            ./ztp_logs/<site>.state.json. Delete the file to start from scratch
+          - Switches that reached their static ip are marked as done and are not queried again
+          - Only runs without returntype update the snapshot, the skip and done returntypes do not
+        default: False
+      retry_after:
+        description: seconds after which an unchanged neighbor that is still not done is returned again
+        default: 600
+      session_cache:
+        description:
+          - Keep the REST sessions logged in and reuse their cookies in later lookup calls, the cookies are stored
+            in ~/.ansible/cache/aruba_rest_sessions. Expired sessions are logged in again
+          - Call the lookup with the returntype logout at the end of the play to close the sessions, otherwise
+            they stay logged in until they expire on the switch and count against its REST session limit
+          - Without the cache every call logs in and out
+        default: False
+    notes:
+      - Each run appends JSON lines to ./ztp_logs/<site>.jsonl, one run record with the timings of each phase in
+        seconds and the error reason, and one record per switch with the state skipped, configured, done or pending
+      - Only runs without returntype write the journal, the skip, done and logout returntypes do not
 """
 
 # Ansible imports
@@ -25,26 +69,303 @@ from ansible.errors import AnsibleParserError
 from ansible.module_utils._text import to_bytes, to_native, to_text
 from ansible.plugins.lookup import LookupBase
 
+# Status codes that are worth a retry
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+# Cookies of logged in sessions, shared by all lookup calls of a play
+SESSION_DIR = os.path.join(os.path.expanduser('~'), '.ansible', 'cache', 'aruba_rest_sessions')
+# Clients of this process by ip and username, keeps the HTTPS connections open
+CLIENTS = {}
+CLIENTS_LOCK = threading.Lock()
+
+
+def get_client(ip, username, password, **kwargs):
+    """
+    Returns the cached client of a switch and user, a new client starts with the stored cookies
+    :param ip: ip of the cx switch
+    :param username: username of cx switch
+    :param password: password of cx switch
+    :return: CxRestClient object
+    """
+    with CLIENTS_LOCK:
+        if (ip, username) not in CLIENTS:
+            CLIENTS[(ip, username)] = CxRestClient(ip, username, password, cache_dir=SESSION_DIR, **kwargs)
+        return CLIENTS[(ip, username)]
+
+
+class CxRestClient(object):
+
+    def __init__(self, ip, username, password, timeout=10, retries=3, backoff=1, cache_dir=None):
+        """
+        REST API session of one AOS-CX Switch with retries
+        :param ip: ip of the cx switch
+        :param username: username of cx switch
+        :param password: password of cx switch
+        :param timeout: timeout in seconds of each request
+        :param retries: retries of failed requests
+        :param backoff: seconds before the first retry, doubled for each further retry
+        :param cache_dir: directory to store the session cookie in, None to not store it
+        """
+        self.ip = ip
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.base_url = "https://{0}/rest/v1/".format(ip)
+        self.session = requests.Session()
+        self.logged_in = False
+        # Sites running in parallel can share a peer, only one of them logs in
+        self.login_lock = threading.Lock()
+        self.cookie_file = None
+        if cache_dir:
+            name = hashlib.sha256("{0}|{1}".format(ip, username).encode('utf-8')).hexdigest()
+            self.cookie_file = os.path.join(cache_dir, name + ".json")
+            self.load_cookies()
+
+    def load_cookies(self):
+        """
+        Continues the session of an earlier lookup call
+        """
+        try:
+            with io.open(self.cookie_file, 'r') as infile:
+                cookies = json.load(infile)
+        except (IOError, OSError, ValueError):
+            return
+        self.session.cookies.update(cookies)
+        self.logged_in = bool(cookies)
+
+    def save_cookies(self):
+        """
+        Stores the session cookie, only readable by the current user
+        """
+        if not os.path.isdir(os.path.dirname(self.cookie_file)):
+            os.makedirs(os.path.dirname(self.cookie_file), 0o700)
+        handle = os.open(self.cookie_file + ".tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(handle, 'w') as outfile:
+            outfile.write(json.dumps(requests.utils.dict_from_cookiejar(self.session.cookies)))
+        os.rename(self.cookie_file + ".tmp", self.cookie_file)
+
+    def ensure_login(self):
+        """
+        Logs in if there is no session yet
+        """
+        with self.login_lock:
+            if not self.logged_in:
+                self.login()
+
+    def request(self, method, path, **kwargs):
+        """
+        Sends a request and logs in again if the session expired
+        :param method: http method
+        :param path: path relative to /rest/v1/
+        :return: response object
+        """
+        cookies = self.session.cookies.get_dict()
+        response = self.send(method, path, **kwargs)
+        if response.status_code == 401 and path not in ("login", "logout"):
+            with self.login_lock:
+                # Another thread may have logged in again while this request was running
+                if self.session.cookies.get_dict() == cookies:
+                    self.login()
+            response = self.send(method, path, **kwargs)
+        return response
+
+    def send(self, method, path, **kwargs):
+        """
+        Sends a request, connection errors, timeouts and 5xx responses are retried with exponential backoff
+        :param method: http method
+        :param path: path relative to /rest/v1/
+        :return: response object
+        """
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, self.base_url + path, verify=False, timeout=self.timeout,
+                                                **kwargs)
+                if response.status_code not in RETRY_STATUS or attempt >= self.retries:
+                    return response
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt >= self.retries:
+                    raise
+            time.sleep(self.backoff * 2 ** attempt)
+            attempt += 1
+
+    def get_json(self, path, name):
+        """
+        Get request that has to return 200
+        :param path: path relative to /rest/v1/
+        :param name: name of the request for the error message
+        :return: json of the response
+        """
+        response = self.request("GET", path)
+        if response.status_code != 200:
+            raise AnsibleParserError(
+                '%s Get Request to %s Failed with Status Code %s .' % (name, self.ip, to_text(str(response.status_code))))
+        return response.json()
+
+    def login(self):
+        """
+        Function handles login for REST API of the Switch
+        """
+        self.session.cookies.clear()
+        response = self.request("POST", "login", params={"username": self.username, "password": self.password})
+        if response.status_code != 200:
+            raise AnsibleParserError('Login Request to %s Failed with Status Code %s .' % (
+                self.ip, to_text(str(response.status_code))))
+        self.logged_in = True
+        if self.cookie_file:
+            self.save_cookies()
+
+    def logout(self):
+        """
+        Session will be closed
+        """
+        response = self.request("POST", "logout")
+        self.logged_in = False
+        if self.cookie_file and os.path.exists(self.cookie_file):
+            os.unlink(self.cookie_file)
+        # 401 means the session already expired on the switch
+        if response.status_code not in (200, 401):
+            raise AnsibleParserError('Logout Request to %s Failed with Status Code %s .' % (
+                self.ip, to_text(str(response.status_code))))
+
+    def fetch_lldp_info(self):
+        """
+        Fetches LLDP Neighbor Information
+        :return: JSON Object of LLDP Information
+        """
+        return self.get_json("system/interfaces/*/lldp_neighbors?depth=1", "LLDP")
+
+    def fetch_ports(self):
+        """
+        Fetches name and interfaces of all ports
+        :return: JSON Object of the ports
+        """
+        return self.get_json("system/ports/*?attributes=interfaces,name", "Port")
+
 
 class LookupModule(LookupBase):
 
     def run(self, terms, variables=None, **kwargs):
 
-        if 5 < len(terms):
-            returntype = terms[5]
+        self.client_args = dict((key, kwargs[key]) for key in ('timeout', 'retries', 'backoff') if key in kwargs)
+        self.incremental = kwargs.get('incremental', False)
+        self.retry_after = kwargs.get('retry_after', 600)
+        self.session_cache = kwargs.get('session_cache', False)
+        returntype = kwargs.get('returntype', "")
+
+        if 'sites' in kwargs:
+            sites = kwargs['sites']
         else:
-            returntype = ""
+            if 5 < len(terms):
+                returntype = terms[5]
+            sites = [{'switch_list': terms[0], 'peers': terms[1], 'username': terms[2], 'password': terms[3],
+                      'site': terms[4]}]
+
+        if returntype == "logout":
+            self.logout_sites(sites)
+            return []
+
+        # All sites run at the same time, each site queries its peers at the same time
+        pool = ThreadPool(max(1, len(sites)))
+        try:
+            results = pool.map(lambda site: self.get_data(site['switch_list'], site['peers'], site['username'],
+                                                          site['password'], site['site'], returntype), sites)
+        finally:
+            pool.close()
+            pool.join()
 
-        data = self.get_data(terms[0], terms[1], terms[2], terms[3], terms[4], returntype)
+        if 'sites' not in kwargs:
+            return results[0]
+
+        data = []
+        for site, result in zip(sites, results):
+            for entry in result:
+                if isinstance(entry, dict):
+                    entry['site'] = site['site']
+                else:
+                    entry = list(entry) + [site['site']]
+                data.append(entry)
         return data
 
+    def query_peer(self, ip, username, password, switch_data, timings):
+        """
+        Logs in to one peer, fetches LLDP neighbors and the ports if a neighbor needs its LAG
+        :param ip: ip of the cx switch
+        :param username: username of cx switch
+        :param password: password of cx switch
+        :param switch_data: dict of mac to [static ip, hostname, found] of the switches to query
+        :param timings: dict that gets the seconds of each phase
+        :return: tuple of lldp neighbors and the LAG map of the peer
+        """
+        if self.session_cache:
+            client = get_client(ip, username, password, **self.client_args)
+        else:
+            client = CxRestClient(ip, username, password, **self.client_args)
+        phase = time.time()
+        client.ensure_login()
+        timings['login'] = round(time.time() - phase, 3)
+        try:
+            phase = time.time()
+            lldp_info = client.fetch_lldp_info()
+            timings['lldp_fetch'] = round(time.time() - phase, 3)
+
+            # The ports are only needed for neighbors that did not reach their static ip yet
+            lags = None
+            for neighbor in lldp_info or []:
+                mac = neighbor['chassis_id']
+                if mac in switch_data and neighbor['neighbor_info']['mgmt_ip_list'] != switch_data[mac][0]:
+                    phase = time.time()
+                    lags = self.lag_map(client.fetch_ports())
+                    timings['port_fetch'] = round(time.time() - phase, 3)
+                    break
+            return lldp_info, lags
+        finally:
+            # Cached sessions stay logged in until the logout returntype is used
+            if not self.session_cache:
+                phase = time.time()
+                client.logout()
+                timings['logout'] = round(time.time() - phase, 3)
+
+    def lag_map(self, ports):
+        """
+        Maps the interfaces of the peer to their LAG
+        :param ports: ports of the cx switch
+        :return: dict of interface to lag name, None if the switch returned no ports
+        """
+        if not ports:
+            return None
+        lags = {}
+        for port in ports:
+            if "lag" in port['name']:
+                for intf in port['interfaces']:
+                    lags[intf] = port['name']
+        return lags
+
+    def logout_sites(self, sites):
+        """
+        Logs out the cached sessions of all peers of the sites
+        :param sites: list of site dicts
+        """
+        for site in sites:
+            peers = site['peers'] if isinstance(site['peers'], list) else [site['peers']]
+            for peer in peers:
+                client = get_client(peer, site['username'], site['password'], **self.client_args)
+                if client.logged_in:
+                    try:
+                        client.logout()
+                    except Exception as error:
+                        self._display.warning("Logout of CX Switch %s failed: %s" % (peer, to_native(error)))
+
     def get_data(self, switch_list, ip, username, password, site, returntype):
         """
         Collects ZTP Data
         :param switch_list: list of switches that are in the branch
-        :param ip: ip of one ztp cx switch
+        :param ip: ip or list of ips of the ztp cx switches (VSX peers)
         :param username: username of cx switch
         :param password: password of cx switch
+        :param site: site name for the log file
         :param returntype: Which list shall be returned by the function
         :return: List of dicts filled with ZTP vars for each connected Switch
         """
@@ -54,139 +375,218 @@ class LookupModule(LookupBase):
         for switch_tuple in switch_list:
             switch_data[switch_tuple[0]] = [switch_tuple[1], switch_tuple[2], False]
 
-        self.switch_data = switch_data
-        # Set API Parameter
-        self.base_url = "https://{0}/rest/v1/".format(ip)
-        self.session = self.login(username, password)
+        # The skip and done lists only look at the neighbors, the run is recorded by the call that returns the data
+        record = returntype not in ("skip", "done")
+        run = {'type': 'run', 'run_id': uuid.uuid4().hex, 'time': datetime.now().isoformat(), 'site': site,
+               'incremental': self.incremental, 'peers': {}, 'timings': {}, 'error': None}
+        start = time.time()
         data = []
+        done_list = []
+        changed = True
         try:
-            lldp_info = self.fetch_lldp_info().json()
-
-            # check if not lldp_info is not empty
-            if not lldp_info:
-                self._display.warning("LLDP Info of CX Switch is empty, skipping ztp vars declaration")
-                return []
-
-            data, done_list = self.filter_data(lldp_info)
-
-            # check if data is not empty
-            if not data:
-                self._display.warning(
-                    "Data Info of CX Switch is empty, skipping ztp vars declaration."
-                    " This mean non of the mac addresses in the switch list and lldp information where matching.")
-                data = []
-            else:
-                data = self.get_lag(data)
-
-            # Build log file
-            skip_list = self.build_logfile(site)
-
-            # Decided on which list to return
-            if returntype == "skip":
-                return skip_list
-            elif returntype == "done":
-                return done_list
-            else:
-                return data
-
+            state = None
+            if self.incremental:
+                # Switches that reached their static ip in an earlier run are not queried again
+                state = self.load_state(site)
+                for mac in switch_data:
+                    if state['done'].get(mac) == switch_data[mac][0]:
+                        switch_data[mac][2] = True
+                        done_list.append({'mac': mac.replace(":", "-"), 'static_ip': switch_data[mac][0],
+                                          'hostname': switch_data[mac][1]})
+            query_data = dict((mac, values) for mac, values in switch_data.items() if not values[2])
+
+            if query_data:
+                lldp_info = self.query_peers(ip, username, password, site, query_data, run['peers'])
+
+                # check if not lldp_info is not empty
+                if not lldp_info:
+                    self._display.warning("LLDP Info of CX Switch is empty, skipping ztp vars declaration")
+                    run['error'] = "LLDP Info of CX Switch is empty"
+                    return []
+
+                phase = time.time()
+                data, new_done_list = self.filter_data(lldp_info, query_data)
+                done_list.extend(new_done_list)
+
+                # check if data is not empty
+                if not data:
+                    self._display.warning(
+                        "Data Info of CX Switch is empty, skipping ztp vars declaration."
+                        " This mean non of the mac addresses in the switch list and lldp information where matching.")
+                    data = []
+                else:
+                    data = self.get_lag(data)
+                run['timings']['filtering'] = round(time.time() - phase, 3)
+
+            if state is not None and record:
+                data, changed = self.update_state(site, state, data, done_list, query_data)
+        except Exception as error:
+            run['error'] = to_native(error)
+            raise
         finally:
-            self.logout()
-
-    def login(self, username, password):
-        """
-        Function handles login for REST API of the Switch
-        :param username: The switch account username for authentication
-        :param password: The switch account password authentication
-        :return: Session object
-        """
-        # Create Session Object
-        session = requests.Session()
-        # Authenticate Session Object
-        response = session.post(self.base_url + "login",
-                                params={"username": username, "password": password}, verify=False,
-                                timeout=2)
-        if response.status_code != 200:
-            raise AnsibleParserError('Login Request Failed with Status Code %s .' % to_text(str(response.status_code)))
+            run['timings']['total'] = round(time.time() - start, 3)
+            # Journal of the run, an incremental run without changes only records the run itself
+            if record:
+                self.write_journal(site, switch_data, data, done_list, run, changed)
+
+        # Decided on which list to return
+        if returntype == "skip":
+            return self.skip_list(switch_data)
+        elif returntype == "done":
+            return done_list
         else:
-            return session
+            return data
 
-    def logout(self):
+    def query_peers(self, ip, username, password, site, switch_data, timings):
         """
-        Session will be closed
-        :return: True/False
+        Queries all peers of a site at the same time and merges their LLDP neighbors by chassis_id
+        :param ip: ip or list of ips of the ztp cx switches (VSX peers)
+        :param username: username of cx switch
+        :param password: password of cx switch
+        :param site: site name for error messages
+        :param switch_data: dict of mac to [static ip, hostname, found] of the switches to query
+        :param timings: dict that gets the timings and the error of each peer
+        :return: list of lldp neighbor and LAG map of the peer that saw the neighbor
         """
-        session = self.session
-        response = session.post(self.base_url + "logout", verify=False)
-        if response.status_code != 200:
-            raise AnsibleParserError('Logout Request Failed with Status Code %s .' % to_text(str(response.status_code)))
-
-    def fetch_lldp_info(self):
+        peers = ip if isinstance(ip, list) else [ip]
+        pool = ThreadPool(len(peers))
+        try:
+            for peer in peers:
+                timings[peer] = {}
+            results = [pool.apply_async(self.query_peer, (peer, username, password, switch_data, timings[peer])) for peer in peers]
+            peer_data = []
+            errors = []
+            for peer, result in zip(peers, results):
+                try:
+                    peer_data.append(result.get())
+                except Exception as error:
+                    timings[peer]['error'] = to_native(error)
+                    errors.append('%s: %s' % (peer, to_native(error)))
+        finally:
+            pool.close()
+            pool.join()
+
+        # One reachable peer is enough
+        if not peer_data:
+            raise AnsibleParserError('No CX Switch of site %s reachable. %s' % (site, ' '.join(errors)))
+        for error in errors:
+            self._display.warning("Skipping CX Switch %s" % error)
+
+        # Merge LLDP neighbors of all peers, every neighbor keeps the LAG map of the peer it was seen on
+        lldp_info = []
+        seen = set()
+        for lldp_neighbors, lags in peer_data:
+            for neighbor in lldp_neighbors or []:
+                if neighbor['chassis_id'] in seen:
+                    continue
+                seen.add(neighbor['chassis_id'])
+                lldp_info.append((neighbor, lags))
+        return lldp_info
+
+    def load_state(self, site):
         """
-        Fetches LLDP Neighbor Information
-        :return: JSOn Object of LLDP Information
+        Loads the snapshot of the last incremental run
+        :param site: site name
+        :return: dict with neighbors (mac to snapshot and time it was returned) and done (mac to static ip)
         """
-        response = self.session.get(self.base_url + "system/interfaces/*/lldp_neighbors?depth=1", verify=False,
-                                    timeout=2)
-        if response.status_code != 200:
-            raise AnsibleParserError(
-                'LLDP Get Request Failed with Status Code %s .' % to_text(str(response.status_code)))
-        else:
-            return response
+        try:
+            with io.open("./ztp_logs/" + site + ".state.json", 'r') as infile:
+                state = json.load(infile)
+        except (IOError, OSError, ValueError):
+            state = {}
+        state.setdefault('neighbors', {})
+        state.setdefault('done', {})
+        return state
+
+    def update_state(self, site, state, data, done_list, query_data):
+        """
+        Keeps only neighbors that are new, changed or unchanged for retry_after seconds and stores the snapshot
+        :param site: site name
+        :param state: loaded state
+        :param data: neighbors of this run
+        :param done_list: switches that are done
+        :param query_data: switches that were queried in this run
+        :return: tuple of the neighbors to return and whether anything changed since the last run
+        """
+        now = time.time()
+        changed_data = []
+        for data_set in data:
+            snapshot = {'tmp_ip': data_set['tmp_ip'], 'interface': data_set['interface'], 'lag': data_set.get('lag')}
+            previous = state['neighbors'].get(data_set['mac'])
+            if previous is None or previous['snapshot'] != snapshot or now - previous['returned'] >= self.retry_after:
+                changed_data.append(data_set)
+                state['neighbors'][data_set['mac']] = {'snapshot': snapshot, 'returned': now}
+
+        done_macs = set(data_set['mac'] for data_set in done_list)
+        new_done = [mac for mac in query_data if mac.replace(":", "-") in done_macs]
+        for mac in new_done:
+            state['done'][mac] = query_data[mac][0]
+            state['neighbors'].pop(mac.replace(":", "-"), None)
+
+        changed = bool(changed_data or new_done)
+        if changed:
+            self.ensure_log_dir()
+            path = "./ztp_logs/" + site + ".state.json"
+            with io.open(path + ".tmp", 'w') as outfile:
+                outfile.write(to_text(json.dumps(state)))
+            os.rename(path + ".tmp", path)
+        return changed_data, changed
+
+    def ensure_log_dir(self):
+        """
+        Creates the log directory
+        """
+        # Sites run concurrently, another site might create the directory at the same time
+        try:
+            os.makedirs("./ztp_logs/")
+        except OSError:
+            if not os.path.isdir("./ztp_logs/"):
+                raise
 
-    def filter_data(self, lldp_info):
+    def filter_data(self, lldp_info, switch_data):
         """
         Filters LLDP Info for Data that is in Switch list
-        :param lldp_info: dict containing lldp neighbor info
+        :param lldp_info: list of lldp neighbor and LAG map of the peer that saw the neighbor
+        :param switch_data: dict of mac to [static ip, hostname, found]
         :return: filtered list
         """
 
         data_filtered_list = []
         done_list = []
         # Filter LLDP Info
-        for neighbor in lldp_info:
+        for neighbor, lags in lldp_info:
             mac = neighbor['chassis_id']
             tmp_ip = neighbor['neighbor_info']['mgmt_ip_list']
             # Filter if mac is in switch data and current ip of neighbor is unequal to switch ip
-            if (mac in self.switch_data) and (tmp_ip != self.switch_data[mac][0]):
-                data_filtered = {'mac': mac.replace(":", "-"), 'static_ip': self.switch_data[mac][0],
-                                 'hostname': self.switch_data[mac][1], 'tmp_ip': tmp_ip,
-                                 'interface': neighbor['interface'][0]}
+            if (mac in switch_data) and (tmp_ip != switch_data[mac][0]):
+                data_filtered = {'mac': mac.replace(":", "-"), 'static_ip': switch_data[mac][0],
+                                 'hostname': switch_data[mac][1], 'tmp_ip': tmp_ip,
+                                 'interface': neighbor['interface'][0], 'lags': lags}
                 data_filtered_list.append(data_filtered)
-                self.switch_data[mac][2] = True
-            elif (mac in self.switch_data) and (tmp_ip == self.switch_data[mac][0]):
-                data_filtered = {'mac': mac.replace(":", "-"), 'static_ip': self.switch_data[mac][0],
-                                 'hostname': self.switch_data[mac][1]}
+                switch_data[mac][2] = True
+            elif (mac in switch_data) and (tmp_ip == switch_data[mac][0]):
+                data_filtered = {'mac': mac.replace(":", "-"), 'static_ip': switch_data[mac][0],
+                                 'hostname': switch_data[mac][1]}
                 done_list.append(data_filtered)
-                self.switch_data[mac][2] = True
+                switch_data[mac][2] = True
 
         return data_filtered_list, done_list
 
     def get_lag(self, data):
         """
         Get LAG information for each interface
-        :param data: data object with filtered data
+        :param data: data object with filtered data and the LAG map of the peer that saw the neighbor
         :return: data object with additional information
         """
-        response = self.session.get(self.base_url + "system/ports/*?attributes=interfaces,name", verify=False,
-                                    timeout=2)
-        if response.status_code != 200:
-            raise AnsibleParserError(
-                'Port Get Request Failed with Status Code %s .' % to_text(str(response.status_code)))
-        if not response.json():
-            raise AnsibleParserError('Port Request returns Empty Object. This means no LAG is configured')
-
-        # reformat response
-        lag_dict = {}
-        for port in response.json():
-            if "lag" in port['name']:
-                for intf in port['interfaces']:
-                    lag_dict[intf] = port['name']
+        for data_set in data:
+            lag_dict = data_set.pop('lags')
+            if lag_dict is None:
+                raise AnsibleParserError('Port Request returns Empty Object. This means no LAG is configured')
 
-        if not lag_dict:
-            raise AnsibleParserError('No Lag configured on Switch')
+            if not lag_dict:
+                raise AnsibleParserError('No Lag configured on Switch')
 
-        # Match Lag to data_set
-        for data_set in data:
+            # Match Lag to data_set
             if data_set['interface'] in lag_dict:
                 data_set['lag'] = lag_dict[data_set['interface']]
             else:
@@ -194,31 +594,46 @@ class LookupModule(LookupBase):
 
         return data
 
-    def build_logfile(self, site):
+    def write_journal(self, site, switch_data, data, done_list, run, switches=True):
         """
-        Logs which switches were used for configuration
+        Appends the run and the state of each switch as JSON lines to ./ztp_logs/<site>.jsonl
+        Switch states are skipped (not seen via LLDP), configured (returned for configuration), done (has its
+        static ip) and pending (unchanged since the last incremental run)
         :param site: site name for variables
+        :param switch_data: dict of mac to [static ip, hostname, found]
+        :param data: switches returned for configuration
+        :param done_list: switches that are done
+        :param run: run record with timings and error
+        :param switches: also write a record per switch
         """
-        # Get all Switches which did not match LLDP Info
-        skip_list = []
-        done_list = []
-        for key in self.switch_data:
-            if not self.switch_data[key][2]:
-                skip_list.append([key, self.switch_data[key][0], self.switch_data[key][1]])
+        configured = set(data_set['mac'] for data_set in data)
+        done = set(data_set['mac'] for data_set in done_list)
+        records = [run]
+        for key in switch_data:
+            if not switch_data[key][2]:
+                state = "skipped"
+            elif key.replace(":", "-") in configured:
+                state = "configured"
+            elif key.replace(":", "-") in done:
+                state = "done"
             else:
-                done_list.append([key, self.switch_data[key][0], self.switch_data[key][1]])
-        # Build Log file
-        if not os.path.exists("./ztp_logs/"):
-            os.makedirs("./ztp_logs/")
-        with io.open("./ztp_logs/" + site + ".txt", 'w') as outfile:
-            outfile.write((datetime.now().strftime("%I:%M%p on %B %d, %Y") + "\n").decode('unicode-escape'))
-            outfile.write(u"\n *****The following switches got skipped in this run***** \n")
-            for switch in skip_list:
-                outfile.write(u"MAC:" + str(switch[0]).decode('unicode-escape') + ", IP: " + str(switch[1]).decode(
-                    'unicode-escape') + ", Hostname: " + str(switch[2]).decode('unicode-escape') + "\n")
-            outfile.write(
-                u"\n *****The following switches got configured or are already configured with a static ip**** \n")
-            for switch in done_list:
-                outfile.write(u"MAC:" + str(switch[0]).decode('unicode-escape') + ", IP: " + str(switch[1]).decode(
-                    'unicode-escape') + ", Hostname: " + str(switch[2]).decode('unicode-escape') + "\n")
-        return skip_list
+                state = "pending"
+            records.append({'type': 'switch', 'run_id': run['run_id'], 'site': site, 'mac': key,
+                            'ip': switch_data[key][0], 'hostname': switch_data[key][1], 'state': state})
+        run['counts'] = {}
+        for record in records[1:]:
+            run['counts'][record['state']] = run['counts'].get(record['state'], 0) + 1
+        if not switches:
+            records = [run]
+
+        # One write per run, sites run concurrently but each site has its own file
+        self.ensure_log_dir()
+        with io.open("./ztp_logs/" + site + ".jsonl", 'a') as outfile:
+            outfile.write(u"".join(to_text(json.dumps(record, sort_keys=True)) + u"\n" for record in records))
+
+    def skip_list(self, switch_data):
+        """
+        :param switch_data: dict of mac to [static ip, hostname, found]
+        :return: list of [mac, static ip, hostname] of the switches that were not seen via LLDP
+        """
+        return [[key, switch_data[key][0], switch_data[key][1]] for key in switch_data if not switch_data[key][2]]
@@ -0,0 +1,287 @@
+# Aruba ACL - Normalizes ArubaOS-CX ACL entries, finds unreachable entries and diffs entry sets
+# Used by the acl_filters filter plugin, so it must not import Ansible code
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+# Python imports
+import socket
+import struct
+
+# Protocol numbers as returned by the REST API and their names as used in the acl_entries vars
+PROTOCOLS = {1: 'icmp', 2: 'igmp', 6: 'tcp', 17: 'udp', 47: 'gre', 50: 'esp', 51: 'ah', 58: 'icmpv6', 89: 'ospf',
+             103: 'pim', 112: 'vrrp', 132: 'sctp'}
+PROTOCOL_NUMBERS = dict((name, number) for number, name in PROTOCOLS.items())
+PORT_PROTOCOLS = ('tcp', 'udp', 'sctp')
+PORT_KEYS = (('src_l4_port_min', 'src_l4_port_max'), ('dst_l4_port_min', 'dst_l4_port_max'))
+# Attributes that do not change which packets match
+NO_MATCH_KEYS = ('action', 'count', 'log', 'comment', 'sequence_number')
+# Further match attributes of an entry, every other key (e.g. the status attributes of a GET with depth=2) is ignored
+MATCH_KEYS = ('dscp', 'ecn', 'ip_precedence', 'tos', 'ttl', 'fragment', 'icmp_type', 'icmp_code', 'tcp_ack', 'tcp_cwr',
+              'tcp_ece', 'tcp_established', 'tcp_fin', 'tcp_psh', 'tcp_rst', 'tcp_syn', 'tcp_urg', 'vlan', 'pcp',
+              'ethertype', 'src_mac', 'dst_mac')
+ADDRESS_KEYS = ('src_ip', 'dst_ip')
+ALL_ONES = 0xFFFFFFFF
+
+
+class AclError(Exception):
+    pass
+
+
+def parse_address(text):
+    """
+    Parses an address of an ACL entry
+    :param text: "10.1.1.1/255.255.255.0", "10.1.1.0/24", "10.1.1.1", "any" or None
+    :return: tuple of network and mask as int, host bits of the network are cleared
+    """
+    if text in (None, '', 'any'):
+        return 0, 0
+    address, _, mask = str(text).partition('/')
+    try:
+        network = struct.unpack('!I', socket.inet_aton(address))[0]
+        if not mask:
+            mask = ALL_ONES
+        elif '.' in mask:
+            mask = struct.unpack('!I', socket.inet_aton(mask))[0]
+        else:
+            mask = (ALL_ONES << (32 - int(mask))) & ALL_ONES
+    except (socket.error, ValueError):
+        raise AclError('Invalid address %s' % text)
+    return network & mask, mask
+
+
+def format_address(network, mask):
+    """
+    :return: address in the dotted mask format of the REST API
+    """
+    return '%s/%s' % (socket.inet_ntoa(struct.pack('!I', network)), socket.inet_ntoa(struct.pack('!I', mask)))
+
+
+def prefix_length(mask):
+    """
+    :return: prefix length of a contiguous mask, None for a wildcard mask like 255.0.255.0
+    """
+    length = bin(mask).count('1')
+    return length if mask == (ALL_ONES << (32 - length)) & ALL_ONES else None
+
+
+def normalize_protocol(protocol):
+    if protocol in (None, '', 'any', 'ip'):
+        return 'any'
+    if isinstance(protocol, int) or str(protocol).isdigit():
+        return PROTOCOLS.get(int(protocol), str(int(protocol)))
+    return str(protocol).lower()
+
+
+class AclRule(object):
+
+    def __init__(self, sequence, entry):
+        """
+        Normalized ACL entry
+        :param sequence: sequence number
+        :param entry: entry dict of the acl_entries vars or of the cfg_aces of the REST API
+        """
+        self.sequence = int(sequence)
+        self.action = str(entry.get('action', 'permit')).lower()
+        self.protocol = normalize_protocol(entry.get('protocol'))
+        self.src = parse_address(entry.get('src_ip'))
+        self.dst = parse_address(entry.get('dst_ip'))
+        self.ports = []
+        for min_key, max_key in PORT_KEYS:
+            low = int(entry.get(min_key) or 0) if self.protocol in PORT_PROTOCOLS else 0
+            high = int(entry.get(max_key) or 65535) if self.protocol in PORT_PROTOCOLS else 65535
+            self.ports.append((low, high))
+        self.extras = dict((key, entry[key]) for key in MATCH_KEYS if entry.get(key) not in (None, '', False))
+        self.options = dict((key, entry[key]) for key in ('count', 'log', 'comment') if entry.get(key))
+        # Packets a rule matches
+        self.match = (self.protocol, self.src, self.dst, tuple(self.ports), tuple(sorted(self.extras.items())))
+
+    def covers(self, other):
+        """
+        :param other: AclRule
+        :return: True if every packet that matches other also matches this rule
+        """
+        if self.protocol != 'any' and self.protocol != other.protocol:
+            return False
+        for (network, mask), (other_network, other_mask) in ((self.src, other.src), (self.dst, other.dst)):
+            if other_mask & mask != mask or other_network & mask != network:
+                return False
+        for (low, high), (other_low, other_high) in zip(self.ports, other.ports):
+            if other_low < low or other_high > high:
+                return False
+        for key, value in self.extras.items():
+            if other.extras.get(key) != value:
+                return False
+        return True
+
+    def entry(self):
+        """
+        :return: entry dict in the format of the acl_entries vars
+        """
+        entry = {'action': self.action, 'protocol': self.protocol, 'count': bool(self.options.get('count')),
+                 'src_ip': format_address(*self.src), 'dst_ip': format_address(*self.dst)}
+        if self.protocol in PORT_PROTOCOLS:
+            for (min_key, max_key), (low, high) in zip(PORT_KEYS, self.ports):
+                if (low, high) != (0, 65535):
+                    entry[min_key] = low
+                    entry[max_key] = high
+        entry.update(self.extras)
+        entry.update((key, value) for key, value in self.options.items() if key != 'count')
+        return entry
+
+    def rest_entry(self):
+        """
+        :return: entry dict in the format of the REST API, protocol as number and no address or protocol for any
+        """
+        entry = self.entry()
+        if self.protocol == 'any':
+            del entry['protocol']
+        elif self.protocol in PROTOCOL_NUMBERS:
+            entry['protocol'] = PROTOCOL_NUMBERS[self.protocol]
+        elif self.protocol.isdigit():
+            entry['protocol'] = int(self.protocol)
+        else:
+            raise AclError('Unknown protocol %s in ACL entry %s, use the protocol number' % (self.protocol,
+                                                                                           self.sequence))
+        for key, (network, mask) in zip(ADDRESS_KEYS, (self.src, self.dst)):
+            if not mask:
+                del entry[key]
+        return entry
+
+    def signature(self):
+        """
+        :return: tuple that differs if the entry on the switch has to be changed
+        """
+        return self.action, self.match, tuple(sorted(self.options.items()))
+
+
+class RuleIndex(object):
+
+    def __init__(self):
+        """
+        Rules bucketed by source and destination prefix. A rule can only be covered by rules whose prefixes contain
+        its prefixes, so a lookup probes one bucket per prefix length in use instead of comparing all rules
+        """
+        self.buckets = {}
+        self.src_lengths = set()
+        self.dst_lengths = set()
+        # Rules with wildcard masks are compared one by one
+        self.wildcards = []
+        self.rules = []
+
+    def add(self, rule):
+        self.rules.append(rule)
+        src_length = prefix_length(rule.src[1])
+        dst_length = prefix_length(rule.dst[1])
+        if src_length is None or dst_length is None:
+            self.wildcards.append(rule)
+            return
+        self.src_lengths.add(src_length)
+        self.dst_lengths.add(dst_length)
+        self.buckets.setdefault((src_length, rule.src[0], dst_length, rule.dst[0]), []).append(rule)
+
+    def candidates(self, rule):
+        """
+        :param rule: AclRule
+        :return: generator of indexed rules that may cover the rule
+        """
+        src_length = prefix_length(rule.src[1])
+        dst_length = prefix_length(rule.dst[1])
+        if src_length is None or dst_length is None:
+            for candidate in self.rules:
+                yield candidate
+            return
+        for src in self.src_lengths:
+            if src > src_length:
+                continue
+            src_network = rule.src[0] & ((ALL_ONES << (32 - src)) & ALL_ONES)
+            for dst in self.dst_lengths:
+                if dst > dst_length:
+                    continue
+                dst_network = rule.dst[0] & ((ALL_ONES << (32 - dst)) & ALL_ONES)
+                for candidate in self.buckets.get((src, src_network, dst, dst_network), ()):
+                    yield candidate
+        for candidate in self.wildcards:
+            yield candidate
+
+    def first_cover(self, rule):
+        """
+        :param rule: AclRule
+        :return: indexed rule with the lowest sequence number that covers the rule or None
+        """
+        covering = None
+        for candidate in self.candidates(rule):
+            if (covering is None or candidate.sequence < covering.sequence) and candidate.covers(rule):
+                covering = candidate
+        return covering
+
+
+def parse_rules(entries):
+    """
+    :param entries: dict of sequence number to entry, the keys can be strings
+    :return: list of AclRule sorted by sequence number
+    """
+    rules = []
+    for sequence, entry in entries.items():
+        try:
+            rules.append(AclRule(sequence, entry))
+        except (TypeError, ValueError, AttributeError) as error:
+            raise AclError('Invalid ACL entry %s: %s' % (sequence, error))
+    rules.sort(key=lambda rule: rule.sequence)
+    return rules
+
+
+def compile_acl(entries, prune=False):
+    """
+    Normalizes the entries and finds entries that can never match because an entry with a lower sequence
+    number matches all their packets. Such an entry is a duplicate (same match and action), redundant (same action)
+    or shadowed (other action, most likely a mistake)
+    :param entries: dict of sequence number to entry
+    :param prune: leave the unreachable entries out of the compiled entries, by default they are only reported
+    :return: dict with entries, duplicates, redundant and shadowed
+    """
+    index = RuleIndex()
+    result = {'entries': {}, 'duplicates': [], 'redundant': [], 'shadowed': []}
+    for rule in parse_rules(entries):
+        covering = index.first_cover(rule)
+        if covering is not None:
+            if covering.match == rule.match and covering.action == rule.action:
+                kind = 'duplicates'
+            elif covering.action == rule.action:
+                kind = 'redundant'
+            else:
+                kind = 'shadowed'
+            result[kind].append({'sequence': rule.sequence, 'covered_by': covering.sequence})
+            if prune:
+                continue
+        else:
+            # A rule that is covered itself can not cover anything its covering rule does not cover
+            index.add(rule)
+        result['entries'][str(rule.sequence)] = rule.entry()
+    return result
+
+
+def diff_acl(current, wanted):
+    """
+    Minimal changes that turn the entries on the switch into the wanted entries
+    :param current: cfg_aces dict of the switch (GET with depth=2) or the ACL object with cfg_aces
+    :param wanted: dict of sequence number to entry, e.g. the entries of compile_acl
+    :return: dict with add and update (sequence number to entry in the format of the REST API), remove (sequence
+             numbers) and unchanged count
+    """
+    if 'cfg_aces' in current:
+        current = current['cfg_aces'] or {}
+    current_rules = dict((rule.sequence, rule) for rule in parse_rules(current))
+    changes = {'add': {}, 'update': {}, 'remove': [], 'unchanged': 0}
+    for rule in parse_rules(wanted):
+        existing = current_rules.pop(rule.sequence, None)
+        if existing is None:
+            changes['add'][str(rule.sequence)] = rule.rest_entry()
+        elif existing.signature() != rule.signature():
+            changes['update'][str(rule.sequence)] = rule.rest_entry()
+        else:
+            changes['unchanged'] += 1
+    changes['remove'] = sorted(current_rules)
+    return changes
@@ -0,0 +1,145 @@
+# Aruba CLI Batch - Splits configs into cli_batch chunks and reads the batch status of ArubaOS-Switches
+# Used by the arubaos_switch_cli_batch module and by the ztp_filter filter plugin, so it must not import Ansible code
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+# Python imports
+import base64
+import re
+
+# Default chunk limits, a chunk is one POST to /rest/<version>/cli_batch
+MAX_LINES = 300
+MAX_BYTES = 16384
+
+# Lines that open a context without being indented themselves, the context ends with exit or the next context
+CONTEXT_START = re.compile(r'^(vlan \d+|interface [\w/\-]+|router \w+|oobm|mst \d+|'
+                           r'ip access-list (standard|extended) \S+|ipv6 access-list \S+|class \S+ \S+|policy \S+ \S+)\s*$')
+# Comments and headers of a rendered config
+IGNORE = re.compile(r'^(;|!|Running configuration:)')
+
+# Batch and command states of GET /rest/<version>/cli_batch/status
+BATCH_RUNNING = ('CBS_INITIATED', 'CBS_IN_PROGRESS')
+COMMAND_RUNNING = ('CCS_INITIATED', 'CCS_IN_PROGRESS')
+COMMAND_OK = ('CCS_SUCCESS',)
+
+
+def command_lines(commands):
+    """
+    Normalizes commands to a list of lines with indentation, comments and empty lines are dropped
+    :param commands: string of commands split by newlines or list of commands
+    :return: list of lines
+    """
+    if not isinstance(commands, (list, tuple)):
+        commands = commands.replace('\\n', '\n').splitlines()
+    lines = []
+    for line in commands:
+        line = line.rstrip()
+        if line.strip() and not IGNORE.match(line.strip()):
+            lines.append(line)
+    return lines
+
+
+def blocks(lines):
+    """
+    Groups lines into blocks that must be sent in the same batch, a block is a top level command with its context
+    :param lines: list of lines
+    :return: generator of lists of lines
+    """
+    block = []
+    open_context = False
+    indented = False
+    for line in lines:
+        stripped = line.strip()
+        top_level = line == line.lstrip()
+        # An unindented context stays open until exit, an indented one ends with the next top level line
+        if top_level and block and (not open_context or indented or CONTEXT_START.match(stripped)):
+            yield block
+            block = []
+            open_context = False
+            indented = False
+        block.append(line)
+        if top_level and CONTEXT_START.match(stripped):
+            open_context = True
+        elif stripped == "exit":
+            open_context = False
+        elif not top_level:
+            indented = True
+    if block:
+        yield block
+
+
+def split_batches(commands, max_lines=MAX_LINES, max_bytes=MAX_BYTES):
+    """
+    Splits the commands into batches at context boundaries, a context that is bigger than the limits is split
+    at its lines and its first line is repeated so that the rest runs in the same context
+    :param commands: string of commands split by newlines or list of commands
+    :param max_lines: maximal number of lines per batch
+    :param max_bytes: maximal size of the unencoded batch
+    :return: list of batches, each a list of tuples of line number (starting at 1) and command
+    """
+    batches = []
+    batch = []
+    size = 0
+    number = 0
+    for block in blocks(command_lines(commands)):
+        numbered = []
+        for line in block:
+            number += 1
+            numbered.append((number, line.strip()))
+        block_size = sum(len(line) + 1 for _, line in numbered)
+
+        if batch and (len(batch) + len(numbered) > max_lines or size + block_size > max_bytes):
+            batches.append(batch)
+            batch = []
+            size = 0
+
+        for item in numbered:
+            if batch and (len(batch) >= max_lines or size + len(item[1]) + 1 > max_bytes):
+                batches.append(batch)
+                # Continue the context in the next batch
+                batch = [(None, numbered[0][1])] if item is not numbered[0] and len(numbered) > 1 else []
+                size = sum(len(line) + 1 for _, line in batch)
+            batch.append(item)
+            size += len(item[1]) + 1
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def encode_batch(batch):
+    """
+    Builds the body of a cli_batch POST
+    :param batch: list of line number and command tuples or list of commands
+    :return: dict with the base64 encoded commands
+    """
+    text = "\n".join(item[1] if isinstance(item, tuple) else item for item in batch)
+    return {'cli_batch_base64_encoded': base64.b64encode(text.encode('utf-8')).decode('utf-8')}
+
+
+def batch_state(status, batch):
+    """
+    Evaluates the cli_batch status response of a batch
+    :param status: json of GET /rest/<version>/cli_batch/status
+    :param batch: list of line number and command tuples that were posted
+    :return: tuple of state ('running', 'done' or 'failed') and for failed the failing line number, command and result
+    """
+    logs = status.get('cmd_exec_logs') or []
+    # Right after the post the status can still be the one of the previous batch
+    if len(logs) > len(batch) or any(log.get('cmd') is not None and log['cmd'].split() != batch[index][1].split()
+                                     for index, log in enumerate(logs)):
+        return 'running', None
+    for index, log in enumerate(logs):
+        command_status = log.get('status', '')
+        if command_status in COMMAND_RUNNING:
+            return 'running', None
+        if command_status not in COMMAND_OK:
+            number = batch[index][0] if index < len(batch) else None
+            return 'failed', (number, log.get('cmd', ''), log.get('result') or command_status)
+
+    overall = status.get('status', '')
+    if overall in BATCH_RUNNING or (not overall and len(logs) < len(batch)):
+        return 'running', None
+    return 'done', None
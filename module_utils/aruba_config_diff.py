@@ -0,0 +1,242 @@
+# Aruba Config Diff - Hierarchical parser and differ for ArubaOS-Switch and ArubaOS-CX configurations
+# Used by the arubaos_switch_ssh_cli and arubaos_cx_ssh_cli modules, must not import Ansible code
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+# Python imports
+import re
+from collections import OrderedDict
+
+# Lines that are no configuration: comments, headers and context ends
+IGNORE = re.compile(r'^(;|!|Running configuration:|Current configuration:|exit\b|exit-address-family\b|end\b)')
+# Output of a command the switch did not accept
+CLI_ERROR = re.compile(r'(Invalid input|Incomplete input|Unknown command|Ambiguous input|^\s*%)', re.MULTILINE)
+# Settings with only one value, a new value replaces the old one. Every other line can be configured several times
+# (ip helper-address, ntp server, vlan lists ...) and a changed value needs the no command of the old line
+SINGLE_VALUE = ('hostname', 'description', 'name', 'ip default-gateway', 'mtu', 'vlan access', 'vlan trunk native',
+                'snmp-server contact', 'snmp-server location', 'time timezone', 'timesync', 'banner motd',
+                'spanning-tree priority', 'console idle-timeout')
+# Settings with a list of vlans or ports (vlan 1,100,302 or untagged 1-48), only added and removed members are sent.
+# A changed list must not be negated as a whole, that would remove members the candidate still has
+LIST_VALUE = ('vlan trunk allowed', 'untagged', 'tagged', 'forbid', 'vlan')
+# Member of a list, a vlan or port or a range of them, e.g. 10, 1-48, 1/1/1-1/1/4 or A1-A24
+LIST_MEMBER = re.compile(r'^([\w/]*?)(\d+)(?:-\1(\d+))?$')
+# Running lines the platform creates itself, they are never removed when the candidate does not have them
+KEEP = (r'^module \d+ ', r'^oobm$', r'^password (manager|operator)\b', r'^include-credentials\b', r'^user admin\b',
+        r'^interface mgmt$', r'^vrf mgmt$', r'^vsf member\b', r'^stacking$')
+
+
+class ConfigNode(object):
+
+    def __init__(self, line=None):
+        """
+        Line of a configuration with the lines of its context
+        :param line: configuration line without indentation, None for the root
+        """
+        self.line = line
+        self.children = OrderedDict()
+
+    def lines(self):
+        """
+        :return: the line and all lines of its context in config order, contexts end with exit
+        """
+        commands = [self.line]
+        for child in self.children.values():
+            commands.extend(child.lines())
+        if self.children:
+            commands.append("exit")
+        return commands
+
+
+def normalize(line):
+    """
+    :param line: configuration line
+    :return: line for comparisons, quotes are optional on the CLI (hostname "sw1" is hostname sw1)
+    """
+    return line.replace('"', '')
+
+
+def parse_config(text):
+    """
+    Parses a configuration into a tree, the context of a line are the following lines with more indentation
+    :param text: configuration as printed by show running-config
+    :return: root ConfigNode, children are keyed by their normalized line
+    """
+    root = ConfigNode()
+    # Stack of indentation and node
+    stack = [(-1, root)]
+    for raw_line in text.splitlines():
+        line = raw_line.rstrip()
+        stripped = line.strip()
+        if not stripped or IGNORE.match(stripped):
+            continue
+        indent = len(line) - len(line.lstrip())
+        while stack[-1][0] >= indent:
+            stack.pop()
+        parent = stack[-1][1]
+        # Same line twice in one context is kept once
+        node = parent.children.setdefault(normalize(stripped), ConfigNode(stripped))
+        stack.append((indent, node))
+    return root
+
+
+def line_key(line):
+    """
+    Key of a setting that has only one value, a changed value replaces the old line without a no command
+    :param line: normalized configuration line
+    :return: single value keyword of the line or None if the line can be configured several times
+    """
+    for keyword in SINGLE_VALUE:
+        if line.startswith(keyword + " "):
+            return keyword
+    return None
+
+
+def list_members(line):
+    """
+    Splits a list valued line into its keyword and members
+    :param line: normalized configuration line
+    :return: tuple of keyword and list of members or None if the line has no list value
+    """
+    for keyword in LIST_VALUE:
+        if not line.startswith(keyword + " "):
+            continue
+        value = line[len(keyword) + 1:]
+        if " " in value:
+            return None
+        members = []
+        for item in value.split(","):
+            match = LIST_MEMBER.match(item)
+            if match is None or match.group(3) is None:
+                # Single member or unknown format like all, kept as one member
+                members.append(item)
+            else:
+                prefix = match.group(1)
+                members.extend(prefix + str(number) for number in range(int(match.group(2)), int(match.group(3)) + 1))
+        return keyword, members
+    return None
+
+
+def format_members(members):
+    """
+    :param members: list of members in config order
+    :return: list value, consecutive members with the same prefix become a range, e.g. 1-3,10
+    """
+    ranges = []
+    for member in members:
+        match = LIST_MEMBER.match(member)
+        if match is None or match.group(3) is not None:
+            ranges.append([member, None, None])
+            continue
+        prefix, number = match.group(1), int(match.group(2))
+        if ranges and ranges[-1][0] == prefix and ranges[-1][2] is not None and ranges[-1][2] + 1 == number:
+            ranges[-1][2] = number
+        else:
+            ranges.append([prefix, number, number])
+    items = []
+    for prefix, first, last in ranges:
+        if first is None:
+            items.append(prefix)
+        elif first == last:
+            items.append(prefix + str(first))
+        else:
+            items.append("%s%s-%s%s" % (prefix, first, prefix, last))
+    return ",".join(items)
+
+
+def context_members(node):
+    """
+    :param node: ConfigNode of a context
+    :return: dict of list keyword and set of members of all lines of the context
+    """
+    members = {}
+    for key in node.children:
+        listed = list_members(key)
+        if listed:
+            members.setdefault(listed[0], set()).update(listed[1])
+    return members
+
+
+def negate(line):
+    """
+    :param line: configuration line
+    :return: command that removes the line
+    """
+    return line[3:] if line.startswith("no ") else "no " + line
+
+
+def diff_nodes(running, candidate, keep):
+    """
+    Commands that turn the context of running into the context of candidate
+    :param running: ConfigNode of the running configuration
+    :param candidate: ConfigNode of the wanted configuration
+    :param keep: list of compiled regexes of running lines that are never removed
+    :return: list of commands
+    """
+    commands = []
+    added_keys = set()
+    running_members = context_members(running)
+    candidate_members = context_members(candidate)
+    for key, node in candidate.children.items():
+        listed = list_members(key)
+        if listed and not node.children and key not in running.children:
+            # Members the running configuration already has are not sent again
+            added = [member for member in listed[1] if member not in running_members.get(listed[0], ())]
+            if added:
+                commands.append("%s %s" % (listed[0], format_members(added)))
+        elif key not in running.children:
+            commands.extend(node.lines())
+            if not node.children and line_key(key):
+                added_keys.add(line_key(key))
+        elif node.children or running.children[key].children:
+            child_commands = diff_nodes(running.children[key], node, keep)
+            if child_commands:
+                commands.append(node.line)
+                commands.extend(child_commands)
+                commands.append("exit")
+
+    # Removals last and in reverse order, so nothing is removed while it is still referenced
+    # Single value settings are already replaced, lists lose only the members the candidate does not have and
+    # everything else missing in the candidate is negated
+    for key, node in reversed(list(running.children.items())):
+        # Removing no shutdown is the shutdown line the candidate already added
+        if key in candidate.children or normalize(negate(key)) in candidate.children:
+            continue
+        if any(pattern.search(key) for pattern in keep):
+            continue
+        listed = list_members(key)
+        if listed and not node.children:
+            removed = [member for member in listed[1] if member not in candidate_members.get(listed[0], ())]
+            if removed:
+                commands.append("no %s %s" % (listed[0], format_members(removed)))
+        elif node.children or not line_key(key) or line_key(key) not in added_keys:
+            commands.append(negate(node.line))
+    return commands
+
+
+def diff_config(running_text, candidate_text, keep=None):
+    """
+    Minimal ordered command list that turns the running configuration into the candidate configuration
+    :param running_text: show running-config output
+    :param candidate_text: wanted configuration, e.g. a rendered config file
+    :param keep: list of regexes of running lines that are never removed, in addition to KEEP
+    :return: list of commands to run in configuration mode
+    """
+    keep = [re.compile(pattern) for pattern in list(KEEP) + list(keep or [])]
+    return diff_nodes(parse_config(running_text), parse_config(candidate_text), keep)
+
+
+def find_error(commands, outputs):
+    """
+    Finds the first command the switch did not accept
+    :param commands: list of commands
+    :param outputs: list of CLI outputs, one per command
+    :return: tuple of command and output or None
+    """
+    for command, output in zip(commands, outputs):
+        if CLI_ERROR.search(output or ''):
+            return command, output
+    return None
@@ -0,0 +1,149 @@
+# Aruba CX SSH - SSH CLI session for ArubaOS-CX devices
+# Shared by the arubaos_cx_ssh_cli and aruba_multi_ssh_cli modules
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+# Python imports
+import re
+
+import paramiko
+
+from ansible.module_utils.aruba_ssh import ChannelReader, OutputFile, PROMPT_END, last_line, output_path
+
+
+# Class for SSH CLI
+class CliUser(object):
+
+    def __init__(self, module):
+        """
+        Init all variables and starts login
+        :param module: module objects itself
+        """
+        # Init Vars
+        args = module.params
+
+        # List of strings of CLI Commands
+        paramiko_ssh_connection_args = {'hostname': args['ip'], 'port': args['port'], 'username': args['user'],
+                                        'password': args['password'], 'look_for_keys': args['look_for_keys'],
+                                        'allow_agent': args['allow_agent'], 'key_filename': args['key_filename'],
+                                        'timeout': args['timeout']}
+        self.module = module
+
+        # Login
+        self.ssh_client = paramiko.SSHClient()
+        # Default AutoAdd as Policy
+        self.ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        # Connect to Switch via SSH
+        self.ssh_client.connect(**paramiko_ssh_connection_args)
+        self.prompt = ''
+        # SSH Command execution not allowed, therefor using the following paramiko functionality
+        self.shell_chanel = self.ssh_client.invoke_shell()
+        self.shell_chanel.settimeout(8)
+        self.reader = ChannelReader(self.shell_chanel)
+        # AOS-CX specific
+        self.get_prompt()
+
+    def execute_command(self, command_list, output_dir=None, compress=False):
+        """
+        Execute command and returns output
+        :param command_list: list of commands
+        :param output_dir: stream each output to a file in this directory instead of keeping it in memory
+        :param compress: gzip the output files
+        :return: output of show command, with output_dir dicts with path, size and sha256 of the output files
+        """
+        prompt = re.compile(r'\r\n' + re.escape(self.prompt.replace('#', '')) + r'.*#\s*$')
+        hostname = re.compile(r'^ho[^ ]*')
+
+        # RFC 1123 Compliant Regex (See https://stackoverflow.com/questions/106179/regular-expression-to-match-dns-hostname-or-ip-address)
+        validhostname = re.compile(r'^(([a-zA-Z0-9]|[a-zA-Z0-9][a-zA-Z0-9\-]*[a-zA-Z0-9])\.)*([A-Za-z0-9]|[A-Za-z0-9][A-Za-z0-9\-]*[A-Za-z0-9])$')
+
+        # Clear Buffer
+        self.out_channel()
+
+        cli_output = []
+        for index, command in enumerate(command_list):
+            # Check if command wants to change hostname and if so it will also change the prompt regex
+            if hostname.search(command):
+                new_hostname = command.split(" ")[-1]
+                if validhostname.search(new_hostname):
+                    self.prompt = new_hostname+"#"
+                    prompt = re.compile(r'\r\n' + re.escape(new_hostname) + r'.*#\s*$')
+                else:
+                    self.module.fail_json(
+                        msg='To be compliant with RFC 1123, the hostname must contain only letters, '
+                            'numbers and hyphens, and must not start or end with a hyphen. Can not change Hostname!')
+
+            self.in_channel(command)
+
+            if output_dir:
+                sink = OutputFile(output_path(output_dir, self.module.params['ip'], index, command, compress),
+                                  compress, strip_ansi=True)
+                text, found = self.reader.read_until(prompt, sink=sink)
+                if not found:
+                    sink.abort()
+                    self.module.fail_json(msg='Unable to read CLI Output in given Time')
+                cli_output.append(dict(sink.close(), command=command))
+                continue
+
+            # Returns as soon as the prompt is back, 90s are only the upper bound
+            text, found = self.reader.read_until(prompt)
+            if not found:
+                self.module.fail_json(msg='Unable to read CLI Output in given Time')
+            # Reformat text
+            text = text.replace('\r', '').rstrip('\n')
+            # Delete command and end prompt from output
+            text_lines = text.split('\n')[1:-1]
+            cli_output.append('\n'.join(text_lines))
+
+        return cli_output
+
+    def get_prompt(self):
+        """
+        Additional needed Setup for Connection
+        """
+        # Wait for the first prompt
+        self.in_channel("")
+        text, found = self.reader.read_until(PROMPT_END)
+        if not found:
+            self.module.fail_json(msg='Unable to read CLI Output in given Time')
+
+        # Set prompt
+        self.in_channel("")
+        text, found = self.reader.read_until(PROMPT_END)
+        if not found:
+            self.module.fail_json(msg='Unable to read CLI Output in given Time for prompt')
+
+        self.prompt = last_line(text)
+
+    def out_channel(self):
+        """
+        Clear Buffer/Read from Shell
+        :return: Read lines
+        """
+        recv = self.reader.drain()
+        if self.reader.closed:
+            self.module.fail_json(msg='Chanel gives no data. Chanel is closed by Switch.')
+        return recv
+
+    def in_channel(self, cmd):
+        """
+        Sends cli command to Shell
+        :param cmd: the command itself
+        """
+        cmd = cmd.rstrip()
+        cmd += '\n'
+        cmd = cmd.encode('ascii', 'ignore')
+        self.shell_chanel.sendall(cmd)
+
+    def logout(self):
+        """
+        Logout from Switch
+        :return:
+        """
+        self.in_channel('end')
+        self.in_channel('exit')
+        self.shell_chanel.close()
+        self.ssh_client.close()
@@ -0,0 +1,160 @@
+# Aruba Firmware - Parser for the "show flash" output of ArubaOS-Switches
+# Used by the SSH CLI modules and by the aos_switch_filters filter plugin, so it must not import Ansible code
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+# Python imports
+import re
+
+# Regex for SWI versions like WC.16.05.0007, WC_16_05_0007 or the shorter WC.17.02 and WC.16
+SWI_VERSION = re.compile(r'(WC|YA|YC|KB|WB|K)[._]([0-9]{2})(?:[._]([0-9]{2})(?:[._]([0-9]{4}))?)?(?![0-9])')
+
+# Labels of the show flash lines, spaces removed and lower case
+FLASH_LABELS = {
+    'primaryimage': 'primary',
+    'secondaryimage': 'secondary',
+    'primarybootromversion': 'primary_boot',
+    'secondarybootromversion': 'secondary_boot',
+}
+
+
+class SwiVersion(object):
+
+    def __init__(self, platform, major, minor=None, build=None):
+        """
+        Ordered SWI firmware version, missing components count as 0
+        :param platform: platform prefix, e.g. WC
+        :param major: major release as int
+        :param minor: minor release as int or None
+        :param build: build number as int or None
+        """
+        self.platform = platform
+        self.parts = [part for part in (major, minor, build) if part is not None]
+        self.key = (major, minor or 0, build or 0)
+
+    @classmethod
+    def parse(cls, text):
+        """
+        Creates a version from the first version string found in the text
+        :param text: string like WC.16.05.0007, WC_16_05_0007, WC_16_05_0007.swi or WC.17.02
+        :return: SwiVersion object or None if no version was found
+        """
+        match = SWI_VERSION.search(text or '')
+        if not match:
+            return None
+        return cls(match.group(1), *[int(group) if group else None for group in match.groups()[1:]])
+
+    def __str__(self):
+        return ".".join([self.platform] + ["{:0{}d}".format(part, width) for part, width in zip(self.parts, (2, 2, 4))])
+
+    def underscore(self):
+        """
+        :return: version in the format of SWI file names, e.g. WC_16_05_0007
+        """
+        return str(self).replace(".", "_")
+
+    def __eq__(self, other):
+        return isinstance(other, SwiVersion) and (self.platform, self.key) == (other.platform, other.key)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+    def __le__(self, other):
+        return self.key <= other.key
+
+    def __gt__(self, other):
+        return self.key > other.key
+
+    def __ge__(self, other):
+        return self.key >= other.key
+
+    def __hash__(self):
+        return hash((self.platform, self.key))
+
+
+class FlashInventory(object):
+
+    def __init__(self, primary=None, secondary=None, primary_boot=None, secondary_boot=None,
+                 default_boot='primary'):
+        """
+        Firmware images of an ArubaOS-Switch
+        :param primary: SwiVersion of the primary image
+        :param secondary: SwiVersion of the secondary image
+        :param primary_boot: SwiVersion of the primary boot ROM
+        :param secondary_boot: SwiVersion of the secondary boot ROM
+        :param default_boot: image the switch boots from, primary or secondary
+        """
+        self.primary = primary
+        self.secondary = secondary
+        self.primary_boot = primary_boot
+        self.secondary_boot = secondary_boot
+        self.default_boot = default_boot
+
+    def image(self, selector):
+        """
+        :param selector: one of primary, secondary, primary_boot, secondary_boot
+        :return: SwiVersion or None
+        """
+        if selector not in FLASH_LABELS.values():
+            raise ValueError('No correct version selector entered. Choose one of the following:'
+                             ' primary,secondary,primary_boot,secondary_boot. You entered: {} .'.format(selector))
+        return getattr(self, selector)
+
+    def to_dict(self):
+        data = {'default_boot': self.default_boot}
+        for selector in FLASH_LABELS.values():
+            version = getattr(self, selector)
+            data[selector] = str(version) if version is not None else None
+        return data
+
+
+def parse_flash(text):
+    """
+    Parses the output of show flash, works with and without spaces in the output
+    :param text: show flash output
+    :return: FlashInventory object
+    """
+    inventory = FlashInventory()
+    found = False
+    for line in text.splitlines():
+        if ':' not in line:
+            continue
+        label, value = line.split(':', 1)
+        label = label.replace(' ', '').lower()
+        if label in FLASH_LABELS:
+            setattr(inventory, FLASH_LABELS[label], SwiVersion.parse(value))
+            found = True
+        elif label in ('defaultbootimage', 'defaultboot'):
+            if 'secondary' in value.lower():
+                inventory.default_boot = 'secondary'
+
+    # Fallback for unknown layouts, versions in the order primary, secondary, primary boot, secondary boot
+    if not found:
+        matches = [SwiVersion.parse(match.group(0)) for match in SWI_VERSION.finditer(text)]
+        for selector, version in zip(['primary', 'secondary', 'primary_boot', 'secondary_boot'], matches):
+            setattr(inventory, selector, version)
+    return inventory
+
+
+def compare_versions(current, to_be):
+    """
+    Compares two SWI versions
+    :param current: version string or SwiVersion
+    :param to_be: version string or SwiVersion
+    :return: -1 if current is lower, 0 if equal, 1 if current is higher
+    """
+    if not isinstance(current, SwiVersion):
+        current = SwiVersion.parse(current)
+    if not isinstance(to_be, SwiVersion):
+        to_be = SwiVersion.parse(to_be)
+    if current is None or to_be is None:
+        raise ValueError('Unable to compare SWI versions {} and {}'.format(current, to_be))
+    if current.platform != to_be.platform:
+        raise ValueError('SWI versions {} and {} are for different platforms'.format(current, to_be))
+    return (current > to_be) - (current < to_be)
@@ -0,0 +1,44 @@
+# Aruba Inventory CSV - Reader for the MAC,IP,Hostname[,Branch] CSV files
+# Used by inventory_creation_scripts/create_host_vars.py and the aruba_csv inventory plugin,
+# so it must not import Ansible code
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+# Python imports
+import csv
+import io
+
+
+def branch_name(value):
+    """
+    :param value: branch number or name
+    :return: branch name, e.g. branch1
+    """
+    value = str(value).strip()
+    return value if value.startswith("branch") else "branch" + value
+
+
+def read_rows(path, default_branch):
+    """
+    Yields the rows of the CSV one by one
+    Empty rows and rows starting with # are ignored
+    :param path: path of the CSV
+    :param default_branch: branch of rows without a branch column
+    :return: generator of mac, ip, hostname, branch tuples
+    """
+    with io.open(path, newline='') as infile:
+        for line_nr, row in enumerate(csv.reader(infile), 1):
+            if not row or not row[0].strip() or row[0].startswith('#'):
+                continue
+            if len(row) < 3:
+                raise ValueError('Line %s of "%s" needs MAC, IP and Hostname' % (line_nr, path))
+            if len(row) > 3 and row[3].strip():
+                branch = branch_name(row[3])
+            elif default_branch:
+                branch = default_branch
+            else:
+                raise ValueError('Line %s of "%s" has no branch and no branch was given' % (line_nr, path))
+            yield row[0].strip(), row[1].strip(), row[2].strip(), branch
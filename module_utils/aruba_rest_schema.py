@@ -0,0 +1,510 @@
+# Aruba REST Schema - Cache for the AOS-CX REST API swagger document (hpe-restapi.json)
+# Used by the ztp_filter filter plugin, so it must not import Ansible code
+#
+# The swagger document is stream parsed once per firmware version into a compact index:
+#   index.json  - document info and the offset/length of each path in paths.jsonl
+#   paths.jsonl - one line per path with the PUT-able properties, their type and read only flag
+# Filters only load index.json and read the lines of the paths they need.
+#
+# The index is keyed by the firmware version the switch reports (GET /rest/v1/firmware, passed in by the caller).
+# Without a version the switch is asked for the ETag or Last-Modified and Content-Length of the document with a HEAD
+# request. Switches with the same firmware share the index and a firmware upgrade changes the key, so the document is
+# only downloaded for firmware that was never seen.
+#
+# Several processes can fill the cache at the same time. An index is built in its own temporary directory and renamed
+# into place, a directory that is in place is never changed, and evicted directories are renamed away before they are
+# deleted. Open indexes keep their paths file open, so an eviction does not break a running reader.
+#
+# Can also be run as a script to build the index from a downloaded document:
+#   python module_utils/aruba_rest_schema.py hpe-restapi.json --version 10.04.0030 --host 10.1.1.1
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+# Python imports
+import argparse
+import codecs
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+
+from requests import get, head
+
+# Cache location and limits, can be changed by environment variables
+CACHE_DIR = os.environ.get('ARUBA_SCHEMA_CACHE_DIR',
+                           os.path.join(os.path.expanduser('~'), '.ansible', 'cache', 'aruba_rest_schema'))
+# Seconds a switch is assumed to keep its firmware version if it does not send a fingerprint of the document
+HOST_TTL = int(os.environ.get('ARUBA_SCHEMA_CACHE_TTL', 86400))
+# Number of firmware versions kept on disk
+MAX_VERSIONS = int(os.environ.get('ARUBA_SCHEMA_CACHE_MAX_VERSIONS', 10))
+
+# Index file names
+INDEX_FILE = 'index.json'
+PATHS_FILE = 'paths.jsonl'
+
+# Bytes read from the document at once
+CHUNK_SIZE = 65536
+WHITESPACE = ' \t\r\n'
+# Strings (group 1 is None while the closing quote is not read yet) and brackets
+TOKEN = re.compile(r'"(?:[^"\\]|\\.)*(")?|[{}\[\]]')
+SCALAR_END = re.compile(r'[,}\]]')
+
+
+class SchemaError(Exception):
+    pass
+
+
+def write_atomic(path, data):
+    """
+    Writes a file so that readers never see a partial file
+    :param path: destination path
+    :param data: string to write
+    """
+    handle, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(handle, 'w') as outfile:
+            outfile.write(data)
+        os.rename(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+class DigestReader(object):
+
+    def __init__(self, read):
+        """
+        File like wrapper that calculates the sha1 of everything read
+        :param read: function that takes a size and returns bytes
+        """
+        self.read_chunk = read
+        self.digest = hashlib.sha1()
+
+    def read(self, size):
+        data = self.read_chunk(size)
+        self.digest.update(data)
+        return data
+
+
+class JsonStream(object):
+
+    def __init__(self, infile, chunk_size=CHUNK_SIZE):
+        """
+        Reads JSON values one by one from a file like object without loading the whole document
+        :param infile: object with a read(size) method returning bytes
+        :param chunk_size: bytes read at once
+        """
+        self.infile = infile
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+
+    def fill(self):
+        """
+        Appends the next chunk to the buffer
+        """
+        data = self.infile.read(self.chunk_size)
+        if not data:
+            raise SchemaError('Unexpected end of the swagger document')
+        self.buffer += self.decoder.decode(data)
+
+    def skip(self, characters=WHITESPACE):
+        """
+        Skips the given characters
+        :param characters: characters to skip
+        :return: next character
+        """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in characters:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            self.buffer = ''
+            self.pos = 0
+            self.fill()
+
+    def value_end(self):
+        """
+        Finds the end of the value at the current position, reads until the value is complete
+        :return: index in the buffer after the value
+        """
+        if self.buffer[self.pos] not in '{["':
+            while True:
+                match = SCALAR_END.search(self.buffer, self.pos)
+                if match:
+                    return match.start()
+                self.fill()
+
+        depth = 0
+        index = self.pos
+        while True:
+            match = TOKEN.search(self.buffer, index)
+            if match is None:
+                self.fill()
+                continue
+            if match.group(0)[0] == '"':
+                if match.group(1) is None:
+                    # String continues in the next chunk
+                    index = match.start()
+                    self.fill()
+                    continue
+                index = match.end()
+                if depth == 0:
+                    return index
+            else:
+                index = match.end()
+                depth += 1 if match.group(0) in '{[' else -1
+                if depth == 0:
+                    return index
+
+    def value(self, decode=True):
+        """
+        Reads the value at the current position
+        :param decode: return the decoded value, otherwise the value is only skipped
+        :return: decoded value or None
+        """
+        self.skip()
+        # Drop everything before the value so the buffer only grows by the value itself
+        self.buffer = self.buffer[self.pos:]
+        self.pos = 0
+        end = self.value_end()
+        text = self.buffer[:end]
+        self.pos = end
+        return json.loads(text) if decode else None
+
+    def keys(self):
+        """
+        Yields the keys of the object at the current position, the caller has to read or skip each value
+        """
+        if self.skip() != '{':
+            raise SchemaError('Expected a JSON object in the swagger document')
+        self.pos += 1
+        while True:
+            if self.skip(WHITESPACE + ',') == '}':
+                self.pos += 1
+                return
+            key = self.value()
+            self.skip(WHITESPACE + ':')
+            yield key
+
+
+def path_entry(item):
+    """
+    Builds the index entry of one path
+    :param item: path object of the swagger document
+    :return: dict with put flag and properties of the PUT data body (name: {type, read_only})
+    """
+    if 'put' not in item:
+        return {'put': False, 'properties': {}}
+
+    properties = {}
+    for parameter in item['put'].get('parameters', []):
+        if parameter.get('name') != "data":
+            continue
+        for name, schema in parameter.get('schema', {}).get('properties', {}).items():
+            properties[name] = {'type': schema.get('type') or schema.get('$ref', '').split('/')[-1] or None,
+                                'read_only': bool(schema.get('readOnly', False))}
+    return {'put': True, 'properties': properties}
+
+
+def build_index(infile, index_dir):
+    """
+    Stream parses a swagger document into an index directory
+    :param infile: object with a read(size) method returning bytes
+    :param index_dir: existing directory for the index files
+    :return: info object of the document
+    """
+    stream = JsonStream(infile)
+    info = {}
+    offsets = {}
+    with open(os.path.join(index_dir, PATHS_FILE), 'wb') as outfile:
+        offset = 0
+        for key in stream.keys():
+            if key == 'info':
+                info = stream.value()
+            elif key == 'paths':
+                for path in stream.keys():
+                    line = (json.dumps(path_entry(stream.value()), separators=(',', ':')) + '\n').encode('utf-8')
+                    outfile.write(line)
+                    offsets[path] = [offset, len(line)]
+                    offset += len(line)
+                # Definitions and everything after the paths are not needed
+                break
+            else:
+                stream.value(decode=False)
+    write_atomic(os.path.join(index_dir, INDEX_FILE), json.dumps({'info': info, 'paths': offsets}))
+    return info
+
+
+class SchemaIndex(object):
+
+    def __init__(self, index_dir):
+        """
+        Index of one firmware version, path entries are read from disk when they are needed
+        :param index_dir: directory with the index files
+        """
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, INDEX_FILE)) as infile:
+            index = json.load(infile)
+        self.info = index['info']
+        self.offsets = index['paths']
+        self.entries = {}
+        # Stays readable if another process evicts the directory
+        self.paths_file = open(os.path.join(index_dir, PATHS_FILE), 'rb')
+
+    def entry(self, path):
+        """
+        :param path: Swagger URI of the resource
+        :return: index entry of the path or None if the path does not exist
+        """
+        if path not in self.offsets:
+            return None
+        if path not in self.entries:
+            offset, length = self.offsets[path]
+            self.paths_file.seek(offset)
+            self.entries[path] = json.loads(self.paths_file.read(length).decode('utf-8'))
+        return self.entries[path]
+
+
+class SchemaCache(object):
+
+    def __init__(self, cache_dir=CACHE_DIR, host_ttl=HOST_TTL, max_versions=MAX_VERSIONS):
+        """
+        In process memo and on disk cache of the API index, keyed by firmware version
+        :param cache_dir: directory for the cache files
+        :param host_ttl: seconds the firmware version of a switch without fingerprint is trusted without asking again
+        :param max_versions: number of firmware versions kept on disk, older ones get evicted
+        """
+        self.cache_dir = cache_dir
+        self.host_ttl = host_ttl
+        self.max_versions = max_versions
+        self.indexes = {}
+        self.hosts = None
+        self.fingerprints = None
+        # Ansible templates each task in its own worker process, the firmware does not change during one process
+        self.checked = {}
+
+    def version_dir(self, version):
+        return os.path.join(self.cache_dir, 'versions', hashlib.sha1(version.encode('utf-8')).hexdigest())
+
+    def load_hosts(self):
+        """
+        Loads the mapping of switch ip to firmware version
+        :return: dict of ip to [version, timestamp]
+        """
+        if self.hosts is None:
+            try:
+                with open(os.path.join(self.cache_dir, 'hosts.json')) as infile:
+                    self.hosts = json.load(infile)
+            except (IOError, OSError, ValueError):
+                self.hosts = {}
+        return self.hosts
+
+    def host_version(self, ip):
+        """
+        :param ip: ip of the switch
+        :return: cached firmware version of the switch or None if unknown or expired
+        """
+        entry = self.load_hosts().get(ip)
+        if entry and time.time() - entry[1] < self.host_ttl:
+            return entry[0]
+        return None
+
+    def remember_host(self, ip, version):
+        hosts = self.load_hosts()
+        hosts[ip] = [version, time.time()]
+        self.ensure_dirs()
+        write_atomic(os.path.join(self.cache_dir, 'hosts.json'), json.dumps(hosts))
+
+    def load_fingerprints(self):
+        """
+        Loads the mapping of document fingerprint to firmware version
+        :return: dict of fingerprint to version
+        """
+        if self.fingerprints is None:
+            try:
+                with open(os.path.join(self.cache_dir, 'fingerprints.json')) as infile:
+                    self.fingerprints = json.load(infile)
+            except (IOError, OSError, ValueError):
+                self.fingerprints = {}
+        return self.fingerprints
+
+    def remember_fingerprint(self, fingerprint, version):
+        fingerprints = self.load_fingerprints()
+        fingerprints[fingerprint] = version
+        self.ensure_dirs()
+        write_atomic(os.path.join(self.cache_dir, 'fingerprints.json'), json.dumps(fingerprints))
+
+    def fingerprint(self, ip):
+        """
+        Asks the switch for the validators of the swagger document without downloading it
+        :param ip: ip of the switch
+        :return: fingerprint string or None if the switch sends no validators
+        """
+        response = head("https://{}/api/hpe-restapi.json".format(ip), verify=False)
+        if response.status_code != 200:
+            return None
+        validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+        if not validator:
+            return None
+        return "{}-{}".format(validator, response.headers.get('Content-Length', ''))
+
+    def ensure_dirs(self):
+        if not os.path.isdir(os.path.join(self.cache_dir, 'versions')):
+            os.makedirs(os.path.join(self.cache_dir, 'versions'))
+
+    def load(self, version):
+        """
+        Loads the index of a firmware version from memory or disk
+        :param version: firmware version
+        :return: SchemaIndex object or None if not cached
+        """
+        if version in self.indexes:
+            return self.indexes[version]
+        index_dir = self.version_dir(version)
+        try:
+            self.indexes[version] = SchemaIndex(index_dir)
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+        # Mark as recently used for the eviction
+        try:
+            os.utime(index_dir, None)
+        except OSError:
+            # Evicted by another process in the meantime, the open index is still complete
+            pass
+        return self.indexes[version]
+
+    def store(self, infile, version=None):
+        """
+        Builds the index of a swagger document and evicts the least recently used versions
+        :param infile: object with a read(size) method returning bytes
+        :param version: firmware version, if not given the document version plus its digest is used
+        :return: tuple of firmware version and SchemaIndex object
+        """
+        self.ensure_dirs()
+        versions_dir = os.path.join(self.cache_dir, 'versions')
+        reader = DigestReader(infile.read)
+        tmp_dir = tempfile.mkdtemp(dir=versions_dir, prefix='.tmp-')
+        try:
+            info = build_index(reader, tmp_dir)
+            # Documents of different releases never share a key
+            version = version or "{}-{}".format(info.get('version', 'unknown'), reader.digest.hexdigest()[:12])
+            index_dir = self.version_dir(version)
+            # Opened before the rename, stays usable whatever other processes do with the directory
+            index = SchemaIndex(tmp_dir)
+            index.index_dir = index_dir
+            try:
+                os.rename(tmp_dir, index_dir)
+            except OSError:
+                # Another process stored the same version first, only an unreadable directory is replaced
+                try:
+                    SchemaIndex(index_dir)
+                except (IOError, OSError, ValueError, KeyError):
+                    self.remove(index_dir)
+                    os.rename(tmp_dir, index_dir)
+        finally:
+            if os.path.isdir(tmp_dir):
+                shutil.rmtree(tmp_dir)
+        self.indexes[version] = index
+
+        dirs = []
+        for name in os.listdir(versions_dir):
+            if not name.startswith('.') and name != os.path.basename(index_dir):
+                try:
+                    dirs.append((os.path.getmtime(os.path.join(versions_dir, name)), name))
+                except OSError:
+                    pass
+        # The stored version counts as the most recently used one
+        for mtime, name in sorted(dirs)[:max(0, len(dirs) + 1 - self.max_versions)]:
+            self.remove(os.path.join(versions_dir, name))
+        return version, index
+
+    def remove(self, index_dir):
+        """
+        Deletes an index directory, it is renamed first so no process sees a partly deleted index
+        :param index_dir: directory of a firmware version
+        """
+        trash = os.path.join(os.path.dirname(index_dir), '.old-' + uuid.uuid4().hex)
+        try:
+            os.rename(index_dir, trash)
+        except OSError:
+            # Already removed by another process
+            return
+        shutil.rmtree(trash, ignore_errors=True)
+
+    def download(self, ip, version=None):
+        """
+        Downloads and indexes the swagger document of the switch, the document is parsed while it is received
+        :param ip: ip of the switch
+        :param version: firmware version of the switch if known
+        :return: tuple of firmware version and SchemaIndex object
+        """
+        response = get("https://{}/api/hpe-restapi.json".format(ip), verify=False, stream=True)
+        try:
+            if response.status_code != 200:
+                raise SchemaError('Get API Object Request Failed with Status Code {} .'.format(response.status_code))
+            # Let urllib3 undo the transfer encoding while reading
+            response.raw.decode_content = True
+            return self.store(response.raw, version)
+        finally:
+            response.close()
+
+    def get_index(self, ip, version=None):
+        """
+        Returns the API index of a switch, downloads the swagger document only if the version is not cached
+        :param ip: ip of the switch
+        :param version: firmware version of the switch if known, otherwise it is looked up by the fingerprint of the
+                        document or, if the switch sends none, the last known version of the ip is used
+        :return: SchemaIndex object
+        """
+        fingerprint = None
+        cached = version or self.checked.get(ip)
+        if not cached:
+            fingerprint = self.fingerprint(ip)
+            if fingerprint:
+                cached = self.load_fingerprints().get(fingerprint)
+            else:
+                cached = self.host_version(ip)
+        if cached:
+            index = self.load(cached)
+            if index is not None:
+                if not version:
+                    self.checked[ip] = cached
+                return index
+
+        version, index = self.download(ip, version)
+        if fingerprint:
+            self.remember_fingerprint(fingerprint, version)
+        else:
+            self.remember_host(ip, version)
+        self.checked[ip] = version
+        return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Builds the schema cache index from a downloaded hpe-restapi.json')
+    parser.add_argument('spec', help='path to hpe-restapi.json')
+    parser.add_argument('--version', default=None, help='firmware version of the document')
+    parser.add_argument('--host', action='append', default=[], help='ip of a switch running this version')
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help='cache directory, default {}'.format(CACHE_DIR))
+    args = parser.parse_args()
+
+    cache = SchemaCache(args.cache_dir)
+    with open(args.spec, 'rb') as infile:
+        version, index = cache.store(infile, args.version)
+    for host in args.host:
+        cache.remember_host(host, version)
+    print('Indexed {} paths of version {} in {}'.format(len(index.offsets), version, index.index_dir))
+
+
+if __name__ == '__main__':
+    main()
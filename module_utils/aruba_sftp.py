@@ -0,0 +1,160 @@
+# Aruba SFTP Utils - Firmware upload engine for ArubaOS-Switch SFTP transfers
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+# Python imports
+import hashlib
+import os
+import time
+
+import paramiko
+
+# Default size of each SFTP write request
+CHUNK_SIZE = 32768
+
+
+def file_digest(path, algorithm='sha256', chunk_size=1048576, length=None):
+    """
+    Calculates the digest of a local file
+    :param path: path to the file
+    :param algorithm: hashlib algorithm name
+    :param chunk_size: bytes read at once
+    :param length: only digest the first length bytes, None for the whole file
+    :return: hex digest as string
+    """
+    with open(path, 'rb') as local_file:
+        return stream_digest(local_file, algorithm, chunk_size, length)
+
+
+def stream_digest(stream, algorithm='sha256', chunk_size=1048576, length=None):
+    """
+    Calculates the digest of a readable file object from its current position
+    :param stream: file object opened in binary mode
+    :param algorithm: hashlib algorithm name
+    :param chunk_size: bytes read at once
+    :param length: only digest the next length bytes, None until the end of the stream
+    :return: hex digest as string
+    """
+    digest = hashlib.new(algorithm)
+    remaining = length
+    while remaining is None or remaining > 0:
+        chunk = stream.read(chunk_size if remaining is None else min(chunk_size, remaining))
+        if not chunk:
+            break
+        digest.update(chunk)
+        if remaining is not None:
+            remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+def remote_size(transport, remote_path):
+    """
+    Returns the size of a file on the switch
+    :param transport: authenticated paramiko Transport
+    :param remote_path: path on the switch
+    :return: size in bytes, None if the switch does not allow stat on the path
+    """
+    sftp = paramiko.SFTPClient.from_transport(transport)
+    try:
+        return sftp.stat(remote_path).st_size
+    except IOError:
+        return None
+    finally:
+        sftp.close()
+
+
+def remote_digest(transport, remote_path, length=None, chunk_size=CHUNK_SIZE):
+    """
+    Calculates the sha256 of a file on the switch by reading it back over SFTP
+    :param transport: authenticated paramiko Transport
+    :param remote_path: path on the switch
+    :param length: only digest the first length bytes, None for the whole file
+    :param chunk_size: bytes per SFTP read request
+    :return: hex digest as string, None if the switch does not allow reading the file
+    """
+    sftp = paramiko.SFTPClient.from_transport(transport)
+    try:
+        with sftp.open(remote_path, 'rb', bufsize=chunk_size) as remote_file:
+            # Read ahead requests the whole range at once instead of waiting for each read
+            remote_file.prefetch(length)
+            return stream_digest(remote_file, chunk_size=chunk_size, length=length)
+    except IOError:
+        return None
+    finally:
+        sftp.close()
+
+
+def remote_matches(transport, local_path, remote_path, length=None):
+    """
+    Compares the sha256 of the first bytes of a file on the switch with the same bytes of the local file
+    :param transport: authenticated paramiko Transport
+    :param local_path: path of the local file
+    :param remote_path: path on the switch
+    :param length: number of compared bytes from the start, None for the whole file
+    :return: True if the digests are equal, False if they differ or the switch does not allow reading the file
+    """
+    received = remote_digest(transport, remote_path, length)
+    return received is not None and received == file_digest(local_path, length=length)
+
+
+def upload_file(transport, local_path, remote_path, chunk_size=CHUNK_SIZE, window_size=None, offset=0,
+                progress=None, digest=True):
+    """
+    Uploads a file with pipelined SFTP writes, optionally continuing at a byte offset
+    :param transport: authenticated paramiko Transport, SFTP is opened as additional channel on it
+    :param local_path: path of the local file
+    :param remote_path: path on the switch
+    :param chunk_size: bytes per SFTP write request
+    :param window_size: SSH channel window size in bytes, None for the paramiko default
+    :param offset: byte offset to resume at, 0 uploads the whole file
+    :param progress: function(bytes_done, bytes_total) called after each chunk
+    :param digest: calculate the sha256 of the local file while reading it
+    :return: dict with transfer statistics
+    """
+    size = os.path.getsize(local_path)
+    sha256 = hashlib.sha256() if digest else None
+    start = time.time()
+
+    sftp = paramiko.SFTPClient.from_transport(transport, window_size=window_size)
+    try:
+        with open(local_path, 'rb') as local_file:
+            # Digest covers the part which got uploaded before
+            if offset:
+                remaining = offset
+                while remaining:
+                    chunk = local_file.read(min(chunk_size, remaining))
+                    if sha256 is not None:
+                        sha256.update(chunk)
+                    remaining -= len(chunk)
+                remote_file = sftp.open(remote_path, 'r+b', bufsize=chunk_size)
+                remote_file.seek(offset)
+            else:
+                remote_file = sftp.open(remote_path, 'wb', bufsize=chunk_size)
+            try:
+                # Do not wait for the status of each write, errors get raised at close
+                remote_file.set_pipelined(True)
+                done = offset
+                for chunk in iter(lambda: local_file.read(chunk_size), b''):
+                    remote_file.write(chunk)
+                    if sha256 is not None:
+                        sha256.update(chunk)
+                    done += len(chunk)
+                    if progress is not None:
+                        progress(done, size)
+            finally:
+                remote_file.close()
+    finally:
+        sftp.close()
+
+    seconds = time.time() - start
+    return {
+        'size': size,
+        'offset': offset,
+        'bytes_sent': size - offset,
+        'seconds': round(seconds, 3),
+        'bytes_per_second': int((size - offset) / seconds) if seconds else 0,
+        'sha256': sha256.hexdigest() if sha256 is not None else None,
+    }
@@ -0,0 +1,285 @@
+# Aruba Show Parsers - Parsers for common show commands of ArubaOS-Switches and ArubaOS-CX devices
+# Used by the SSH CLI modules and by the common_filters filter plugin, so it must not import Ansible code
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+# Python imports
+import re
+
+try:
+    # Packaged with a module
+    from ansible.module_utils.aruba_firmware import SWI_VERSION, parse_flash
+except ImportError:
+    # Loaded by a filter plugin from the module_utils directory
+    from aruba_firmware import SWI_VERSION, parse_flash
+
+# Separator line below a table header, e.g. "------- ---- + -----" or one long dash line
+SEPARATOR = re.compile(r'^\s*-[-+ ]*$')
+# Label : value lines
+KEY_VALUE = re.compile(r'^\s*([^:]+?)\s*:\s*(.*?)\s*$')
+# Non word characters of labels
+LABEL_CHARS = re.compile(r'[^a-z0-9]+')
+TRUE_VALUES = ('yes', 'true', 'up', 'enabled', 'on')
+
+
+class ParseError(Exception):
+    pass
+
+
+def to_int(value):
+    return int(value) if value.isdigit() else None
+
+
+def to_bool(value):
+    return value.lower() in TRUE_VALUES
+
+
+CONVERTERS = {'str': lambda value: value, 'int': to_int, 'bool': to_bool}
+
+
+def label_key(label):
+    """
+    :return: label as key, e.g. "Build Date" -> build_date
+    """
+    return LABEL_CHARS.sub('_', label.lower()).strip('_')
+
+
+class Table(object):
+
+    def __init__(self, header, columns):
+        """
+        Fixed width table below a header line. Column bounds are taken from the dash groups of the separator line,
+        or from the words of the header line if the separator is one long dash line
+        :param header: regex of the first header line
+        :param columns: list of column name and type ('str', 'int' or 'bool') tuples
+        """
+        self.header = re.compile(header)
+        self.columns = [(name, CONVERTERS[kind]) for name, kind in columns]
+
+    def bounds(self, header_line, separator_line):
+        """
+        :return: list of start positions of the columns
+        """
+        starts = [match.start() for match in re.finditer(r'-+', separator_line)]
+        if len(starts) < len(self.columns):
+            starts = [match.start() for match in re.finditer(r'\S+', header_line)]
+        if len(starts) != len(self.columns):
+            raise ParseError('Table header "%s" does not have %s columns' % (header_line.strip(), len(self.columns)))
+        return starts
+
+    def parse(self, text):
+        """
+        :param text: command output
+        :return: list of dicts, one per row
+        """
+        lines = text.splitlines()
+        for index, line in enumerate(lines):
+            if self.header.search(line):
+                break
+        else:
+            raise ParseError('Table header %s not found' % self.header.pattern)
+
+        # Header can span several lines, rows start after the separator below it
+        position = index + 1
+        while position < len(lines) and not SEPARATOR.match(lines[position]):
+            position += 1
+        if position == len(lines):
+            raise ParseError('Separator below table header not found')
+        starts = self.bounds(line, lines[position])
+        ends = starts[1:] + [None]
+
+        rows = []
+        for row in lines[position + 1:]:
+            if not row.strip():
+                if rows:
+                    break
+                continue
+            if SEPARATOR.match(row):
+                continue
+            entry = {}
+            for (name, convert), start, end in zip(self.columns, starts, ends):
+                entry[name] = convert(row[start:end].strip(' |'))
+            rows.append(entry)
+        return rows
+
+
+class KeyValues(object):
+
+    def __init__(self, keys=None):
+        """
+        Label : value lines
+        :param keys: dict of label key to result key and type, None keeps every label with its label key
+        """
+        self.keys = keys
+
+    def parse(self, text):
+        """
+        :param text: command output
+        :return: dict
+        """
+        result = {}
+        for line in text.splitlines():
+            match = KEY_VALUE.match(line)
+            if not match:
+                continue
+            key = label_key(match.group(1))
+            if self.keys is None:
+                result.setdefault(key, match.group(2))
+            elif key in self.keys and self.keys[key][0] not in result:
+                name, kind = self.keys[key]
+                result[name] = CONVERTERS[kind](match.group(2))
+        return result
+
+
+class Function(object):
+
+    def __init__(self, function):
+        self.function = function
+
+    def parse(self, text):
+        return self.function(text)
+
+
+def parse_switch_flash(text):
+    return parse_flash(text).to_dict()
+
+
+def parse_switch_version(text):
+    """
+    Parses show version of an ArubaOS-Switch
+    :return: dict with version, image_stamp, build and boot_image
+    """
+    result = {'version': None, 'image_stamp': None, 'build': None, 'boot_image': None}
+    lines = [line.strip() for line in text.splitlines()]
+    for index, line in enumerate(lines):
+        if line.lower().startswith('image stamp'):
+            result['image_stamp'] = line.split(':', 1)[1].strip()
+            # Date, version and build follow on the next lines
+            for following in lines[index + 1:index + 4]:
+                if SWI_VERSION.search(following):
+                    result['version'] = SWI_VERSION.search(following).group(0)
+                elif following.isdigit():
+                    result['build'] = int(following)
+        elif line.lower().startswith('boot image'):
+            result['boot_image'] = line.split(':', 1)[1].strip().lower()
+    if result['version'] is None and SWI_VERSION.search(text):
+        result['version'] = SWI_VERSION.search(text).group(0)
+    return result
+
+
+def parse_cx_images(text):
+    """
+    Parses show images of an ArubaOS-CX device
+    :return: dict with primary and secondary (version, size, date, sha_256) and default_image
+    """
+    result = {'primary': {}, 'secondary': {}, 'default_image': None}
+    image = None
+    for line in text.splitlines():
+        lower = line.lower()
+        if 'primary image' in lower:
+            image = 'primary'
+        elif 'secondary image' in lower:
+            image = 'secondary'
+        match = KEY_VALUE.match(line)
+        if not match:
+            continue
+        key = label_key(match.group(1))
+        if key == 'default_image':
+            result['default_image'] = match.group(2).lower()
+        elif image is not None:
+            result[image][key] = match.group(2)
+    return result
+
+
+# Parsers per platform and command, compiled once at import
+PARSERS = {
+    'switch': [
+        ('show flash', Function(parse_switch_flash)),
+        ('show version', Function(parse_switch_version)),
+        ('show lldp info remote-device', Table(r'LocalPort\s*\|\s*ChassisId', [
+            ('local_port', 'str'), ('chassis_id', 'str'), ('port_id', 'str'), ('port_descr', 'str'),
+            ('sys_name', 'str')])),
+        ('show interfaces brief', Table(r'^\s*Port\s+Type\s*\|', [
+            ('port', 'str'), ('type', 'str'), ('intrusion_alert', 'bool'), ('enabled', 'bool'), ('status', 'str'),
+            ('mode', 'str'), ('mdi_mode', 'str'), ('flow_ctrl', 'str'), ('bcast_limit', 'int')])),
+        ('show vlans', Table(r'^\s*VLAN ID\s+Name', [
+            ('vlan_id', 'int'), ('name', 'str'), ('status', 'str'), ('voice', 'bool'), ('jumbo', 'bool')])),
+    ],
+    'cx': [
+        ('show images', Function(parse_cx_images)),
+        ('show version', KeyValues({
+            'version': ('version', 'str'), 'build_date': ('build_date', 'str'), 'build_id': ('build_id', 'str'),
+            'build_sha': ('build_sha', 'str'), 'active_image': ('active_image', 'str'),
+            'service_os_version': ('service_os_version', 'str'), 'bios_version': ('bios_version', 'str')})),
+        ('show lldp neighbor-info', Table(r'^\s*LOCAL-PORT\s+CHASSIS-ID', [
+            ('local_port', 'str'), ('chassis_id', 'str'), ('port_id', 'str'), ('port_descr', 'str'),
+            ('ttl', 'int'), ('sys_name', 'str')])),
+        ('show interface brief', Table(r'^\s*Port\s+Native\s+Mode', [
+            ('port', 'str'), ('native_vlan', 'int'), ('mode', 'str'), ('type', 'str'), ('enabled', 'bool'),
+            ('status', 'str'), ('reason', 'str'), ('speed', 'str'), ('description', 'str')])),
+        ('show vlan', Table(r'^\s*VLAN\s+Name\s+Status', [
+            ('vlan_id', 'int'), ('name', 'str'), ('status', 'str'), ('reason', 'str'), ('type', 'str'),
+            ('interfaces', 'str')])),
+    ],
+}
+
+
+def command_matches(template, command):
+    """
+    Compares a command with a template, words can be abbreviated like on the CLI (sh int br)
+    :param template: full command, e.g. show interfaces brief
+    :param command: entered command
+    :return: True if the command is the template command
+    """
+    words = command.lower().split()
+    template_words = template.split()
+    if len(words) != len(template_words):
+        return False
+    return all(template_word.startswith(word) and (len(word) >= 2 or word == template_word)
+               for word, template_word in zip(words, template_words))
+
+
+def find_parser(command, platform='switch'):
+    """
+    :param command: show command
+    :param platform: 'switch' for ArubaOS-Switch or 'cx' for ArubaOS-CX
+    :return: parser object or None if there is no parser for the command
+    """
+    if platform not in PARSERS:
+        raise ParseError('Unknown platform %s, use switch or cx' % platform)
+    for template, parser in PARSERS[platform]:
+        if command_matches(template, command):
+            return parser
+    return None
+
+
+def parse_output(command, text, platform='switch'):
+    """
+    Parses the output of a show command into typed data
+    :param command: show command that created the output
+    :param text: output of the command
+    :param platform: 'switch' for ArubaOS-Switch or 'cx' for ArubaOS-CX
+    :return: dict or list of dicts
+    """
+    parser = find_parser(command, platform)
+    if parser is None:
+        raise ParseError('No parser for "%s" on %s' % (command, platform))
+    return parser.parse(text)
+
+
+def parse_outputs(commands, outputs, platform='switch'):
+    """
+    Parses the outputs of a command list, commands without parser get None
+    :param commands: list of commands
+    :param outputs: list of outputs, one per command
+    :param platform: 'switch' for ArubaOS-Switch or 'cx' for ArubaOS-CX
+    :return: list of parsed outputs
+    """
+    parsed = []
+    for command, text in zip(commands, outputs):
+        parser = find_parser(command, platform)
+        parsed.append(parser.parse(text) if parser is not None else None)
+    return parsed
@@ -0,0 +1,256 @@
+# Aruba SSH Utils - Shared channel handling for the ArubaOS-Switch and ArubaOS-CX SSH CLI modules
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+# Python imports
+import codecs
+import gzip
+import hashlib
+import os
+import re
+import select
+import stat
+import tempfile
+import time
+
+# Regex for ANSI escape chars
+ANSI_ESCAPE = re.compile(r'\x1B\[[0-?]*[ -/]*[@-~]')
+
+# Any prompt at the end of the received text
+PROMPT_END = re.compile(r'#\s*$')
+
+# Upper bound for a single read, same as the former 45 * 2s polling loops
+READ_TIMEOUT = 90
+
+# Amount of received text that is kept for matching the prompt regex
+TAIL_SIZE = 4096
+
+# Longest escape sequence that is held back when a chunk ends inside of it
+MAX_ESCAPE = 32
+
+# Characters that are replaced in output file names
+UNSAFE_NAME = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+class SessionError(Exception):
+    pass
+
+
+class SessionModule(object):
+
+    def __init__(self, params):
+        """
+        Stand-in for the AnsibleModule when sessions are used outside of a single module run
+        :param params: dict with the same keys as the module params
+        """
+        self.params = params
+        self.messages = []
+
+    def fail_json(self, **kwargs):
+        """
+        Raises instead of exiting so the caller can handle the error of this session
+        """
+        raise SessionError(kwargs.get('msg', 'Unknown error in SSH session'))
+
+    def log(self, msg):
+        self.messages.append(msg)
+
+
+class ChannelReader(object):
+
+    def __init__(self, channel, timeout=READ_TIMEOUT):
+        """
+        Event based reader for a paramiko shell channel
+        :param channel: paramiko channel returned by invoke_shell
+        :param timeout: upper bound in seconds for each read_until call
+        """
+        self.channel = channel
+        self.timeout = timeout
+        self.closed = False
+        # Multi byte characters can be split between two reads
+        self.decoder = codecs.getincrementaldecoder('utf-8')('ignore')
+
+    def recv(self, deadline):
+        """
+        Blocks until the channel has data, is closed or the deadline has passed
+        :param deadline: absolute time (time.time()) to stop waiting at
+        :return: received text, empty string if nothing was received
+        """
+        if not self.channel.recv_ready():
+            if self.channel.closed or self.channel.eof_received or self.channel.exit_status_ready():
+                # Switch hung up, nothing more will arrive
+                self.closed = True
+                return ''
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return ''
+            # The channel also becomes readable when the switch closes it
+            readable = select.select([self.channel], [], [], remaining)[0]
+            if not readable:
+                return ''
+        data = self.channel.recv(65535)
+        if not data:
+            # Empty read means the switch closed the channel
+            self.closed = True
+            return ''
+        return self.decoder.decode(data)
+
+    def expect(self, patterns, timeout=None, strip_ansi=False, sink=None):
+        """
+        Reads from the channel until one of the patterns matches the received text
+        :param patterns: list of compiled regex
+        :param timeout: seconds to wait at most, defaults to the reader timeout
+        :param strip_ansi: remove ANSI escape chars and carriage returns before matching
+        :param sink: object with a write method that gets the text as it arrives, the text is then not kept
+        :return: tuple of the index of the matching pattern (None on timeout or closed channel) and the received text
+        """
+        deadline = time.time() + (self.timeout if timeout is None else timeout)
+        stripper = AnsiStripper() if strip_ansi else None
+        chunks = []
+        tail = ''
+        while not self.closed and time.time() < deadline:
+            curr_text = self.recv(deadline)
+            if not curr_text:
+                continue
+            if stripper is not None:
+                curr_text = stripper.feed(curr_text)
+            if sink is not None:
+                sink.write(curr_text)
+            else:
+                chunks.append(curr_text)
+            tail = (tail + curr_text)[-TAIL_SIZE:]
+            for index, pattern in enumerate(patterns):
+                if pattern.search(tail):
+                    return index, ''.join(chunks)
+        return None, ''.join(chunks)
+
+    def read_until(self, pattern, timeout=None, strip_ansi=False, sink=None):
+        """
+        Reads from the channel until the pattern matches the end of the received text
+        :param pattern: compiled regex, should be anchored to the end of the text
+        :param timeout: seconds to wait at most, defaults to the reader timeout
+        :param strip_ansi: remove ANSI escape chars and carriage returns before matching
+        :param sink: object with a write method that gets the text as it arrives, the text is then not kept
+        :return: tuple of the received text and True if the pattern matched
+        """
+        index, text = self.expect([pattern], timeout, strip_ansi, sink)
+        return text, index is not None
+
+    def drain(self):
+        """
+        Clear Buffer - reads everything that is available without blocking
+        :return: Read text
+        """
+        chunks = []
+        while self.channel.recv_ready():
+            data = self.channel.recv(65535)
+            if not data:
+                self.closed = True
+                break
+            chunks.append(self.decoder.decode(data))
+        return ''.join(chunks)
+
+
+class AnsiStripper(object):
+
+    def __init__(self):
+        """
+        Removes ANSI escape chars and carriage returns from text that arrives in chunks
+        """
+        self.pending = ''
+
+    def feed(self, text):
+        """
+        :param text: received chunk
+        :return: chunk without escape chars, an escape sequence cut at the end of the chunk is held back
+        """
+        text = self.pending + text
+        self.pending = ''
+        start = text.rfind('\x1B')
+        if start != -1 and len(text) - start < MAX_ESCAPE and not ANSI_ESCAPE.match(text, start):
+            self.pending = text[start:]
+            text = text[:start]
+        return ANSI_ESCAPE.sub('', text).replace('\r', '')
+
+
+class OutputFile(object):
+
+    def __init__(self, path, compress=False, strip_ansi=False):
+        """
+        Writes command output to a file as it arrives. The first line (the echoed command) and the last incomplete
+        line (the prompt) are left out. The file is written to a temporary name and renamed on close
+        :param path: path of the output file
+        :param compress: write the file gzip compressed
+        :param strip_ansi: remove ANSI escape chars, for readers that do not strip them
+        """
+        self.path = path
+        self.stripper = AnsiStripper() if strip_ansi else None
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        handle, self.tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        self.raw = os.fdopen(handle, 'wb')
+        self.outfile = gzip.GzipFile(fileobj=self.raw, mode='wb') if compress else self.raw
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.pending = ''
+        self.first_line = True
+
+    def write(self, text):
+        if self.stripper is not None:
+            text = self.stripper.feed(text)
+        lines = (self.pending + text.replace('\r', '')).split('\n')
+        self.pending = lines.pop()
+        if self.first_line and lines:
+            lines.pop(0)
+            self.first_line = False
+        if lines:
+            data = ('\n'.join(lines) + '\n').encode('utf-8')
+            self.digest.update(data)
+            self.size += len(data)
+            self.outfile.write(data)
+
+    def close(self):
+        """
+        :return: dict with path, size and sha256 of the uncompressed output
+        """
+        if self.outfile is not self.raw:
+            self.outfile.close()
+        self.raw.close()
+        # mkstemp creates the file with 0600, an existing file keeps its mode and new files get 0644
+        try:
+            mode = stat.S_IMODE(os.stat(self.path).st_mode)
+        except OSError:
+            mode = 0o644
+        os.chmod(self.tmp_path, mode)
+        os.rename(self.tmp_path, self.path)
+        return {'path': self.path, 'size': self.size, 'sha256': self.digest.hexdigest()}
+
+    def abort(self):
+        if self.outfile is not self.raw:
+            self.outfile.close()
+        self.raw.close()
+        os.unlink(self.tmp_path)
+
+
+def output_path(output_dir, ip, index, command, compress=False):
+    """
+    :return: path of the output file of a command, e.g. <output_dir>/10.1.1.1/01_show_running-config.txt
+    """
+    name = '%02d_%s.txt' % (index + 1, UNSAFE_NAME.sub('_', command.strip())[:64])
+    return os.path.join(output_dir, ip, name + ('.gz' if compress else ''))
+
+
+def last_line(text):
+    """
+    Returns the last non empty line of a text, used to detect the CLI prompt
+    :param text: received text
+    :return: string of the last line without spaces
+    """
+    lines = [line for line in text.replace('\r', '').split('\n') if line.strip()]
+    if not lines:
+        return ''
+    return lines[-1].replace(' ', '')
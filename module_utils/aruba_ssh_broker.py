@@ -0,0 +1,261 @@
+# Aruba SSH Broker - Keeps authenticated SSH CLI sessions alive between module calls
+#
+# The first module call for a device forks a small background process that owns the SSH session and
+# listens on a unix socket. Following module calls for the same ip/port/user send their commands to
+# that socket instead of logging in again. The broker logs out after being idle for the configured time.
+#
+# The socket name is derived from ip, port, user and key file only. Access is restricted by the file permissions:
+# the socket directory and the socket are only accessible by the user that runs Ansible, and the broker only
+# answers connections of that user. The broker keeps a salted hash of the password and its idle timeout, a call
+# with another password or timeout replaces the broker, so a changed password is never answered by the old session.
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+# Python imports
+import errno
+import hashlib
+import hmac
+import json
+import os
+import re
+import select
+import socket
+import stat
+import struct
+import time
+import uuid
+
+from ansible.module_utils.aruba_ssh import SessionModule
+
+# Directory for the broker sockets, only accessible by the current user
+BROKER_DIR = os.path.join(os.path.expanduser('~'), '.ansible', 'aruba_ssh_broker')
+
+# Seconds to wait for a new broker to listen on its socket
+SPAWN_TIMEOUT = 10
+# Seconds to wait for the answer of a broker, can be changed by an environment variable
+REQUEST_TIMEOUT = int(os.environ.get('ARUBA_SSH_BROKER_TIMEOUT', 600))
+
+
+class BrokerError(Exception):
+    pass
+
+
+def socket_path(params):
+    """
+    Builds the socket path for a device, the password is not part of the name
+    :param params: module params with ip, port, user and key_filename
+    :return: path of the unix socket
+    """
+    key = u"{0}:{1}:{2}:{3}".format(params['ip'], params['port'], params['user'], params.get('key_filename'))
+    return os.path.join(BROKER_DIR, hashlib.sha256(key.encode('utf-8')).hexdigest()[:32] + '.sock')
+
+
+def password_hash(salt, password):
+    """
+    :param salt: random bytes of the broker
+    :param password: password of the module call
+    :return: salted hash of the password
+    """
+    return hashlib.pbkdf2_hmac('sha256', (password or u'').encode('utf-8'), salt, 10000)
+
+
+def resync(session):
+    """
+    Brings a reused session back to the manager context with an empty buffer
+    :param session: SwitchSSHCLI or CliUser object
+    """
+    marker = 'sync-' + uuid.uuid4().hex[:12]
+    session.in_channel('end')
+    # Unknown command, the switch echos it, prints an error and returns to the prompt
+    session.in_channel(marker)
+    text, found = session.reader.read_until(re.compile(re.escape(marker) + r'[\s\S]*#\s*$'), strip_ansi=True)
+    if not found:
+        raise BrokerError('Unable to resync reused SSH session')
+
+
+def is_alive(session):
+    """
+    Checks if the SSH session of the broker can still be used
+    :param session: SwitchSSHCLI or CliUser object
+    :return: True/False
+    """
+    transport = session.ssh_client.get_transport()
+    return transport is not None and transport.is_active() and not session.shell_chanel.closed \
+        and not session.reader.closed
+
+
+def ensure_broker_dir():
+    """
+    Creates the socket directory and makes sure only the current user can access it
+    """
+    if not os.path.isdir(BROKER_DIR):
+        os.makedirs(BROKER_DIR, 0o700)
+    info = os.stat(BROKER_DIR)
+    if info.st_uid != os.getuid():
+        raise BrokerError('SSH session broker directory %s is owned by another user' % BROKER_DIR)
+    if stat.S_IMODE(info.st_mode) & 0o077:
+        # makedirs applies the umask, an existing directory might have been created with other permissions
+        os.chmod(BROKER_DIR, 0o700)
+
+
+def peer_uid(conn):
+    """
+    :param conn: accepted unix socket
+    :return: uid of the connected process or None if the platform does not tell
+    """
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return None
+    credentials = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    return struct.unpack('3i', credentials)[1]
+
+
+def send_json(conn, payload):
+    conn.sendall(json.dumps(payload).encode('utf-8') + b'\n')
+
+
+def recv_json(conn):
+    data = b''
+    while not data.endswith(b'\n'):
+        chunk = conn.recv(65535)
+        if not chunk:
+            raise BrokerError('SSH session broker closed the connection')
+        data += chunk
+    return json.loads(data.decode('utf-8'))
+
+
+def request(params, payload, session_factory, handler, idle_timeout):
+    """
+    Runs the payload on the broker of the device, starts the broker if none is running
+    :param params: module params
+    :param payload: dict that gets passed to the handler
+    :param session_factory: class that logs in, called with a SessionModule
+    :param handler: function(session, payload) which returns the result dict
+    :param idle_timeout: seconds the broker keeps the session without requests
+    :return: result dict of the handler, with failed and msg on errors
+    """
+    path = socket_path(params)
+    message = {'password': params['password'], 'idle_timeout': idle_timeout, 'payload': payload}
+    try:
+        ensure_broker_dir()
+        try:
+            result = _call(path, message)
+            if not result.get('restart'):
+                return result
+            # The broker was started with another password or idle timeout and removed its socket
+        except socket.timeout:
+            raise
+        except socket.error as error:
+            if error.errno not in (errno.ENOENT, errno.ECONNREFUSED):
+                raise
+            # No broker running or stale socket left over
+            if os.path.exists(path):
+                os.unlink(path)
+        spawn(path, params, session_factory, handler, idle_timeout)
+        return _call(path, message)
+    except socket.timeout:
+        return {'failed': True, 'msg': 'SSH session broker did not answer within %s seconds' % REQUEST_TIMEOUT}
+    except (BrokerError, socket.error, OSError, ValueError) as error:
+        return {'failed': True, 'msg': 'SSH session broker failed: %s' % error}
+
+
+def _call(path, payload):
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.settimeout(REQUEST_TIMEOUT)
+    try:
+        conn.connect(path)
+        send_json(conn, payload)
+        return recv_json(conn)
+    finally:
+        conn.close()
+
+
+def spawn(path, params, session_factory, handler, idle_timeout):
+    """
+    Forks a detached broker process and waits until it listens
+    """
+    pid = os.fork()
+    if pid == 0:
+        # Detach from the module process, Ansible waits until stdout/stderr are closed
+        os.setsid()
+        if os.fork() != 0:
+            os._exit(0)
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        try:
+            serve(path, params, session_factory, handler, idle_timeout)
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+
+    deadline = time.time() + SPAWN_TIMEOUT
+    while not os.path.exists(path):
+        if time.time() > deadline:
+            raise BrokerError('SSH session broker did not start')
+        time.sleep(0.05)
+
+
+def serve(path, params, session_factory, handler, idle_timeout):
+    """
+    Broker main loop, handles one request at a time on a single SSH session
+    """
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        server.bind(path)
+    except socket.error:
+        # Another broker for the same device won the race
+        server.close()
+        return
+    os.chmod(path, 0o600)
+    server.listen(5)
+    # Only a hash of the password is compared, the session keeps params for its own login
+    salt = os.urandom(16)
+    expected = password_hash(salt, params['password'])
+
+    session = None
+    try:
+        while True:
+            if not select.select([server], [], [], idle_timeout)[0]:
+                break
+            conn = server.accept()[0]
+            conn.settimeout(REQUEST_TIMEOUT)
+            try:
+                uid = peer_uid(conn)
+                if uid is not None and uid != os.getuid():
+                    # Only the user that started the broker may use its session
+                    continue
+                message = recv_json(conn)
+                if not hmac.compare_digest(password_hash(salt, message.get('password')), expected) \
+                        or message.get('idle_timeout') != idle_timeout:
+                    # Free the socket before answering, the caller starts a new broker with its credentials
+                    server.close()
+                    os.unlink(path)
+                    path = None
+                    send_json(conn, {'restart': True})
+                    break
+                payload = message['payload']
+                if session is not None and not is_alive(session):
+                    session = None
+                if session is None:
+                    session = session_factory(SessionModule(params))
+                else:
+                    resync(session)
+                send_json(conn, handler(session, payload))
+            except Exception as error:
+                # Session state is unknown after an error, next call will start a new broker
+                send_json(conn, {'failed': True, 'msg': str(error)})
+                break
+            finally:
+                conn.close()
+    finally:
+        server.close()
+        if path is not None and os.path.exists(path):
+            os.unlink(path)
+        if session is not None:
+            try:
+                session.logout()
+            except Exception:
+                pass
@@ -0,0 +1,419 @@
+# Aruba Switch SSH - SSH CLI session and firmware upgrade for ArubaOS-Switches
+# Shared by the arubaos_switch_ssh_cli and arubaos_switch_firmware_fleet modules
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+# Python imports
+import os
+import re
+import socket
+import time
+
+import paramiko
+
+from ansible.module_utils.aruba_ssh import ChannelReader, OutputFile, PROMPT_END, READ_TIMEOUT, last_line, output_path
+from ansible.module_utils import aruba_sftp
+from ansible.module_utils.aruba_firmware import SwiVersion, parse_flash
+
+# RFC 1123 compliant hostname, same rule as the ArubaOS-CX session
+VALID_HOSTNAME = re.compile(r'^(([a-zA-Z0-9]|[a-zA-Z0-9][a-zA-Z0-9\-]*[a-zA-Z0-9])\.)*'
+                            r'([A-Za-z0-9]|[A-Za-z0-9][A-Za-z0-9\-]*[A-Za-z0-9])$')
+
+
+# Class for SSH CLI
+class SwitchSSHCLI(object):
+
+    def __init__(self, module):
+        """
+        Init all variables and starts login
+        :param module: module objects itself
+        """
+        # Init Vars
+        args = module.params
+        # List of strings of CLI Commands
+        paramiko_ssh_connection_args = {'hostname': args['ip'], 'port': args['port'], 'username': args['user'],
+                                        'password': args['password'], 'look_for_keys': args['look_for_keys'],
+                                        'allow_agent': args['allow_agent'], 'key_filename': args['key_filename'],
+                                        'timeout': args['timeout']}
+        self.module = module
+
+        # Login
+        self.ssh_client = paramiko.SSHClient()
+        # Default AutoAdd as Policy
+        self.ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        # Connect to Switch via SSH
+        self.ssh_client.connect(**paramiko_ssh_connection_args)
+        self.prompt = ''
+        # Parsed show flash output of this session
+        self.flash = None
+        # SSH Command execution not allowed, therefor using the following paramiko functionality
+        self.shell_chanel = self.ssh_client.invoke_shell()
+        self.shell_chanel.settimeout(8)
+        self.reader = ChannelReader(self.shell_chanel)
+        # AOS-Switch specific
+        self.additional_connection_setup()
+
+    def execute_cli_command(self, command_list):
+        """
+        Executes the list of CLI commands
+        :param command_list: List of Strings with commands
+        """
+        for command in command_list:
+            self.in_channel(command)
+
+    def execute_show_command(self, command_list, output_dir=None, compress=False):
+        """
+        Execute show command and returns output
+        :param command_list: list of commands
+        :param output_dir: stream each output to a file in this directory instead of keeping it in memory
+        :param compress: gzip the output files
+        :return: output of show command, with output_dir dicts with path, size and sha256 of the output files
+        """
+        # Regex for prompt and hostname command
+        prompt = re.compile(r'' + re.escape(self.prompt.replace('#', '')) + r'.*#\s*$')
+        hostname = re.compile(r'^ho[^ ]*')
+
+        cli_output = []
+        for index, command in enumerate(command_list):
+            if hostname.search(command):
+                self.module.fail_json(
+                    msg='You are not allowed to change the hostname while using show command function.')
+            self.in_channel(command)
+
+            if output_dir:
+                sink = OutputFile(output_path(output_dir, self.module.params['ip'], index, command, compress),
+                                  compress)
+                text, found = self.reader.read_until(prompt, strip_ansi=True, sink=sink)
+                if not found:
+                    sink.abort()
+                    self.module.fail_json(msg='Unable to read CLI Output in given Time')
+                cli_output.append(dict(sink.close(), command=command))
+                continue
+
+            # Returns as soon as the prompt is back, 90s are only the upper bound
+            text, found = self.reader.read_until(prompt, strip_ansi=True)
+
+            if not found:
+                self.module.fail_json(msg='Unable to read CLI Output in given Time')
+
+            # Format Text
+            text_lines = text.split('\n')[:-1]
+            # Remove Command from Output
+            if text_lines:
+                text_lines[0] = text_lines[0].replace(command, '', 1)
+            cli_output.append('\n'.join(text_lines))
+        return cli_output
+
+    def set_hostname(self, command):
+        """
+        Changes the hostname in configuration mode and waits for the prompt with the new hostname
+        :param command: hostname command, e.g. hostname "sw1"
+        :return: output of the hostname command
+        """
+        new_hostname = command.split(" ", 1)[1].strip().strip('"') if " " in command.strip() else ''
+        if not VALID_HOSTNAME.search(new_hostname):
+            self.module.fail_json(
+                msg='To be compliant with RFC 1123, the hostname must contain only letters, '
+                    'numbers and hyphens, and must not start or end with a hyphen. Can not change Hostname!')
+
+        self.execute_show_command(["conf t"])
+        self.in_channel(command)
+        # The switch answers with the new prompt, or with the old one if it rejected the command
+        prompts = [re.compile(r'(^|\n)' + re.escape(name) + r'(\([^)]*\))?#\s*$')
+                   for name in (new_hostname, self.prompt.replace('#', ''))]
+        index, text = self.reader.expect(prompts, strip_ansi=True)
+        if index is None:
+            self.module.fail_json(msg='Unable to read CLI Output in given Time')
+        if index == 0:
+            self.prompt = new_hostname + "#"
+        self.execute_show_command(["end"])
+
+        # Remove command and prompt from the output
+        return '\n'.join(text.split('\n')[1:-1])
+
+    def show_flash(self, refresh=False):
+        """
+        Returns the firmware images of the switch, show flash is only executed once per session unless refresh is set
+        :param refresh: execute show flash again, needed after the flash content changed
+        :return: FlashInventory object
+        """
+        if refresh or self.flash is None:
+            self.flash = parse_flash(self.execute_show_command(["show flash"])[0])
+        return self.flash
+
+    def additional_connection_setup(self):
+        """
+        Additional needed Setup for Connection
+        """
+        banner = re.compile(r'any key to continue')
+        # Max Timeout ca. 1.30 Min
+        text, found = self.reader.read_until(banner, strip_ansi=True)
+        if not found:
+            self.module.fail_json(msg='Unable to connect correctly to Switch')
+        self.in_channel("")
+
+        # Wait for the first prompt after the banner and clear buffer
+        text, found = self.reader.read_until(PROMPT_END, strip_ansi=True)
+        self.out_channel()
+
+        # Set prompt
+        self.in_channel("")
+        text, found = self.reader.read_until(PROMPT_END, strip_ansi=True)
+        if not found:
+            self.module.fail_json(msg='Unable to read CLI Output in given Time for prompt')
+
+        self.prompt = last_line(text)
+
+    def out_channel(self):
+        """
+        Clear Buffer/Read from Shell
+        :return: Read lines
+        """
+        recv = self.reader.drain()
+        if self.reader.closed:
+            self.module.fail_json(msg='Chanel gives no data. Chanel is closed by Switch.')
+        return recv
+
+    def in_channel(self, cmd):
+        """
+        Sends cli command to Shell
+        :param cmd: the command itself
+        """
+        cmd = cmd.rstrip()
+        cmd += '\n'
+        cmd = cmd.encode('ascii', 'ignore')
+        self.shell_chanel.sendall(cmd)
+
+    def open_sftp(self):
+        """
+        Opens SFTP as an additional channel on the transport of the logged in session
+        :return: paramiko SFTPClient object
+        """
+        return paramiko.SFTPClient.from_transport(self.ssh_client.get_transport())
+
+    def reconnect(self):
+        """
+        Closes the current connection and logs in again, used after the link dropped
+        """
+        try:
+            self.ssh_client.close()
+        except Exception:
+            pass
+        self.__init__(self.module)
+
+    def boot_system(self, boot_image):
+        """
+        Reboots the switch from the given flash image and answers the confirmation prompts
+        :param boot_image: primary or secondary
+        """
+        question = re.compile(r'\[y/n[^\]]*\]\??\s*$')
+        self.in_channel('boot system flash {}'.format(boot_image))
+        # Switch asks to save the config and to confirm the reboot, afterwards it closes the session
+        for count in range(3):
+            text, found = self.reader.read_until(question, timeout=30, strip_ansi=True)
+            if not found:
+                break
+            if 'save' in last_line(text).lower():
+                self.in_channel("n")
+            else:
+                self.in_channel("y")
+        self.shell_chanel.close()
+        self.ssh_client.close()
+
+    def logout(self):
+        """
+        Logout from Switch
+        Answers the logout and save questions as soon as they show up and returns when the switch closes the channel
+        :return:
+        """
+        questions = [re.compile(r'want to log out'), re.compile(r'save (the )?current')]
+        deadline = time.time() + READ_TIMEOUT
+        try:
+            self.in_channel('logout')
+            while time.time() < deadline:
+                index, text = self.reader.expect(questions, timeout=deadline - time.time(), strip_ansi=True)
+                if index == 0:
+                    self.in_channel("y")
+                elif index == 1:
+                    self.in_channel("n")
+                else:
+                    # Channel closed by the switch or upper bound reached
+                    break
+        except socket.error:
+            pass
+        self.shell_chanel.close()
+        self.ssh_client.close()
+
+
+def pre_upgrade_firmware(module, class_init):
+    """
+    Checks current version vs to bet version and pre configures Switch for SFTP if argument for it is true
+    :param module: the module
+    :param class_init: logged in SwitchSSHCLI object
+    :return: True if current version equal to to be version | False if SFTP configuration is fine and versions are different
+    """
+    # Init Vars
+    to_be_version = swi_file_version(module)
+
+    # Check Current vs to be version, an empty image slot can always be written
+    # compare_image, e.g. the running image of a fleet upgrade, is checked instead of the image that gets written
+    current_version = class_init.show_flash().image(module.params.get('compare_image') or module.params['boot_image'])
+
+    # Version Handling
+    state = module.params['state']
+
+    if state == "upgrade" and current_version is not None and current_version >= to_be_version:
+        return [True, "Switch shall be upgraded but to be version is lower than or equal to current version. Unable to upgrade.", False, True]
+
+    if state == "downgrade" and current_version is not None and current_version <= to_be_version:
+        return [True, "Switch shall be downgraded but to be version is higher than or equal to current version. Unable to downgrade.", False, True]
+
+    # Enable SFTP for Switch or Check if it is enabled
+    if module.params['enable_sftp']:
+        class_init.execute_show_command(['conf t', 'ip ssh filetransfer', 'end'])
+    else:
+        output = class_init.execute_show_command(['show run | include ip ssh'])
+        if "ip ssh filetransfer" != output[0]:
+            module.fail_json(
+                msg='Ip ssh filetransfer is not enabled, SFTP no possible. Please configure it on the Switch CLI via "ip ssh filetransfer"' )
+    return [False]
+
+
+def swi_file_version(module):
+    """
+    Reads the version from the file name of path_to_swi
+    :param module: the module
+    :return: SwiVersion object
+    """
+    to_be_version = SwiVersion.parse(os.path.basename(module.params['path_to_swi']))
+    if to_be_version is None:
+        module.fail_json(msg='Unable to read the SWI version from the file name {}.'.format(module.params['path_to_swi']))
+    return to_be_version
+
+
+def upgrade_firmware(module, class_init):
+    """
+    Upgrades Firmware via CLI SFTP Put
+    Shell and SFTP run as separate channels over the transport of the given session, so the whole upgrade needs one login
+    :param module: the module
+    :param class_init: logged in SwitchSSHCLI object
+    """
+    # Inital Vars
+    to_be_version = swi_file_version(module)
+
+    tmp_list = pre_upgrade_firmware(module, class_init)
+    if tmp_list[0]:
+        return tmp_list[1], tmp_list[2], tmp_list[3], {}
+
+    # Check if File path name is correct
+    path_to_swi = os.path.abspath(module.params['path_to_swi'])
+    if not os.path.exists(path_to_swi):
+        module.fail_json(
+            msg='Path to SWI is pointing to non existing directory or file. Path was: {}. '.format(path_to_swi))
+
+    # Compare local file against the expected checksum before anything gets written to flash
+    sha256 = None
+    if module.params['swi_sha256']:
+        sha256 = aruba_sftp.file_digest(path_to_swi)
+        if sha256 != module.params['swi_sha256'].lower():
+            module.fail_json(
+                msg='SHA256 of {} is {} but {} was expected. Upload aborted.'.format(path_to_swi, sha256,
+                                                                                  module.params['swi_sha256']))
+
+    # Create swCfgPath for Switch
+    fwPathPrefix = "/os/"
+    swCfgPath = fwPathPrefix + module.params['boot_image']
+    upload = upload_swi(module, class_init, path_to_swi, swCfgPath, sha256 is None)
+    if sha256 is not None:
+        upload['sha256'] = sha256
+
+    # Check up to 10 times if current version was successfully uploaded
+    for retry in range(10):
+        # Get current Version, flash changed so the cached output can not be used
+        current_version = class_init.show_flash(refresh=True).image(module.params['boot_image'])
+        # Check if current version is new current version
+        if current_version == to_be_version:
+            return "{} was successful".format(module.params['state']), True, False, upload
+        time.sleep(3)
+    return "Unable to check if upload was successful", True, True, upload
+
+
+def resume_offset(class_init, path_to_swi, swCfgPath, written, size):
+    """
+    Offset to continue an interrupted upload at. Bytes on the switch are only reused if this run wrote them and
+    the sha256 of them matches the same bytes of the local file, otherwise the slot could still hold parts of the
+    old image or a corrupt write
+    :param class_init: logged in SwitchSSHCLI object
+    :param path_to_swi: absolute path of the local SWI file
+    :param swCfgPath: path of the image on the switch
+    :param written: bytes this run handed to the switch
+    :param size: size of the local file
+    :return: byte offset, 0 to upload the whole file
+    """
+    transport = class_init.ssh_client.get_transport()
+    offset = min(aruba_sftp.remote_size(transport, swCfgPath) or 0, written)
+    if offset >= size or not offset:
+        return 0
+    if not aruba_sftp.remote_matches(transport, path_to_swi, swCfgPath, offset):
+        class_init.module.log('Image on the switch does not match {}, uploading from the start'.format(path_to_swi))
+        return 0
+    return offset
+
+
+def upload_swi(module, class_init, path_to_swi, swCfgPath, digest):
+    """
+    Uploads the SWI file via SFTP, reconnects and resumes if the connection drops
+    :param module: the module
+    :param class_init: logged in SwitchSSHCLI object
+    :param path_to_swi: absolute path of the local SWI file
+    :param swCfgPath: path of the image on the switch
+    :param digest: calculate the sha256 of the file during the upload
+    :return: dict with upload statistics
+    """
+    size = os.path.getsize(path_to_swi)
+    # Log progress in 10 percent steps
+    steps = [0]
+    # Bytes this run wrote since it truncated the image, only those can be resumed
+    written = [0]
+
+    def progress(done, total):
+        written[0] = max(written[0], done)
+        step = int(done * 10 / total) if total else 10
+        if step > steps[0]:
+            steps[0] = step
+            module.log('Uploaded {} of {} bytes of {} to {}'.format(done, total, path_to_swi, module.params['ip']))
+
+    offset = 0
+    attempt = 0
+    while True:
+        try:
+            if attempt:
+                class_init.reconnect()
+                offset = 0
+                if module.params['resume_upload']:
+                    offset = resume_offset(class_init, path_to_swi, swCfgPath, written[0], size)
+            upload = aruba_sftp.upload_file(class_init.ssh_client.get_transport(), path_to_swi, swCfgPath,
+                                            chunk_size=module.params['sftp_chunk_size'],
+                                            window_size=module.params['sftp_window_size'], offset=offset,
+                                            progress=progress, digest=digest)
+            break
+        except Exception as error:
+            attempt += 1
+            if attempt > module.params['upload_retries']:
+                module.fail_json(msg='Ran into exception: {}. Paramiko..'.format(error))
+
+    # Switch side check of the received size, AOS-Switch does not expose a digest of the flash images
+    transport = class_init.ssh_client.get_transport()
+    upload['remote_size'] = aruba_sftp.remote_size(transport, swCfgPath)
+    if upload['remote_size'] is not None and upload['remote_size'] != size:
+        module.fail_json(msg='Switch received {} bytes but {} has {} bytes.'.format(upload['remote_size'], path_to_swi,
+                                                                                  size), upload=upload)
+    # A resumed image is pieced together from several transfers, read it back and compare the whole file
+    if upload['offset'] and not aruba_sftp.remote_matches(transport, path_to_swi, swCfgPath):
+        module.fail_json(msg='Image on the switch does not match {} after resuming the upload.'.format(path_to_swi),
+                         upload=upload)
+    upload['attempts'] = attempt + 1
+    return upload
@@ -0,0 +1,5 @@
+# The module_utils are imported without Ansible, like the filter plugins load them
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'module_utils'))
@@ -0,0 +1,84 @@
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import pytest
+
+from aruba_acl import AclError, AclRule, RuleIndex, compile_acl, diff_acl, parse_address
+
+ENTRIES = {
+    '1': {'action': 'permit', 'protocol': 'tcp', 'src_ip': '10.1.0.0/16', 'dst_ip': 'any', 'dst_l4_port_min': 443,
+          'dst_l4_port_max': 443},
+    '11': {'action': 'deny', 'protocol': 6, 'src_ip': '10.1.2.0/255.255.255.0', 'dst_ip': 'any',
+           'dst_l4_port_min': 443, 'dst_l4_port_max': 443},
+    '12': {'action': 'permit', 'protocol': 'udp', 'src_ip': '10.2.0.0/16', 'dst_ip': '10.9.9.9'},
+    '14': {'action': 'permit', 'protocol': 17, 'src_ip': '10.2.0.0/255.255.0.0', 'dst_ip': '10.9.9.9/32'},
+    '9999': {'action': 'permit', 'protocol': 'any', 'src_ip': 'any', 'dst_ip': 'any'},
+    '10000': {'action': 'permit', 'protocol': 'icmp', 'src_ip': '10.3.0.1', 'dst_ip': 'any'},
+}
+
+
+def test_parse_address():
+    assert parse_address('10.1.1.1/24') == (0x0A010100, 0xFFFFFF00)
+    assert parse_address('10.1.1.1/255.255.255.0') == (0x0A010100, 0xFFFFFF00)
+    assert parse_address('10.1.1.1') == (0x0A010101, 0xFFFFFFFF)
+    assert parse_address('any') == (0, 0)
+    with pytest.raises(AclError):
+        parse_address('10.1.1.300')
+
+
+def test_compile_acl_finds_unreachable_entries():
+    result = compile_acl(ENTRIES, prune=True)
+    assert result['shadowed'] == [{'sequence': 11, 'covered_by': 1}]
+    assert result['duplicates'] == [{'sequence': 14, 'covered_by': 12}]
+    assert result['redundant'] == [{'sequence': 10000, 'covered_by': 9999}]
+    assert sorted(result['entries'], key=int) == ['1', '12', '9999']
+
+
+def test_compile_acl_keeps_entries_by_default():
+    result = compile_acl(ENTRIES)
+    assert len(result['entries']) == len(ENTRIES)
+    assert result['shadowed'] == [{'sequence': 11, 'covered_by': 1}]
+
+
+def test_rule_index_matches_linear_search():
+    rules = [AclRule(sequence, entry) for sequence, entry in sorted(ENTRIES.items(), key=lambda item: int(item[0]))]
+    index = RuleIndex()
+    for rule in rules[:3]:
+        index.add(rule)
+    for rule in rules[3:]:
+        linear = [candidate for candidate in rules[:3] if candidate.covers(rule)]
+        covering = index.first_cover(rule)
+        assert (covering.sequence if covering else None) == (linear[0].sequence if linear else None)
+
+
+def test_diff_acl_uses_rest_schema():
+    current = {'cfg_aces': {
+        '1': {'action': 'permit', 'protocol': 6, 'src_ip': '10.1.0.0/255.255.0.0', 'dst_l4_port_min': 443,
+              'dst_l4_port_max': 443},
+        '5': {'action': 'deny', 'protocol': 17, 'src_ip': '10.5.0.0/255.255.0.0'},
+        '12': {'action': 'deny', 'protocol': 17, 'src_ip': '10.2.0.0/255.255.0.0',
+               'dst_ip': '10.9.9.9/255.255.255.255'},
+    }}
+    changes = diff_acl(current, compile_acl(ENTRIES, prune=True)['entries'])
+    assert changes['unchanged'] == 1
+    assert changes['remove'] == [5]
+    assert changes['update'] == {'12': {'action': 'permit', 'protocol': 17, 'count': False,
+                                        'src_ip': '10.2.0.0/255.255.0.0', 'dst_ip': '10.9.9.9/255.255.255.255'}}
+    # any is left out, the protocol is a number
+    assert changes['add'] == {'9999': {'action': 'permit', 'count': False}}
+
+
+def test_only_match_attributes_are_compared():
+    wanted = {'1': {'action': 'permit', 'protocol': 'tcp', 'src_ip': 'any', 'dst_ip': 'any', 'tcp_syn': True}}
+    # Attributes the switch adds to a GET with depth=2 do not change the entry
+    current = {'1': {'action': 'permit', 'protocol': 6, 'tcp_syn': True, 'hit_count': 42,
+                     'status': {'state': 'applied'}}}
+    assert diff_acl(current, wanted)['unchanged'] == 1
+    assert AclRule(1, current['1']).covers(AclRule(1, wanted['1']))
+    assert not AclRule(1, wanted['1']).covers(AclRule(2, {'protocol': 'tcp', 'src_ip': 'any'}))
+
+
+def test_unknown_protocol_name_is_rejected_for_rest():
+    with pytest.raises(AclError):
+        AclRule(1, {'protocol': 'foo'}).rest_entry()
@@ -0,0 +1,91 @@
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import base64
+
+from aruba_cli_batch import batch_state, blocks, command_lines, encode_batch, split_batches
+
+CONFIG = """; J9850A Configuration Editor; Created on release #KB.16.10.0009
+hostname "sw1"
+
+vlan 10
+   name "data"
+   untagged 1-4
+   exit
+interface 1
+   disable
+snmp-server community "public"
+"""
+
+
+def test_command_lines_drops_comments_and_empty_lines():
+    assert command_lines(CONFIG) == ['hostname "sw1"', 'vlan 10', '   name "data"', '   untagged 1-4', '   exit',
+                                     'interface 1', '   disable', 'snmp-server community "public"']
+    # Escaped newlines of a single line variable
+    assert command_lines('hostname "a"\\nvlan 1') == ['hostname "a"', 'vlan 1']
+    assert command_lines(['', 'vlan 1  ', '! comment']) == ['vlan 1']
+
+
+def test_blocks_keep_contexts_together():
+    assert list(blocks(command_lines(CONFIG))) == [
+        ['hostname "sw1"'],
+        ['vlan 10', '   name "data"', '   untagged 1-4', '   exit'],
+        ['interface 1', '   disable'],
+        ['snmp-server community "public"'],
+    ]
+
+
+def test_blocks_unindented_context_ends_with_exit():
+    lines = ['vlan 10', 'name "data"', 'exit', 'hostname "sw1"']
+    assert list(blocks(lines)) == [['vlan 10', 'name "data"', 'exit'], ['hostname "sw1"']]
+
+
+def test_split_batches_at_context_boundaries():
+    batches = split_batches(CONFIG, max_lines=4)
+    assert batches == [
+        [(1, 'hostname "sw1"')],
+        [(2, 'vlan 10'), (3, 'name "data"'), (4, 'untagged 1-4'), (5, 'exit')],
+        [(6, 'interface 1'), (7, 'disable'), (8, 'snmp-server community "public"')],
+    ]
+
+
+def test_split_batches_repeats_the_context_of_a_split_block():
+    batches = split_batches(['vlan 10', '  name a', '  untagged 1', '  tagged 2', 'exit'], max_lines=3)
+    assert batches == [[(1, 'vlan 10'), (2, 'name a'), (3, 'untagged 1')],
+                       [(None, 'vlan 10'), (4, 'tagged 2'), (5, 'exit')]]
+
+
+def test_split_batches_byte_limit():
+    lines = ['snmp-server contact "%s"' % ('x' * 20)] * 4
+    batches = split_batches(lines, max_bytes=100)
+    assert [len(batch) for batch in batches] == [2, 2]
+    assert all(sum(len(line) + 1 for _, line in batch) <= 100 for batch in batches)
+
+
+def test_encode_batch():
+    body = encode_batch([(1, 'hostname "sw1"'), (None, 'vlan 10')])
+    assert base64.b64decode(body['cli_batch_base64_encoded']).decode('utf-8') == 'hostname "sw1"\nvlan 10'
+    assert encode_batch(['vlan 10']) == {'cli_batch_base64_encoded': base64.b64encode(b'vlan 10').decode('utf-8')}
+
+
+def test_batch_state():
+    batch = [(1, 'vlan 10'), (2, 'bogus')]
+    assert batch_state({'status': 'CBS_IN_PROGRESS', 'cmd_exec_logs': [{'status': 'CCS_SUCCESS'}]}, batch) == \
+        ('running', None)
+    # Without an overall status the batch runs until every command has a log
+    assert batch_state({'cmd_exec_logs': [{'status': 'CCS_SUCCESS'}]}, batch) == ('running', None)
+    assert batch_state({'status': 'CBS_COMPLETED', 'cmd_exec_logs': [{'status': 'CCS_SUCCESS'}] * 2}, batch) == \
+        ('done', None)
+    failed = {'status': 'CBS_COMPLETED', 'cmd_exec_logs': [
+        {'status': 'CCS_SUCCESS', 'cmd': 'vlan 10'},
+        {'status': 'CCS_FAILURE', 'cmd': 'bogus', 'result': 'Invalid input: bogus'}]}
+    assert batch_state(failed, batch) == ('failed', (2, 'bogus', 'Invalid input: bogus'))
+
+
+def test_batch_state_ignores_the_status_of_the_previous_batch():
+    previous = {'status': 'CBS_COMPLETED', 'cmd_exec_logs': [{'status': 'CCS_SUCCESS', 'cmd': 'hostname "sw1"'}]}
+    assert batch_state(previous, [(2, 'vlan 10'), (3, 'name "data"')]) == ('running', None)
+    # Whitespace of the echoed command does not matter
+    current = {'status': 'CBS_COMPLETED', 'cmd_exec_logs': [{'status': 'CCS_SUCCESS', 'cmd': 'vlan  10 '}]}
+    assert batch_state(current, [(2, 'vlan 10')]) == ('done', None)
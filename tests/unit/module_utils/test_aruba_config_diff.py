@@ -0,0 +1,89 @@
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from aruba_config_diff import diff_config, find_error, parse_config
+
+RUNNING = """Running configuration:
+; J9729A Configuration Editor; Created on release #WC.16.06.0006
+hostname "sw1"
+ip default-gateway 10.6.7.1
+ntp server 1.1.1.1
+vlan 1
+   name "DEFAULT_VLAN"
+   untagged 1-48
+   exit
+vlan 10
+   name "USERS"
+   ip helper-address 10.6.7.10
+   exit
+"""
+
+
+def test_same_config_has_no_diff():
+    assert diff_config(RUNNING, RUNNING) == []
+
+
+def test_quotes_are_ignored():
+    candidate = RUNNING.replace('hostname "sw1"', 'hostname sw1').replace('"USERS"', 'USERS')
+    assert diff_config(RUNNING, candidate) == []
+
+
+def test_single_value_is_replaced():
+    candidate = RUNNING.replace('hostname "sw1"', 'hostname "sw2"').replace('10.6.7.1\n', '10.6.7.254\n')
+    assert diff_config(RUNNING, candidate) == ['hostname "sw2"', 'ip default-gateway 10.6.7.254']
+
+
+def test_repeatable_lines_are_negated():
+    running = "ip helper-address 10.6.7.10\nntp server 1.1.1.1\nvlan 1,100,302\n"
+    candidate = "ip helper-address 10.6.7.11\nntp server 2.2.2.2\nvlan 1,100\n"
+    assert diff_config(running, candidate) == [
+        'ip helper-address 10.6.7.11', 'ntp server 2.2.2.2', 'no vlan 302', 'no ntp server 1.1.1.1',
+        'no ip helper-address 10.6.7.10']
+
+
+def test_list_values_send_only_changed_members():
+    running = "interface 1/1/49\n    vlan trunk allowed 1-10,20\nvlan 10\n   untagged 1-48\n   tagged A1-A4\n"
+    candidate = "interface 1/1/49\n    vlan trunk allowed 5-12,20\nvlan 10\n   untagged 1-24\n   tagged A1-A6\n"
+    assert diff_config(running, candidate) == [
+        'interface 1/1/49', 'vlan trunk allowed 11-12', 'no vlan trunk allowed 1-4', 'exit',
+        'vlan 10', 'tagged A5-A6', 'no untagged 25-48', 'exit']
+    # Members moved between lines are neither added nor removed
+    assert diff_config("vlan 1,2\nvlan 3\n", "vlan 1-3\n") == []
+
+
+def test_platform_lines_are_kept():
+    running = "module 1 type jl363a\noobm\n   ip address dhcp-bootp\n   exit\nsnmp-server community public\n"
+    assert diff_config(running, "hostname sw1\n") == ['hostname sw1', 'no snmp-server community public']
+    assert diff_config(running, "hostname sw1\n", keep=[r'^snmp-server community ']) == ['hostname sw1']
+
+
+def test_changed_line_in_context():
+    candidate = RUNNING.replace('ip helper-address 10.6.7.10', 'ip helper-address 10.6.7.11')
+    assert diff_config(RUNNING, candidate) == [
+        'vlan 10', 'ip helper-address 10.6.7.11', 'no ip helper-address 10.6.7.10', 'exit']
+
+
+def test_removed_context_and_new_context():
+    candidate = RUNNING.replace('vlan 10\n   name "USERS"\n   ip helper-address 10.6.7.10\n   exit\n',
+                                'vlan 20\n   name "VOICE"\n   exit\n')
+    assert diff_config(RUNNING, candidate) == ['vlan 20', 'name "VOICE"', 'exit', 'no vlan 10']
+
+
+def test_negated_line_is_not_removed_twice():
+    running = "interface 1/1/1\n    no shutdown\n"
+    candidate = "interface 1/1/1\n    shutdown\n"
+    assert diff_config(running, candidate) == ['interface 1/1/1', 'shutdown', 'exit']
+
+
+def test_parse_config_skips_comments_and_exit():
+    root = parse_config(RUNNING)
+    assert list(root.children) == ['hostname sw1', 'ip default-gateway 10.6.7.1', 'ntp server 1.1.1.1', 'vlan 1',
+                                   'vlan 10']
+    assert root.children['hostname sw1'].line == 'hostname "sw1"'
+    assert root.children['vlan 1'].lines() == ['vlan 1', 'name "DEFAULT_VLAN"', 'untagged 1-48', 'exit']
+
+
+def test_find_error():
+    assert find_error(['vlan 10', 'bad'], ['', 'Invalid input: bad']) == ('bad', 'Invalid input: bad')
+    assert find_error(['vlan 10'], ['']) is None
@@ -0,0 +1,29 @@
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import pytest
+
+from aruba_firmware import SwiVersion, compare_versions
+
+
+def test_parse_short_versions():
+    assert str(SwiVersion.parse('WC.17.02')) == 'WC.17.02'
+    assert SwiVersion.parse('KB_16_10_0009.swi').underscore() == 'KB_16_10_0009'
+    assert SwiVersion.parse('no version') is None
+
+
+def test_compare_versions():
+    assert compare_versions('WC.17.02', 'WC_16_05_0007') == 1
+    assert compare_versions('WC.16.05.0007', 'WC_16_10_0009') == -1
+    # Missing components count as 0
+    assert compare_versions('WC.17.02', 'WC.17.02.0000') == 0
+    with pytest.raises(ValueError):
+        compare_versions(None, 'WC.16.05.0007')
+
+
+def test_versions_of_other_platforms_differ():
+    assert SwiVersion.parse('WC.16.05.0007') != SwiVersion.parse('KB.16.05.0007')
+    assert SwiVersion.parse('WC.16.05.0007') == SwiVersion.parse('WC_16_05_0007')
+    with pytest.raises(ValueError):
+        compare_versions('WC.16.05.0007', 'KB.16.05.0007')
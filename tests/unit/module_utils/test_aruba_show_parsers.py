@@ -0,0 +1,174 @@
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import pytest
+
+from aruba_show_parsers import ParseError, Table, command_matches, find_parser, parse_output, parse_outputs
+
+SWITCH_FLASH = """Image           Size (bytes) Date     Version
+--------------- ------------ -------- --------------
+Primary Image   :   26571864 03/27/19 WC.16.06.0006
+Secondary Image :   26335528 11/19/18 WC.16.05.0007
+
+Boot ROM Version
+----------------
+Primary Boot ROM Version   : WC.17.02.0006
+Secondary Boot ROM Version : WC.17.02.0006
+
+Default Boot Image   : Primary"""
+
+
+SWITCH_VERSION = """Image stamp:    /ws/swbuildm/rel_richmond_qaoff/code/build/lvm(swbuildm_rel_richmond_qaoff_rel_richmond)
+                Mar 27 2019 13:17:32
+                WC.16.06.0006
+                2038
+Boot Image:     Primary"""
+
+
+SWITCH_LLDP = """
+ LLDP Remote Devices Information
+
+  LocalPort | ChassisId                 PortId PortDescr SysName
+  --------- + ------------------------- ------ --------- ----------------------
+  1         | 00 0b 86 12 34 56         1/1/1  1/1/1     core-1
+  24        | 94:f1:28:aa:bb:cc         24     24        access-2
+"""
+
+
+SWITCH_VLANS = """
+ Status and Counters - VLAN Information
+
+  Maximum VLANs to support : 256
+  Primary VLAN : DEFAULT_VLAN
+  Management VLAN :
+
+  VLAN ID Name                             | Status     Voice Jumbo
+  ------- -------------------------------- + ---------- ----- -----
+  1       DEFAULT_VLAN                     | Port-based No    No
+  10      data                             | Port-based Yes   No
+"""
+
+
+CX_VERSION = """-----------------------------------------------------------------------------
+ArubaOS-CX
+(c) Copyright 2017-2020 Hewlett Packard Enterprise Development LP
+-----------------------------------------------------------------------------
+Version      : GL.10.04.0001
+Build Date   : 2019-11-01 17:50:09 UTC
+Build ID     : ArubaOS-CX:GL.10.04.0001:f1a2b3c4d5e6:201911011750
+Build SHA    : f1a2b3c4d5e6
+Active Image : primary
+
+Service OS Version : GL.01.05.0001
+BIOS Version       : GL.01.0001"""
+
+
+CX_IMAGES = """---------------------------------------------------------------------------
+ArubaOS-CX Primary Image
+---------------------------------------------------------------------------
+Version : GL.10.04.0001
+Size    : 405 MB
+Date    : 2019-11-01 17:50:09 UTC
+SHA-256 : 2c5c4a8e9a1f
+
+---------------------------------------------------------------------------
+ArubaOS-CX Secondary Image
+---------------------------------------------------------------------------
+Version : GL.10.03.0040
+Size    : 400 MB
+Date    : 2019-08-01 10:00:00 UTC
+SHA-256 : 7d1e0b3f2a90
+
+Default Image : primary"""
+
+
+CX_LLDP = """
+LLDP Neighbor Information
+=========================
+
+Total Neighbor Entries          : 2
+
+LOCAL-PORT  CHASSIS-ID         PORT-ID            PORT-DESC          TTL      SYS-NAME
+--------------------------------------------------------------------------------------------
+1/1/1       08:97:34:aa:bb:01  1/1/49             1/1/49             120      leaf-1
+1/1/2       08:97:34:aa:bb:02  1/1/50             1/1/50             120      leaf-2
+"""
+
+
+def test_command_matches_abbreviations():
+    assert command_matches('show interfaces brief', 'sh int br')
+    assert command_matches('show interfaces brief', 'SHOW INTERFACES BRIEF')
+    # Single letters are too ambiguous, extra words are another command
+    assert not command_matches('show interfaces brief', 's int br')
+    assert not command_matches('show version', 'show version detail')
+
+
+def test_find_parser():
+    assert find_parser('show running-config') is None
+    assert find_parser('sh vlan', 'cx') is not None
+    with pytest.raises(ParseError):
+        find_parser('show version', 'comware')
+
+
+def test_switch_flash():
+    assert parse_output('show flash', SWITCH_FLASH) == {
+        'primary': 'WC.16.06.0006', 'secondary': 'WC.16.05.0007', 'primary_boot': 'WC.17.02.0006',
+        'secondary_boot': 'WC.17.02.0006', 'default_boot': 'primary'}
+
+
+def test_switch_version():
+    result = parse_output('sh ver', SWITCH_VERSION)
+    assert result['version'] == 'WC.16.06.0006'
+    assert result['build'] == 2038
+    assert result['boot_image'] == 'primary'
+
+
+def test_switch_lldp_table():
+    assert parse_output('show lldp info remote-device', SWITCH_LLDP) == [
+        {'local_port': '1', 'chassis_id': '00 0b 86 12 34 56', 'port_id': '1/1/1', 'port_descr': '1/1/1',
+         'sys_name': 'core-1'},
+        {'local_port': '24', 'chassis_id': '94:f1:28:aa:bb:cc', 'port_id': '24', 'port_descr': '24',
+         'sys_name': 'access-2'}]
+
+
+def test_switch_vlans_converts_types():
+    assert parse_output('show vlans', SWITCH_VLANS) == [
+        {'vlan_id': 1, 'name': 'DEFAULT_VLAN', 'status': 'Port-based', 'voice': False, 'jumbo': False},
+        {'vlan_id': 10, 'name': 'data', 'status': 'Port-based', 'voice': True, 'jumbo': False}]
+
+
+def test_cx_version():
+    result = parse_output('show version', CX_VERSION, 'cx')
+    assert result['version'] == 'GL.10.04.0001'
+    assert result['active_image'] == 'primary'
+    assert result['service_os_version'] == 'GL.01.05.0001'
+
+
+def test_cx_images():
+    result = parse_output('show images', CX_IMAGES, 'cx')
+    assert result['default_image'] == 'primary'
+    assert result['primary']['version'] == 'GL.10.04.0001'
+    assert result['secondary'] == {'version': 'GL.10.03.0040', 'size': '400 MB', 'date': '2019-08-01 10:00:00 UTC',
+                                   'sha_256': '7d1e0b3f2a90'}
+
+
+def test_cx_lldp_table_with_long_separator():
+    rows = parse_output('show lldp neighbor-info', CX_LLDP, 'cx')
+    assert [row['sys_name'] for row in rows] == ['leaf-1', 'leaf-2']
+    assert rows[0] == {'local_port': '1/1/1', 'chassis_id': '08:97:34:aa:bb:01', 'port_id': '1/1/49',
+                       'port_descr': '1/1/49', 'ttl': 120, 'sys_name': 'leaf-1'}
+
+
+def test_table_errors():
+    table = Table(r'^\s*Port\s+Status', [('port', 'str'), ('status', 'str')])
+    with pytest.raises(ParseError):
+        table.parse('no table here')
+    with pytest.raises(ParseError):
+        table.parse('Port Status\n1    Up')
+    with pytest.raises(ParseError):
+        parse_output('show running-config', '')
+
+
+def test_parse_outputs_without_parser():
+    assert parse_outputs(['show running-config', 'show flash'], ['', SWITCH_FLASH])[0] is None